@@ -0,0 +1,163 @@
+"""Parse the SOP and NPA sections of many ORCA outputs across a process pool.
+
+    from batch import analyse_outputs
+    result = analyse_outputs("scan/*.out", max_workers=8)
+    table, file_of_row = result.sop_table()
+
+or from the command line:
+
+    python batch.py scan/ --pattern "*.out" --workers 8 --csv scan_sop.csv
+"""
+import argparse
+import glob
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from geometry import load_geometry
+from nbo import NBO_SOP
+from npa import NPA
+from sop_diff import SOPComparison
+from sop_table import SOPTable
+from tables import write_sop_table
+
+
+def find_outputs(source, pattern="*.out"):
+    """Sorted output paths from a directory (matched against pattern), a glob, or a list of either, as str or Path"""
+    if not isinstance(source, (str, os.PathLike)):
+        return sorted({path for item in source for path in find_outputs(item, pattern)})
+    source = os.fspath(source)
+    if os.path.isdir(source):
+        source = os.path.join(source, pattern)
+    return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+
+
+def _analyse_file(args):
+    # runs in the worker processes, so everything it returns has to pickle
+    path, analyses, cache, quiet = args
+    result = {"path": path, "sop": None, "npa": None, "geometry": None, "error": None}
+    try:
+        if "sop" in analyses:
+            result["sop"] = NBO_SOP(path, cache=cache, quiet=quiet).nbo_data
+        if "npa" in analyses:
+            result["npa"] = NPA(path, cache=cache, quiet=quiet).npa_data
+        if "geometry" in analyses:
+            try:
+                result["geometry"] = load_geometry(path)
+            except ValueError:
+                pass  # no coordinate block, the SOP/NPA results still count
+    except Exception:
+        result["error"] = traceback.format_exc(limit=3)
+    return result
+
+
+class BatchResult:
+    """Per-file results of analyse_outputs, in the order of the files"""
+
+    def __init__(self, files):
+        self.files = list(files)
+        self.sop = {}
+        self.npa = {}
+        self.geometry = {}
+        self.failures = {}
+
+    def sop_table(self):
+        """All interactions in one SOPTable plus, per row, the position of its file in self.files"""
+        parsed = [path for path in self.files if path in self.sop]
+        table = SOPTable.concat(self.sop[path] for path in parsed)
+        position = {path: i for i, path in enumerate(self.files)}
+        file_of_row = np.concatenate([np.full(len(self.sop[path]), position[path], dtype=np.int32) for path in parsed]) \
+            if parsed else np.empty(0, dtype=np.int32)
+        return table, file_of_row
+
+    def compare(self):
+        """SOPComparison of the interactions of every parsed file, named by file"""
+        parsed = [path for path in self.files if path in self.sop]
+        return SOPComparison([self.sop[path] for path in parsed], [os.path.basename(path) for path in parsed])
+
+    def print_summary(self):
+        header = f"{'File':<50} {'SOP rows':>10} {'NPA atoms':>10} {'Max E(2)':>10}  Status"
+        print(header)
+        print("=" * len(header))
+        for path in self.files:
+            sop = self.sop.get(path)
+            npa = self.npa.get(path)
+            n_sop = len(sop) if sop is not None else "-"
+            n_npa = len(npa) if npa is not None else "-"
+            max_e2 = f"{sop.e2.max():.2f}" if sop is not None and len(sop) else "-"
+            status = "failed" if path in self.failures else "ok"
+            print(f"{os.path.basename(path):<50} {n_sop:>10} {n_npa:>10} {max_e2:>10}  {status}")
+        print("=" * len(header))
+        print(f"{len(self.files) - len(self.failures)}/{len(self.files)} files parsed")
+        for path, error in self.failures.items():
+            print(f"\n{path}:\n{error}")
+
+    def write_sop_csv(self, path):
+        """One row per interaction, keyed by the source file"""
+        self.write_sop_table(path, "csv")
+
+    def write_sop_table(self, path, format=None):
+        """As write_sop_csv, or Parquet/Arrow with pyarrow, streamed in chunks (see tables.py)"""
+        table, file_of_row = self.sop_table()
+        files = np.array(self.files, dtype=object)
+        return write_sop_table(table, path, format, extra={"File": lambda start, n: files[file_of_row[start:start + n]].tolist()})
+
+
+def analyse_outputs(source, pattern="*.out", analyses=("sop", "npa"), max_workers=None, cache=None, quiet=False):
+    """Parse every matching output in a process pool (max_workers=None uses all cores).
+
+    analyses can also hold "geometry", the final coordinates of each output as a Geometry.
+    A file that fails to parse is recorded in result.failures with its traceback and does not stop the batch.
+    cache is passed on to NBO_SOP/NPA, True or a ParseCache makes re-runs over the same files cheap.
+    quiet=True counts unparsable lines instead of printing each one (see diagnostics.py).
+    """
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+    files = find_outputs(source, pattern)
+    result = BatchResult(files)
+    if not files:
+        return result
+    jobs = [(path, tuple(analyses), cache, quiet) for path in files]
+    max_workers = max_workers or os.cpu_count() or 1
+    # a few files per task keeps the pickling overhead low without starving workers at the end
+    chunksize = max(1, len(jobs) // (4 * max_workers))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for item in pool.map(_analyse_file, jobs, chunksize=chunksize):
+            path = item["path"]
+            if item["error"] is not None:
+                result.failures[path] = item["error"]
+                continue
+            if item["sop"] is not None:
+                result.sop[path] = item["sop"]
+            if item["npa"] is not None:
+                result.npa[path] = item["npa"]
+            if item["geometry"] is not None:
+                result.geometry[path] = item["geometry"]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse NBO SOP and NPA sections of many ORCA outputs in parallel.")
+    parser.add_argument("source", nargs="+", help="directories or glob patterns of ORCA outputs")
+    parser.add_argument("--pattern", default="*.out", help="file pattern used inside directories (default *.out)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--no-sop", action="store_true", help="skip the SOP section")
+    parser.add_argument("--no-npa", action="store_true", help="skip the NPA summary")
+    parser.add_argument("--cache", action="store_true", help="use the on-disk parse cache")
+    parser.add_argument("--quiet", action="store_true", help="do not print every line that fails to parse")
+    parser.add_argument("--csv", help="write every SOP interaction, keyed by file, to this CSV file")
+    args = parser.parse_args(argv)
+
+    analyses = tuple(name for name, skip in (("sop", args.no_sop), ("npa", args.no_npa)) if not skip)
+    result = analyse_outputs(args.source, args.pattern, analyses, args.workers, cache=args.cache or None, quiet=args.quiet)
+    result.print_summary()
+    if args.csv:
+        result.write_sop_csv(args.csv)
+    return 1 if result.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""OutputBlocks over an open-shell output with several NBO analyses in one job.
+
+    python benchmarks/bench_blocks.py [n_analyses] [n_interactions]
+
+Checks the step/spin tags of every block (total density, alpha, beta per analysis), with and without
+the NBO banner between analyses, and times the one-pass parse.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from blocks import OutputBlocks  # noqa: E402
+from synthetic import write_open_shell_output  # noqa: E402
+
+
+def main():
+    n_analyses = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    n_interactions = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    expected = {"npa": [None, "alpha", "beta"] * n_analyses, "sop": ["alpha", "beta"] * n_analyses}
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{n_analyses} analyses, {n_interactions} interactions per SOP table")
+        print(f"{'Output':<24} {'Blocks':>8} {'Time s':>10}")
+        print("=" * 44)
+        for banner in (True, False):
+            path = write_open_shell_output(os.path.join(tmp, f"open_shell_{banner}.out"), n_analyses, n_interactions,
+                                           banner=banner)
+            start = time.perf_counter()
+            blocks = OutputBlocks(path, quiet=True)
+            elapsed = time.perf_counter() - start
+            for kind, spins in expected.items():
+                found = [(block.step, block.spin) for block in blocks.select(kind)]
+                assert found == [(1, spin) for spin in spins], f"{kind} tags {found}"
+            print(f"{'with banner' if banner else 'without banner':<24} {len(blocks):>8} {elapsed:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare NBO_SOP's streaming SOP parse against the original readlines() implementation.
+
+    python benchmarks/bench_extract_nbo.py [n_interactions] [preamble_lines]
+
+The figures reported are those of NBO_SOP(path) itself: the interactions streamed from the SOP section
+into the columnar SOPTable, section scan included. A list of the interaction dicts (list(iter_nbo_data))
+is shown for comparison, it holds as much as the legacy result and is not what NBO_SOP keeps.
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import orca_sections  # noqa: E402
+from nbo import NBO_SOP, iter_nbo_data  # noqa: E402
+from sop_table import COLUMNS, SOPTable  # noqa: E402
+from synthetic import write_orca_output  # noqa: E402
+
+
+def legacy_extract_nbo_data(filepath):
+    """The parser as it was before the streaming rewrite, kept here only as the baseline"""
+    nbo_data = []
+    with open(filepath, 'r') as f:
+        lines = f.readlines()
+    started = False
+    for line in lines:
+        if "SECOND ORDER PERTURBATION THEORY ANALYSIS OF FOCK MATRIX IN NBO BASIS" in line:
+            started = True
+            continue
+        if started:
+            if ("Donor (L) NBO" in line or line.strip() == "" or "from" in line or "within unit" in line
+                    or "threshold" in line or "Threshold" in line or "E(2) E(NL)-E(L) F(L,NL)" in line or "=" in line):
+                continue
+            if "NATURAL BOND ORBITALS (Summary):" in line:
+                break
+            pattern = re.compile(r"""
+                ^\s*(\d+)\.\s+(LP|BD)\s*\(\s*(\d+)\s*\)\s+(.+?)\s{3,}(\d+)\.\s+(BD\*|RY|LV)\s*\(\s*(\d+)\s*\)\s+
+                (.+?)\s+([\d.-]+)\s+([\d.-]+)\s+([\d.-]+)\s*$
+            """, re.VERBOSE)
+            match = pattern.match(line)
+            if not match:
+                continue
+            nbo_data.append({
+                "Donor Index": match.group(1), "Donor Type": match.group(2), "Donor Orb No": match.group(3),
+                "Donor Atoms": re.split(r'\s*-\s*', match.group(4).strip()),
+                "Acceptor Index": match.group(5), "Acceptor Type": match.group(6), "Acceptor Orb No": match.group(7),
+                "Acceptor Atoms": re.split(r'\s*-\s*', match.group(8).strip()),
+                "E(2)": float(match.group(9)), "E Diff": float(match.group(10)), "Fock Elem": float(match.group(11)),
+            })
+    return nbo_data
+
+
+def measure(func, *args):
+    orca_sections._memo.clear()  # every parser starts from an unscanned file
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def same_table(a, b):
+    return a.atom_labels == b.atom_labels and all(np.array_equal(getattr(a, name), getattr(b, name)) for name in COLUMNS)
+
+
+def main():
+    n_interactions = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    preamble = int(sys.argv[2]) if len(sys.argv) > 2 else 500_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_orca_output(os.path.join(tmp, "bench.out"), n_interactions, preamble_lines=preamble)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{n_interactions} interactions, {preamble} preamble lines, {size_mb:.1f} MB")
+
+        legacy, t_legacy, m_legacy = measure(legacy_extract_nbo_data, path)
+        nbo, t_nbo, m_nbo = measure(lambda p: NBO_SOP(p, quiet=True), path)
+        streamed, t_list, m_list = measure(lambda p: list(iter_nbo_data(p)), path)
+        assert legacy == streamed and same_table(nbo.nbo_data, SOPTable.from_entries(legacy))
+
+        print(f"{'Parser':<28} {'Time s':>10} {'Peak MB':>10}")
+        print("=" * 50)
+        print(f"{'legacy readlines()':<28} {t_legacy:>10.3f} {m_legacy / 1e6:>10.1f}")
+        print(f"{'NBO_SOP (SOPTable)':<28} {t_nbo:>10.3f} {m_nbo / 1e6:>10.1f}")
+        print(f"{'list(iter_nbo_data)':<28} {t_list:>10.3f} {m_list / 1e6:>10.1f}")
+        print("=" * 50)
+        print(f"NBO_SOP against legacy: {t_legacy / t_nbo:.1f}x faster, peak memory {m_legacy / max(m_nbo, 1):.1f}x lower")
+
+
+if __name__ == "__main__":
+    main()
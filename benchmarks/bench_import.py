@@ -0,0 +1,42 @@
+"""Cold import time of the parsing modules, each in a fresh interpreter.
+
+    python benchmarks/bench_import.py [repeats]
+
+Also reports whether matplotlib or py3Dmol were pulled in, which they should not be until something is drawn.
+Run with -X importtime by hand for a per-module breakdown:
+
+    python -X importtime -c "import nbo" 2> importtime.txt
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PROBE = (
+    "import sys, time; t = time.perf_counter(); import {module}; t = time.perf_counter() - t; "
+    "print(t, 'matplotlib' in sys.modules, 'py3Dmol' in sys.modules)"
+)
+
+
+def time_import(module, repeats):
+    best, loaded = None, None
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.split()
+        elapsed = float(out[0])
+        best = elapsed if best is None else min(best, elapsed)
+        loaded = [name for name, flag in zip(("matplotlib", "py3Dmol"), out[1:]) if flag == "True"]
+    return best, loaded
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'Module':<12} {'Best import s':>14}  Heavy modules loaded")
+    print("=" * 56)
+    for module in ("nbo", "npa", "batch", "scene"):
+        best, loaded = time_import(module, repeats)
+        print(f"{module:<12} {best:>14.3f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
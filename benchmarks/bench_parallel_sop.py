@@ -0,0 +1,46 @@
+"""Serial SOP parsing against parse_sop_parallel with a growing number of worker processes.
+
+    python benchmarks/bench_parallel_sop.py [n_interactions] [workers ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nbo import NBO_SOP  # noqa: E402
+from sop_parallel import parse_sop_parallel  # noqa: E402
+from sop_table import COLUMNS  # noqa: E402
+from synthetic import write_orca_output  # noqa: E402
+
+
+def same_table(a, b):
+    return a.atom_labels == b.atom_labels and all(np.array_equal(getattr(a, name), getattr(b, name)) for name in COLUMNS)
+
+
+def main():
+    n_interactions = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    counts = [int(n) for n in sys.argv[2:]] or sorted({1, 2, 4, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_orca_output(os.path.join(tmp, "bench.out"), n_interactions)
+        print(f"{n_interactions} interactions, {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} cores")
+        start = time.perf_counter()
+        serial = NBO_SOP(path).nbo_data
+        t_serial = time.perf_counter() - start
+
+        print(f"{'Parser':<24} {'Time s':>10} {'Speedup':>10}")
+        print("=" * 46)
+        print(f"{'serial':<24} {t_serial:>10.3f} {1.0:>10.2f}")
+        for workers in counts:
+            start = time.perf_counter()
+            table = parse_sop_parallel(path, workers=workers)
+            elapsed = time.perf_counter() - start
+            assert same_table(serial, table)
+            print(f"{f'{workers} workers':<24} {elapsed:>10.3f} {t_serial / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
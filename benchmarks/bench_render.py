@@ -0,0 +1,51 @@
+"""Size of the serialized py3Dmol view and time to build it: one call per interaction vs the batched renderer.
+
+    python benchmarks/bench_render.py [n_interactions ...]
+
+The serialized size is what the notebook has to store and the browser has to parse before the first
+frame, the browser-side render time itself has to be measured in a notebook.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+import py3Dmol  # noqa: E402
+
+from nbo import NBO_SOP  # noqa: E402
+from synthetic import write_orca_output, write_xyz  # noqa: E402
+
+
+def build(nbo, xyz, **kwargs):
+    view = py3Dmol.view(width=1500, height=1000)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        nbo.visualise_nbo_data(xyz, view=view, display=False, donor_type=None, acceptor_type=None, **kwargs)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(view._make_html())
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [500, 2000, 5000]
+    with tempfile.TemporaryDirectory() as tmp:
+        xyz = write_xyz(os.path.join(tmp, "bench.xyz"), n_atoms=500)
+        print(f"{'Interactions':>12} {'Renderer':<28} {'Build s':>10} {'HTML kB':>10}")
+        print("=" * 64)
+        for n in sizes:
+            nbo = NBO_SOP(write_orca_output(os.path.join(tmp, f"bench{n}.out"), n, n_atoms=500))
+            for name, kwargs in (("per-interaction calls", {}),
+                                 ("batched", {"renderer": "batched"}),
+                                 ("batched, top 1000, labels>20", {"renderer": "batched", "max_cylinders": 1000, "label_min_e2": 20})):
+                elapsed, size = build(nbo, xyz, **kwargs)
+                print(f"{n:>12} {name:<28} {elapsed:>10.3f} {size / 1e3:>10.1f}")
+        print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
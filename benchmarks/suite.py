@@ -0,0 +1,219 @@
+"""Scaling benchmark of nbo.py and npa.py over synthetic ORCA outputs of growing size.
+
+    python benchmarks/suite.py                          # 10^2 .. 10^5 rows
+    python benchmarks/suite.py --max-exp 7 --atoms 500  # up to 10^7 SOP and NPA lines
+    python benchmarks/suite.py --out new.json --baseline old.json
+
+For every size one output is generated holding the final geometry, an NPA summary and a SOP table with
+that many rows (plus a matching .xyz), and these stages are measured:
+
+    extract_nbo   NBO_SOP(path), section scan included
+    extract_npa   NPA(path)
+    filter        the nbo.query() calls in FILTERS on a fresh table, index build included
+    geometry      InteractionGeometry of every interaction
+    scene         batched cylinders and labels of every interaction into a py3Dmol view
+    table         print_selection() of every interaction
+    latex         print_latex() of every interaction
+
+Times are the best of --repeat runs without tracemalloc, the peak memory comes from one more run under
+tracemalloc. Results are written as JSON. The run fails (exit code 1) when a stage is slower or bigger per
+row than benchmarks/thresholds.json allows, or more than --tolerance times slower than a --baseline run.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import geometry as geometry_module  # noqa: E402
+import orca_sections  # noqa: E402
+from geometry import load_geometry  # noqa: E402
+from interaction_geometry import InteractionGeometry  # noqa: E402
+from nbo import NBO_SOP  # noqa: E402
+from npa import NPA  # noqa: E402
+from scene import new_view  # noqa: E402
+from sop_table import SOPTable  # noqa: E402
+from synthetic import write_orca_output, write_xyz  # noqa: E402
+
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+STAGES = ("extract_nbo", "extract_npa", "filter", "geometry", "scene", "table", "latex")
+# the selections a user typically asks visualise_nbo_data for
+FILTERS = (
+    dict(),
+    dict(donor_type=None, acceptor_type=None, E2_above=10.0),
+    dict(donor="C", acceptor_type=None),
+    dict(donor="CN", donor_type="BD", acceptor_type="BD*"),
+    dict(donor_type="LP", acceptor_type="RY", E2_above=5.0, E2_below=20.0),
+)
+# stages faster than this are too noisy to compare against a baseline
+MIN_COMPARE_SECONDS = 0.05
+
+
+def forget_parsed_files():
+    # the section index and geometries are memoized per file, every timed run has to start cold
+    orca_sections._memo.clear()
+    geometry_module._memo.clear()
+
+
+class Fixture:
+    """One synthetic output and everything the later stages need from the earlier ones"""
+
+    def __init__(self, directory, rows, n_atoms, seed=0):
+        self.rows = rows
+        self.path = write_orca_output(os.path.join(directory, f"sop_{rows}.out"), rows, n_atoms, seed=seed,
+                                      npa_rows=rows, geometry=True)
+        self.xyz = write_xyz(os.path.join(directory, f"geometry_{n_atoms}.xyz"), n_atoms, seed=seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.nbo = NBO_SOP(self.path)
+        self.geometry = load_geometry(self.xyz)
+        self.selected = self.nbo.query(donor_type=None, acceptor_type=None)
+        self.interactions = InteractionGeometry(self.selected, self.geometry)
+        self.distances = self.interactions.distances.tolist()
+        self.arrays = self.nbo.nbo_data.to_arrays()
+
+    def stage(self, name):
+        """The callable that runs one stage once"""
+        if name == "extract_nbo":
+            return lambda: (forget_parsed_files(), NBO_SOP(self.path))
+        if name == "extract_npa":
+            return lambda: (forget_parsed_files(), NPA(self.path))
+        if name == "filter":
+            def run():
+                self.nbo.nbo_data = SOPTable.from_arrays(self.arrays)
+                for filters in FILTERS:
+                    self.nbo.query(**filters)
+            return run
+        if name == "geometry":
+            return lambda: InteractionGeometry(self.selected, self.geometry)
+        if name == "scene":
+            def run():
+                view = new_view(1500, 1000)
+                view.addModel(self.geometry.xyz_block(), 'xyz')
+                self.nbo._render_batched(view, self.selected, self.interactions, 0, 1, True, False, None, None, 64)
+            return run
+        if name == "table":
+            return lambda: self.nbo.print_selection(self.selected, self.distances)
+        if name == "latex":
+            return lambda: self.nbo.print_latex(self.selected, self.distances)
+        raise ValueError(f"Unknown stage {name}")
+
+
+def measure(run, repeat):
+    """(best time in seconds, peak traced bytes) of run(), its printed output discarded"""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(sizes, n_atoms, repeat, stages=STAGES):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            fixture = Fixture(tmp, rows, n_atoms)
+            for name in stages:
+                # one repeat is enough where a single run takes seconds
+                seconds, peak = measure(fixture.stage(name), repeat if rows <= 100_000 else 1)
+                result = {"stage": name, "rows": rows, "atoms": n_atoms, "seconds": seconds, "peak_bytes": peak,
+                          "us_per_row": seconds / rows * 1e6, "peak_bytes_per_row": peak / rows}
+                results.append(result)
+                print(f"{name:<12} {rows:>10} {seconds:>10.4f} {result['us_per_row']:>10.2f} {peak / 1e6:>10.1f} "
+                      f"{result['peak_bytes_per_row']:>10.0f}", flush=True)
+            os.remove(fixture.path)
+    return results
+
+
+def check_thresholds(results, thresholds):
+    """Messages for every result over its stage's per-row limits (only sizes from min_rows on are checked)"""
+    failures = []
+    min_rows = thresholds.get("min_rows", 0)
+    for result in results:
+        limits = thresholds.get("stages", {}).get(result["stage"], {})
+        if result["rows"] < min_rows:
+            continue
+        for key, limit in limits.items():
+            if result[key] > limit:
+                failures.append(f"{result['stage']} at {result['rows']} rows: {key} {result[key]:.2f} > {limit}")
+    return failures
+
+
+def check_baseline(results, baseline, tolerance):
+    """Messages for every (stage, rows) more than tolerance times slower than in the baseline results"""
+    previous = {(r["stage"], r["rows"]): r for r in baseline["results"]}
+    failures = []
+    for result in results:
+        before = previous.get((result["stage"], result["rows"]))
+        if before is None or max(before["seconds"], result["seconds"]) < MIN_COMPARE_SECONDS:
+            continue
+        if result["seconds"] > tolerance * before["seconds"]:
+            failures.append(f"{result['stage']} at {result['rows']} rows: {result['seconds']:.3f} s, "
+                            f"{result['seconds'] / before['seconds']:.2f}x the baseline {before['seconds']:.3f} s")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the SOP/NPA parsers and visualisers.")
+    parser.add_argument("--min-exp", type=int, default=2, help="smallest size is 10^min_exp rows (default 2)")
+    parser.add_argument("--max-exp", type=int, default=5, help="largest size is 10^max_exp rows (default 5)")
+    parser.add_argument("--atoms", type=int, default=200, help="atoms in the synthetic structure (default 200)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the best counts (default 3)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--out", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="per-row limits, 'none' to skip the check")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [10 ** e for e in range(args.min_exp, args.max_exp + 1)]
+    print(f"{'Stage':<12} {'Rows':>10} {'Time s':>10} {'us/row':>10} {'Peak MB':>10} {'B/row':>10}")
+    print("=" * 67)
+    results = run_suite(sizes, args.atoms, args.repeat, args.stages)
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Written {args.out}")
+
+    failures = []
+    if args.thresholds != "none":
+        with open(args.thresholds) as f:
+            failures += check_thresholds(results, json.load(f))
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += check_baseline(results, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
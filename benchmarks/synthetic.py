@@ -0,0 +1,134 @@
+"""Deterministic synthetic ORCA outputs for the benchmarks"""
+import random
+
+ELEMENTS = ["C", "H", "N", "O"]
+
+
+def _atom(elements, i):
+    return f"{elements[i]}{i + 1:>4}"
+
+
+def _orbital(rng, elements, n_atoms, types):
+    orb_type = rng.choice(types)
+    a = rng.randrange(n_atoms)
+    if orb_type in ("LP", "RY", "LV"):
+        return orb_type, _atom(elements, a)
+    b = (a + 1 + rng.randrange(n_atoms - 1)) % n_atoms
+    return orb_type, f"{_atom(elements, a)} - {_atom(elements, b)}"
+
+
+def sop_lines(n_interactions, n_atoms=50, seed=0):
+    """Yield the lines of a SOP section with n_interactions rows"""
+    rng = random.Random(seed)
+    elements = [rng.choice(ELEMENTS) for _ in range(n_atoms)]
+    yield " SECOND ORDER PERTURBATION THEORY ANALYSIS OF FOCK MATRIX IN NBO BASIS\n"
+    yield "\n"
+    yield "     Threshold for printing:   0.50 kcal/mol\n"
+    yield "                                                          E(2) E(NL)-E(L) F(L,NL)\n"
+    yield "      Donor (L) NBO              Acceptor (NL) NBO      kcal/mol   a.u.      a.u.\n"
+    yield " " + "=" * 99 + "\n"
+    yield "\n"
+    yield " within unit  1\n"
+    for i in range(n_interactions):
+        donor_type, donor_atoms = _orbital(rng, elements, n_atoms, ("LP", "BD"))
+        acceptor_type, acceptor_atoms = _orbital(rng, elements, n_atoms, ("BD*", "RY", "LV"))
+        acceptor = f"{acceptor_type}({rng.randint(1, 3):>4})" if acceptor_type == "BD*" else f"{acceptor_type} ({rng.randint(1, 3):>4})"
+        yield (f"{rng.randrange(1, 4 * n_atoms):>4}. {donor_type} ({rng.randint(1, 3):>4}) {donor_atoms:<16}"
+               f"{rng.randrange(1, 4 * n_atoms):>5}. {acceptor} {acceptor_atoms:<16}"
+               f"{rng.uniform(0.5, 40.0):>8.2f}{rng.uniform(0.1, 3.0):>8.2f}{rng.uniform(0.0, 0.2):>9.3f}\n")
+    yield "\n"
+    yield " NATURAL BOND ORBITALS (Summary):\n"
+
+
+def npa_lines(n_rows, seed=0):
+    """Yield the lines of an NPA summary with n_rows atoms, the first n_atoms of them match sop_lines/write_xyz"""
+    rng = random.Random(seed)
+    yield " Summary of Natural Population Analysis:\n"
+    yield "\n"
+    yield "                                     Natural Population\n"
+    yield "             Natural    ---------------------------------------------\n"
+    yield "  Atom No    Charge        Core      Valence    Rydberg      Total\n"
+    yield " " + "-" * 68 + "\n"
+    elements = [rng.choice(ELEMENTS) for _ in range(n_rows)]
+    values = random.Random(seed + 2)
+    for i, element in enumerate(elements):
+        charge = values.uniform(-1.0, 1.0)
+        yield (f"   {element:>2}{i + 1:>3}  {charge:>10.5f}{values.uniform(0, 2):>10.5f}{values.uniform(0, 6):>10.5f}"
+               f"{values.uniform(0, 0.1):>10.5f}{values.uniform(0, 8):>10.5f}\n")
+    yield " " + "=" * 68 + "\n"
+    yield " * Total *  0.00000\n"
+    yield "\n"
+
+
+def coordinates(n_atoms=50, seed=0, box=None):
+    """Elements and (x, y, z) of the synthetic structure, shared by write_xyz and the ORCA geometry block"""
+    rng = random.Random(seed)
+    elements = [rng.choice(ELEMENTS) for _ in range(n_atoms)]
+    box = box or 2.0 * n_atoms ** (1 / 3)
+    positions = random.Random(seed + 1)
+    return [(element, *(positions.uniform(0, box) for _ in range(3))) for element in elements]
+
+
+def geometry_lines(n_atoms=50, seed=0, box=None):
+    """Yield a CARTESIAN COORDINATES (ANGSTROEM) block of the structure write_xyz writes"""
+    yield "---------------------------------\n"
+    yield "CARTESIAN COORDINATES (ANGSTROEM)\n"
+    yield "---------------------------------\n"
+    for element, x, y, z in coordinates(n_atoms, seed, box):
+        yield f"  {element:<2} {x:>13.6f} {y:>13.6f} {z:>13.6f}\n"
+    yield "\n"
+
+
+def write_orca_output(path, n_interactions, n_atoms=50, preamble_lines=0, seed=0, npa_rows=0, geometry=False):
+    """Write a fake ORCA output holding a SOP table, optionally behind preamble_lines of filler.
+
+    geometry=True adds the final coordinates of the n_atoms structure, npa_rows > 0 an NPA summary before the SOP table.
+    """
+    with open(path, "w") as f:
+        for i in range(preamble_lines):
+            f.write(f" CYCLE {i:>8}   E = {-1234.5678901 - i * 1e-7:.10f}   dE = 1.0e-07\n")
+        if geometry:
+            f.writelines(geometry_lines(n_atoms, seed))
+        if npa_rows:
+            f.writelines(npa_lines(npa_rows, seed))
+        f.writelines(sop_lines(n_interactions, n_atoms, seed))
+        for i in range(preamble_lines // 10):
+            f.write(f" NBO summary filler line {i}\n")
+    return path
+
+
+def nbo_banner():
+    """Yield the banner the NBO program prints at the start of every analysis"""
+    yield " *********************************** NBO 7.0 ***********************************\n"
+    yield "             N A T U R A L   A T O M I C   O R B I T A L   A N D\n"
+    yield "          N A T U R A L   B O N D   O R B I T A L   A N A L Y S I S\n"
+    yield " *******************************************************************************\n"
+
+
+def write_open_shell_output(path, n_analyses=2, n_interactions=100, n_atoms=50, seed=0, banner=True):
+    """Write a fake open-shell ORCA output with n_analyses NBO analyses in one job.
+
+    Each analysis holds a total-density NPA summary followed by alpha and beta halves with an NPA summary
+    and a SOP table each, so its blocks are tagged None, "alpha", "beta". banner=False leaves out the NBO
+    banner, as in outputs trimmed to their tables.
+    """
+    with open(path, "w") as f:
+        for analysis in range(n_analyses):
+            if banner:
+                f.writelines(nbo_banner())
+            f.writelines(npa_lines(n_atoms, seed + analysis))
+            for half, spin in enumerate(("Alpha", "Beta")):
+                block_seed = seed + 10 * analysis + half
+                f.write(f"\n ***** {spin} spin orbitals *****\n\n")
+                f.writelines(npa_lines(n_atoms, block_seed))
+                f.writelines(sop_lines(n_interactions, n_atoms, block_seed))
+    return path
+
+
+def write_xyz(path, n_atoms=50, seed=0, box=None):
+    """XYZ geometry whose elements match sop_lines(..., n_atoms, seed), atoms spread over a cube of edge box"""
+    with open(path, "w") as f:
+        f.write(f"{n_atoms}\nsynthetic geometry, seed {seed}\n")
+        for element, x, y, z in coordinates(n_atoms, seed, box):
+            f.write(f"{element:<2} {x:>12.6f} {y:>12.6f} {z:>12.6f}\n")
+    return path
@@ -0,0 +1,94 @@
+"""Every SOP table and NPA summary of an output, tagged by job step and spin, from one pass over the file.
+
+    from blocks import OutputBlocks
+    blocks = OutputBlocks("opt_then_freq.out")
+    blocks.tags("sop")                          # [(1, None), (2, 'alpha'), (2, 'beta'), ...] in file order
+    blocks.sop(step=2, spin="beta")             # SOPTable of that block
+    blocks.sop(step=1, occurrence=-1)           # the last SOP table of step 1, e.g. the final optimisation cycle
+    blocks.sop(step=2, occurrence=None)         # alpha and beta of step 2 joined into one table
+    blocks.nbo(step=2, spin="alpha").visualise_nbo_data("final.xyz")
+    blocks.npa(step=3).visualise_property("final.xyz")
+
+NBO_SOP and NPA read the first SOP table / NPA summary of a file. Here the section index (see
+orca_sections.py) tags every section with the ORCA job number and the alpha/beta half it is in, and all
+of them are parsed through one open file in file order, so twenty blocks cost one read, not twenty.
+Selecting a block afterwards is a lookup in the parsed blocks.
+"""
+import time
+from collections import namedtuple
+
+from diagnostics import Metrics
+from nbo import NBO_SOP, parse_sop_lines, sop_body
+from npa import NPA, parse_npa_lines
+from orca_sections import section_index
+from sop_table import SOPTable
+
+KINDS = ("sop", "npa")
+
+# one parsed section: kind ("sop" or "npa"), ORCA job step, spin ("alpha", "beta" or None), occurrence
+# (0-based count of earlier blocks with the same kind, step and spin) and the SOPTable or npa_data dict
+Block = namedtuple("Block", ["kind", "step", "spin", "occurrence", "data"])
+
+
+class OutputBlocks:
+    """The SOP and NPA blocks of one ORCA output (path, compressed file or file object), parsed in one pass"""
+
+    def __init__(self, filepath, kinds=KINDS, metrics=None, quiet=False):
+        self.filepath = filepath
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.quiet = quiet
+        with self.metrics.span("read", "sections"):
+            # the whole file, a compressed one is decompressed once keeping only the SOP/NPA bodies
+            index = section_index(filepath, keep=kinds)
+        self.blocks = []
+        seen = {}
+        for section, lines in index.iter_sections([s for s in index.sections if s.kind in kinds]):
+            tag = (section.kind, section.step, section.spin)
+            start = time.perf_counter()
+            if section.kind == "sop":
+                data = SOPTable.from_entries(parse_sop_lines(sop_body(lines), self.metrics, quiet))
+            else:
+                data, skipped, errors, samples = parse_npa_lines(lines, quiet)
+                self.metrics.add_counts("npa", len(data), skipped, errors, samples, quiet)
+            self.metrics.add_span("parse", time.perf_counter() - start, f"{section.kind} step {section.step} {section.spin or ''}".rstrip())
+            self.blocks.append(Block(section.kind, section.step, section.spin, seen.get(tag, 0), data))
+            seen[tag] = seen.get(tag, 0) + 1
+
+    def tags(self, kind="sop"):
+        """Distinct (step, spin) of the blocks of one kind, in file order"""
+        return list(dict.fromkeys((block.step, block.spin) for block in self.blocks if block.kind == kind))
+
+    def select(self, kind="sop", step=None, spin=None):
+        """Blocks of one kind, only those of one job step and/or spin when given"""
+        return [block for block in self.blocks if block.kind == kind and (step is None or block.step == step)
+                and (spin is None or block.spin == spin)]
+
+    def block(self, kind="sop", step=None, spin=None, occurrence=0):
+        """The occurrence-th (negative: from the end) block matching the tags"""
+        found = self.select(kind, step, spin)
+        if not -len(found) <= occurrence < len(found):
+            raise ValueError(f"No {kind} block {occurrence} with step={step}, spin={spin} in {self.filepath}, "
+                             f"there are {len(found)}; tags present: {self.tags(kind)}")
+        return found[occurrence]
+
+    def sop(self, step=None, spin=None, occurrence=0):
+        """SOPTable of one block, or with occurrence=None of every matching block joined in file order"""
+        if occurrence is None:
+            return SOPTable.concat(block.data for block in self.select("sop", step, spin))
+        return self.block("sop", step, spin, occurrence).data
+
+    def nbo(self, step=None, spin=None, occurrence=0):
+        """NBO_SOP over sop(...), for visualise_nbo_data, print_nbo_data, query, ..."""
+        return NBO_SOP.from_table(self.sop(step, spin, occurrence), filepath=self.filepath, metrics=self.metrics, quiet=self.quiet)
+
+    def npa(self, step=None, spin=None, occurrence=0):
+        """NPA over one NPA summary, for visualise_property and print_npa_data"""
+        npa_data = self.block("npa", step, spin, occurrence).data
+        return NPA.from_data(npa_data, filepath=self.filepath, metrics=self.metrics, quiet=self.quiet)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __repr__(self):
+        counts = {kind: len(self.select(kind)) for kind in KINDS}
+        return f"OutputBlocks({self.filepath!r}, {counts['sop']} SOP, {counts['npa']} NPA blocks)"
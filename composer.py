@@ -0,0 +1,156 @@
+"""Several analyses drawn into one py3Dmol view over one parsed geometry.
+
+    scene = SceneComposer("job.xyz")
+    scene.add_nbo(nbo, donor_type=None, acceptor_type="BD*", E2_above=2.0)
+    scene.add_npa(npa, "Natural Charge")
+    scene.add_qtaim(qtaim, connect_atoms_A_B=True, A="O", B="H")
+    scene.highlight()                       # a sphere on every atom the overlays above touch
+    scene.render()
+
+The geometry is loaded once and every overlay's selection is worked out when it is added. render() then
+builds the view and draws the overlays in order, each as a few batched JavaScript calls (see scene.py).
+The atoms an overlay touches are kept as a set, highlight() draws them with one call.
+"""
+import time
+
+import numpy as np
+
+from diagnostics import Metrics
+from geometry import load_geometry
+from interaction_geometry import InteractionGeometry
+from scene import add_labels, add_spheres, colorbar, export, new_view, value_colors
+
+# highlight sphere colours, the ones combine_qtaim_and_nbo_data always used
+HIGHLIGHT_COLORS = {"N": "blue", "H": "white", "O": "red"}
+
+
+class SceneComposer:
+    """One view, one Geometry and the overlays registered on it, drawn by render()"""
+
+    def __init__(self, geometry, width=1500, height=1500, stick_radius=0.03, perspective=False, metrics=None):
+        # an xyz path, a Geometry or an ORCA output (its final coordinates)
+        self.source = geometry
+        self.geometry = load_geometry(geometry)
+        self.width = width
+        self.height = height
+        self.stick_radius = stick_radius
+        self.perspective = perspective
+        self.metrics = metrics if metrics is not None else Metrics()
+        # (name, draw(view) -> (set of 0-based atoms, colour bar arguments or None))
+        self.layers = []
+        self.atoms = set()
+        self.view = None
+
+    def add_layer(self, name, draw):
+        """Register any draw(view) -> (atoms, colour bar (vmin, vmax, label, cmap) or None) callable"""
+        self.layers.append((name, draw))
+        return self
+
+    def add_nbo(self, nbo, label=True, proportional_radius=False, max_cylinders=None, label_min_e2=None, color_bins=64,
+                print_table=False, print_latex=False, **filters):
+        """SOP interactions of an NBO_SOP as cylinders coloured by E(2), filters as in visualise_nbo_data"""
+        selected = nbo.query(**filters)
+        interactions = InteractionGeometry(selected, self.geometry)
+        atoms = set(np.union1d(interactions.start_atom, interactions.end_atom).tolist())
+        E2_above, E2_below = filters.get("E2_above"), filters.get("E2_below")
+
+        def draw(view):
+            vmin = E2_above if E2_above is not None else 0
+            vmax = E2_below if E2_below is not None else 1 if vmin == 0 else vmin + 0.1
+            vmin, vmax, _ = nbo._render_batched(view, selected, interactions, vmin, vmax, label, proportional_radius,
+                                                 max_cylinders, label_min_e2, color_bins, quiet=True)
+            distances = interactions.distances.tolist()
+            if print_table:
+                nbo.print_selection(selected, distances)
+            if print_latex:
+                nbo.print_latex(selected, distances)
+            return atoms, (vmin, vmax, f'E(2) kcal/mol range\n[min: {vmin:.2f}, max: {vmax:.2f}]', "rainbow")
+        return self.add_layer("nbo", draw)
+
+    def add_npa(self, npa, property_name="Natural Charge", gradient="rainbow", labels=True, radius=0.35, color_bins=64, opacity=0.8):
+        """One NPA property as coloured spheres (and value labels) on the atoms it matches"""
+        values, _, _, valid = npa.match_geometry(self.geometry, property_name)
+        rows = np.flatnonzero(valid)
+        indices = npa.atom_indices[rows]
+        values = values[rows]
+        cmap = gradient.lower()
+
+        def draw(view):
+            if not len(rows):
+                return set(), None
+            vmin, vmax = float(values.min()), float(values.max())
+            colors, _ = value_colors(values, vmin, vmax, cmap=cmap, bins=color_bins)
+            centers = self.geometry.coordinates[indices]
+            add_spheres(view, centers, colors, radius, opacity=opacity)
+            if labels:
+                add_labels(view, [f"{value:.3f}" for value in values.tolist()], centers, colors,
+                           {'backgroundOpacity': 0.5, 'fontColor': 'black', 'fontSize': 10})
+            return set(indices.tolist()), (vmin, vmax, property_name, cmap)
+        return self.add_layer("npa", draw)
+
+    def add_qtaim(self, qtaim, **options):
+        """A QTAIM object's own visualise(xyz, view=..., display=False, **options), drawn into the shared view"""
+        def draw(view):
+            connections = qtaim.visualise(self.geometry.path or self.source, view=view, display=False, **options) or ()
+            return {index for pair in connections for index in pair}, None
+        return self.add_layer("qtaim", draw)
+
+    def add_points(self, points, colors="orange", radius=0.1, labels=None, name="points"):
+        """Arbitrary points, e.g. critical point coordinates, as spheres with optional labels"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        colors = [colors] * len(points) if isinstance(colors, str) else list(colors)
+
+        def draw(view):
+            add_spheres(view, points, colors, radius)
+            if labels is not None:
+                add_labels(view, list(labels), points, colors, {'backgroundOpacity': 0.5, 'fontColor': 'black', 'fontSize': 10})
+            return set(), None
+        return self.add_layer(name, draw)
+
+    def highlight(self, atoms=None, radius=0.2, colors=None):
+        """Sphere on each atom given, or on every atom the overlays registered before this touch"""
+        colors = dict(HIGHLIGHT_COLORS, **(colors or {}))
+
+        def draw(view):
+            chosen = np.array(sorted(self.atoms if atoms is None else set(atoms)), dtype=np.int64)
+            elements = self.geometry.elements[chosen].tolist()
+            add_spheres(view, self.geometry.coordinates[chosen], [colors.get(e, "gray") for e in elements], radius, opacity=1)
+            return set(), None
+        return self.add_layer("highlight", draw)
+
+    def render(self, display=True, export_to=None):
+        """Build the view and draw every overlay into it; export_to writes files instead of displaying"""
+        start = time.perf_counter()
+        view = new_view(self.width, self.height)
+        view.addModel(self.geometry.xyz_block(), 'xyz')
+        view.setStyle({'stick': {'radius': self.stick_radius}})
+        if self.perspective:
+            view.setViewStyle({'style': 'perspective'})
+        self.atoms = set()
+        bars = []
+        for name, draw in self.layers:
+            atoms, bar = draw(view)
+            self.atoms |= atoms
+            if bar is not None:
+                bars.append((name, bar))
+        self.metrics.add_span("render", time.perf_counter() - start, "composer")
+        self.view = view
+
+        headless = export_to is not None
+        # a pyplot figure only when it is shown, so nothing is left open for a returned view
+        figures = [(name, colorbar(vmin, vmax, label, cmap=cmap, ticks=name == "nbo", headless=headless or not display))
+                   for name, (vmin, vmax, label, cmap) in bars]
+        if headless:
+            with self.metrics.span("export"):
+                written = export(export_to, view=view)
+                for name, fig in figures:
+                    written += export(f"{export_to}_{name}", fig=fig)
+            return written
+        if display:
+            import matplotlib.pyplot as plt
+            view.zoomTo()
+            view.show()
+            if figures:
+                plt.show()
+            return None
+        return view
@@ -0,0 +1,87 @@
+"""Timings of the pipeline stages and line counters of the parsers.
+
+    from diagnostics import Metrics
+    metrics = Metrics()
+    nbo = NBO_SOP("job.out", metrics=metrics, quiet=True)
+    nbo.visualise_nbo_data("job.xyz")            # uses the metrics given to NBO_SOP
+    metrics.report()
+
+Stages: read (finding the sections), parse, filter, geometry, render and export. Counters are kept per
+section ("sop", "npa") for parsed, skipped (headers, separators, blank lines) and errored lines.
+Everything also goes to the "nbo_vis" logger at DEBUG level, and to callback(event) if one is given,
+where event is a dict with "type" "span" or "counts".
+
+quiet=True on NBO_SOP, NPA, OutputTail and the visualisers drops the per-line "Parse error" prints and
+the banners and tables: bad lines are only counted, the first few kept in error_samples, and one
+warning per section is logged instead.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("nbo_vis")
+
+STAGES = ("read", "parse", "filter", "geometry", "render", "export")
+# bad lines kept per section for error reports
+MAX_ERROR_SAMPLES = 20
+
+
+class Metrics:
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.spans = {}         # stage -> [total seconds, number of spans]
+        self.counters = {}      # section -> {"parsed": n, "skipped": n, "errors": n}
+        self.error_samples = {}  # section -> first MAX_ERROR_SAMPLES bad lines
+
+    @contextmanager
+    def span(self, stage, detail=""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(stage, time.perf_counter() - start, detail)
+
+    def add_span(self, stage, seconds, detail=""):
+        total = self.spans.setdefault(stage, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+        logger.debug("%s%s: %.4f s", stage, f" ({detail})" if detail else "", seconds)
+        if self.callback is not None:
+            self.callback({"type": "span", "stage": stage, "detail": detail, "seconds": seconds})
+
+    def add_counts(self, section, parsed=0, skipped=0, errors=0, samples=(), quiet=False):
+        """Add one parse's counts, samples are the first of its bad lines"""
+        counts = self.counters.setdefault(section, {"parsed": 0, "skipped": 0, "errors": 0})
+        counts["parsed"] += parsed
+        counts["skipped"] += skipped
+        counts["errors"] += errors
+        kept = self.error_samples.setdefault(section, [])
+        kept.extend(samples[:MAX_ERROR_SAMPLES - len(kept)])
+        if errors:
+            # in quiet mode this one line replaces the per-line prints
+            logger.log(logging.WARNING if quiet else logging.DEBUG, "%s: %d lines could not be parsed, first: %r",
+                       section, errors, samples[0] if samples else None)
+        if self.callback is not None:
+            self.callback({"type": "counts", "section": section, "parsed": parsed, "skipped": skipped, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "spans": {stage: {"seconds": seconds, "count": count} for stage, (seconds, count) in self.spans.items()},
+            "counters": {section: dict(counts) for section, counts in self.counters.items()},
+            "error_samples": {section: list(lines) for section, lines in self.error_samples.items() if lines},
+        }
+
+    def report(self):
+        print(f"{'Stage':<12} {'Calls':>6} {'Time s':>10}")
+        print("=" * 30)
+        for stage in sorted(self.spans, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            seconds, count = self.spans[stage]
+            print(f"{stage:<12} {count:>6} {seconds:>10.4f}")
+        print()
+        print(f"{'Section':<12} {'Parsed':>10} {'Skipped':>10} {'Errors':>10}")
+        print("=" * 45)
+        for section, counts in self.counters.items():
+            print(f"{section:<12} {counts['parsed']:>10} {counts['skipped']:>10} {counts['errors']:>10}")
+
+    def __repr__(self):
+        return f"Metrics(spans={sorted(self.spans)}, counters={self.counters})"
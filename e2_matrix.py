@@ -0,0 +1,215 @@
+"""Donor -> acceptor E(2) matrices per atom or per fragment, stored sparse.
+
+    m = nbo.e2_matrix(donor_type=None, acceptor_type=None)                # atom -> atom, summed E(2)
+    m = nbo.e2_matrix(fragments={"water": range(0, 300), "solute": range(300, 342)}, donor_type=None, acceptor_type=None)
+    m.cell("water", "solute"), m.row_totals(), m.top(10)
+    m.heatmap()
+    by_pair = E2Matrix.by_type_pair(nbo.nbo_data, how="count")        # {("LP", "BD*"): E2Matrix, ...}
+
+Only the (donor, acceptor) cells holding at least one interaction are kept, as sorted (row, col, value)
+arrays built in one NumPy pass over the table, so thousands of atoms cost nothing beyond the interactions.
+An interaction belongs to the last atom of each NBO, the atoms visualise_nbo_data draws the cylinder
+between (assign="last"), or with assign="each" to every donor atom / acceptor atom pair of its NBOs,
+counted once per cell. Rows and columns are 0-based atom indexes or fragment numbers.
+"""
+import numpy as np
+
+from sop_table import ACCEPTOR_TYPES, DONOR_TYPES
+
+HOW = ("sum", "max", "count")
+# largest dense matrix to_dense() builds without being asked to
+MAX_DENSE_CELLS = 10_000_000
+
+
+def _group(keys, values, how):
+    # unique sorted keys and the sum, max or count of the values of each
+    if not len(keys):
+        return keys, np.empty(0)
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    if how == "sum":
+        totals = np.add.reduceat(values, starts)
+    elif how == "max":
+        totals = np.maximum.reduceat(values, starts)
+    else:
+        totals = np.diff(np.r_[starts, len(keys)]).astype(np.float64)
+    return keys[starts], totals
+
+
+def fragment_map(fragments, n_atoms, rest=None):
+    """(atom -> fragment number array, -1 for atoms in no fragment; fragment names).
+
+    fragments is {name: atom indexes} or a list of atom index sets (named F1, F2, ...); atoms in none of
+    them go to a fragment called rest, or are left out when rest is None.
+    """
+    if not isinstance(fragments, dict):
+        fragments = {f"F{i + 1}": atoms for i, atoms in enumerate(fragments)}
+    names = list(fragments)
+    members = [np.asarray(list(atoms), dtype=np.int64) for atoms in fragments.values()]
+    n_atoms = max([n_atoms] + [int(atoms.max()) + 1 for atoms in members if len(atoms)])
+    of_atom = np.full(n_atoms, -1, dtype=np.int64)
+    for number, atoms in enumerate(members):
+        if np.any(atoms < 0):
+            raise ValueError(f"Fragment {names[number]} has a negative atom index")
+        taken = atoms[of_atom[atoms] >= 0]
+        if len(taken):
+            raise ValueError(f"Atom {taken[0]} is in both {names[of_atom[taken[0]]]} and {names[number]}")
+        of_atom[atoms] = number
+    if rest is not None:
+        of_atom[of_atom < 0] = len(names)
+        names.append(rest)
+    return of_atom, names
+
+
+class E2Matrix:
+    """Sparse donor -> acceptor matrix: sorted cells (rows[i], cols[i]) holding values[i]"""
+
+    def __init__(self, rows, cols, values, row_labels, col_labels, how="sum"):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.row_labels = list(row_labels)
+        self.col_labels = list(col_labels)
+        self.how = how
+
+    @classmethod
+    def from_table(cls, table, fragments=None, how="sum", assign="last", n_atoms=0, rest=None):
+        """Aggregate an SOPTable (e.g. nbo.query(...)) per donor/acceptor atom, or per fragment if given"""
+        if how not in HOW:
+            raise ValueError(f"how must be one of {HOW}, not {how!r}")
+        donor = table.atom_index("donor")
+        acceptor = table.atom_index("acceptor")
+        n_atoms = max(n_atoms, int(table.label_index.max()) + 1 if len(table.label_index) else 0)
+        if assign == "last":
+            # the last real atom of each NBO, column 1 when it is set
+            donor = np.where(donor[:, 1] >= 0, donor[:, 1], donor[:, 0])[:, None]
+            acceptor = np.where(acceptor[:, 1] >= 0, acceptor[:, 1], acceptor[:, 0])[:, None]
+        elif assign != "each":
+            raise ValueError(f"assign must be 'last' or 'each', not {assign!r}")
+
+        if fragments is None:
+            group_of = np.arange(n_atoms + 1, dtype=np.int64)
+            group_of[-1] = -1
+            labels = [str(i + 1) for i in range(n_atoms)]
+            for label, index in zip(table.atom_labels, table.label_index.tolist()):
+                labels[index] = label.replace(" ", "")
+        else:
+            group_of, labels = fragment_map(fragments, n_atoms, rest)
+            group_of = np.append(group_of, -1)
+        # padding (-1) indexes the trailing -1 of group_of, and stays out of every cell
+        donor_group = group_of[donor]
+        acceptor_group = group_of[acceptor]
+
+        # every (row of the table, donor group, acceptor group) combination once
+        n_groups = max(len(labels), 1)
+        keys = [np.empty(0, dtype=np.int64)]
+        for i in range(donor_group.shape[1]):
+            for j in range(acceptor_group.shape[1]):
+                ok = (donor_group[:, i] >= 0) & (acceptor_group[:, j] >= 0)
+                cell = donor_group[ok, i] * n_groups + acceptor_group[ok, j]
+                keys.append(np.flatnonzero(ok) * (n_groups * n_groups) + cell)
+        keys = np.unique(np.concatenate(keys))
+        cells, totals = _group(keys % (n_groups * n_groups), table.e2[keys // (n_groups * n_groups)], how)
+        return cls(cells // n_groups, cells % n_groups, totals, labels, labels, how)
+
+    @classmethod
+    def by_type_pair(cls, table, **options):
+        """{(donor type, acceptor type): E2Matrix} for every type pair present in the table"""
+        pair = table.donor_type.astype(np.int64) * len(ACCEPTOR_TYPES) + table.acceptor_type
+        matrices = {}
+        for code in np.unique(pair).tolist():
+            key = (DONOR_TYPES[code // len(ACCEPTOR_TYPES)], ACCEPTOR_TYPES[code % len(ACCEPTOR_TYPES)])
+            matrices[key] = cls.from_table(table.take(np.flatnonzero(pair == code)), **options)
+        return matrices
+
+    @property
+    def shape(self):
+        return len(self.row_labels), len(self.col_labels)
+
+    def _position(self, key, labels):
+        return labels.index(key) if isinstance(key, str) else int(key)
+
+    def cell(self, row, col):
+        """Value of one cell (by number or label), 0 where there is no interaction"""
+        key = self._position(row, self.row_labels) * self.shape[1] + self._position(col, self.col_labels)
+        keys = self.rows * self.shape[1] + self.cols
+        i = np.searchsorted(keys, key)
+        return float(self.values[i]) if i < len(keys) and keys[i] == key else 0.0
+
+    def _totals(self, groups, size):
+        if self.how == "max":
+            totals = np.zeros(size)
+            np.maximum.at(totals, groups, self.values)
+            return totals
+        return np.bincount(groups, weights=self.values, minlength=size)
+
+    def row_totals(self):
+        """Per donor row: the sum of its cells (sum, count) or their max (max)"""
+        return self._totals(self.rows, self.shape[0])
+
+    def col_totals(self):
+        """Per acceptor column, as row_totals"""
+        return self._totals(self.cols, self.shape[1])
+
+    def top(self, n=10):
+        """[(donor label, acceptor label, value)] of the n largest cells"""
+        order = np.argsort(-self.values, kind="stable")[:n]
+        return [(self.row_labels[r], self.col_labels[c], v) for r, c, v in
+                zip(self.rows[order].tolist(), self.cols[order].tolist(), self.values[order].tolist())]
+
+    def to_dense(self, max_cells=MAX_DENSE_CELLS):
+        n_rows, n_cols = self.shape
+        if n_rows * n_cols > max_cells:
+            raise ValueError(f"A dense {n_rows}x{n_cols} matrix is too large, raise max_cells or use the sparse cells")
+        dense = np.zeros(self.shape)
+        dense[self.rows, self.cols] = self.values
+        return dense
+
+    def to_scipy(self):
+        """scipy.sparse COO matrix of the cells, needs scipy"""
+        from scipy.sparse import coo_matrix
+        return coo_matrix((self.values, (self.rows, self.cols)), shape=self.shape)
+
+    def heatmap(self, max_size=40, cmap="rainbow", display=True, headless=False):
+        """Heatmap of the rows and columns with the largest totals (at most max_size of each).
+
+        Returns the matplotlib figure; headless builds it without pyplot, as for the colour bars.
+        """
+        row_totals, col_totals = self.row_totals(), self.col_totals()
+        row_order = np.argsort(-row_totals, kind="stable")[:max_size]
+        col_order = np.argsort(-col_totals, kind="stable")[:max_size]
+        row_order = np.sort(row_order[row_totals[row_order] > 0])
+        col_order = np.sort(col_order[col_totals[col_order] > 0])
+        row_pos = np.full(self.shape[0], -1, dtype=np.int64)
+        row_pos[row_order] = np.arange(len(row_order))
+        col_pos = np.full(self.shape[1], -1, dtype=np.int64)
+        col_pos[col_order] = np.arange(len(col_order))
+        shown = (row_pos[self.rows] >= 0) & (col_pos[self.cols] >= 0)
+        grid = np.full((len(row_order), len(col_order)), np.nan)
+        grid[row_pos[self.rows[shown]], col_pos[self.cols[shown]]] = self.values[shown]
+
+        if headless:
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=(8, 7))
+        else:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(figsize=(8, 7))
+        ax = fig.add_subplot(111)
+        image = ax.imshow(np.ma.masked_invalid(grid), cmap=cmap, aspect="auto")
+        ax.set_xticks(range(len(col_order)))
+        ax.set_xticklabels([self.col_labels[i] for i in col_order.tolist()], rotation=90, fontsize=7)
+        ax.set_yticks(range(len(row_order)))
+        ax.set_yticklabels([self.row_labels[i] for i in row_order.tolist()], fontsize=7)
+        ax.set_xlabel("Acceptor")
+        ax.set_ylabel("Donor")
+        unit = "interactions" if self.how == "count" else f"{self.how} E(2) kcal/mol"
+        fig.colorbar(image, ax=ax, label=unit)
+        fig.tight_layout()
+        if display and not headless:
+            import matplotlib.pyplot as plt
+            plt.show()
+        return fig
+
+    def __repr__(self):
+        return f"E2Matrix({self.shape[0]}x{self.shape[1]}, {len(self.values)} cells, how={self.how!r})"
@@ -0,0 +1,169 @@
+"""Interactive filtering of the SOP interactions in one live py3Dmol view (Jupyter, needs ipywidgets).
+
+    from explorer import NBOExplorer
+    explorer = NBOExplorer(nbo, "job.xyz")
+    explorer.show()                     # viewer, colour bar and the filter widgets
+    explorer.update(donor="O", E2_above=2.0)   # the same from code, only the difference is drawn
+
+The geometry, the endpoints of every interaction and their colours are worked out once, on one colour
+scale over the full E(2) range, so an interaction looks the same whenever it is shown. Filter results are
+memoized per (donor, acceptor, type) criteria, sorted by E(2), and the E(2) range is cut from them with a
+binary search. A change of filters only adds the cylinders and labels that entered the selection and
+removes the ones that left it (scene.add_keyed/remove_keyed), the scene on screen is never redrawn. The
+script a new render of the view replays is reset to the molecule and the current selection each time, so
+it does not grow with the number of updates.
+"""
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from diagnostics import Metrics
+from interaction_geometry import InteractionGeometry
+from scene import add_keyed, colorbar, new_view, remove_keyed, reset_start, value_colors
+from sop_query import SOPQuery
+from sop_table import ACCEPTOR_TYPES, DONOR_TYPES
+
+# filter criteria whose sorted rows the explorer keeps
+FILTER_MEMO = 32
+LABEL_STYLE = {'backgroundOpacity': 0.3, 'fontSize': 10, 'fontColor': 'black', 'fontWeight': 'bold'}
+
+
+class NBOExplorer:
+    """One NBO_SOP (or SOPTable), its geometry and one live view, redrawn by difference as filters change"""
+
+    def __init__(self, nbo, xyz_file, width=1000, height=700, label=True, color_bins=64, memo_size=FILTER_MEMO, metrics=None):
+        self.table = getattr(nbo, "nbo_data", nbo)
+        self.metrics = metrics if metrics is not None else getattr(nbo, "metrics", None) or Metrics()
+        self.width = width
+        self.height = height
+        self.label = label
+        self.memo_size = memo_size
+        start = time.perf_counter()
+        self.interactions = InteractionGeometry(self.table, xyz_file)
+        self.geometry = self.interactions.geometry
+        e2 = self.table.e2
+        self.vmin = min(0.0, float(e2.min())) if len(e2) else 0.0
+        self.vmax = max(1.0, float(e2.max())) if len(e2) else 1.0
+        self.colors, _ = value_colors(e2, self.vmin, self.vmax, bins=color_bins)
+        self.metrics.add_span("render", time.perf_counter() - start, "explorer setup")
+        self.filters = dict(donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None)
+        self.shown = np.empty(0, dtype=np.int64)
+        self.view = None
+        self._base_js = ""
+        self._memo = OrderedDict()
+        self._widgets = None
+
+    def _sorted_rows(self, query):
+        # rows matching everything but the E(2) range, ascending E(2)
+        key = query.key()[:4]
+        rows = self._memo.get(key)
+        if rows is None:
+            rows = SOPQuery(*key).rows(self.table)
+            rows = rows[np.argsort(self.table.e2[rows], kind="stable")]
+            self._memo[key] = rows
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(key)
+        return rows
+
+    def selection(self, **filters):
+        """Sorted row numbers matching the filters (visualise_nbo_data's), on top of the current ones"""
+        filters = dict(self.filters, **filters)
+        query = SOPQuery(**filters)
+        rows = self._sorted_rows(query)
+        e2 = self.table.e2[rows]
+        # both ends inclusive, as SOPIndex.rows_e2_between
+        lo = 0 if query.E2_above is None else np.searchsorted(e2, query.E2_above, side="left")
+        hi = len(rows) if query.E2_below is None else np.searchsorted(e2, query.E2_below, side="right")
+        return np.sort(rows[lo:hi])
+
+    def _draw(self, rows, start=True, update=True):
+        if self.view is None or not len(rows):
+            return
+        texts = [f"E(2): {value:.2f}" for value in self.table.e2[rows].tolist()] if self.label else None
+        add_keyed(self.view, rows, self.interactions.start[rows], self.interactions.end[rows],
+                  [self.colors[i] for i in rows.tolist()], 0.05, texts=texts, label_style=LABEL_STYLE,
+                  start=start, update=update)
+
+    def build_view(self):
+        """The py3Dmol view with the molecule and the current selection"""
+        view = new_view(self.width, self.height)
+        view.addModel(self.geometry.xyz_block(), 'xyz')
+        view.setStyle({'stick': {'radius': 0.03}})
+        view.setBackgroundColor('white')
+        view.zoomTo()
+        self.view = view
+        # the molecule alone, what a new render starts from before the selection of the moment
+        self._base_js = view.startjs
+        self._draw(self.shown)
+        return view
+
+    def update(self, **filters):
+        """Apply new filter values: (rows added, rows removed), only those are drawn or taken out"""
+        start = time.perf_counter()
+        selected = self.selection(**filters)
+        self.filters.update(filters)
+        added = np.setdiff1d(selected, self.shown, assume_unique=True)
+        removed = np.setdiff1d(self.shown, selected, assume_unique=True)
+        self.shown = selected
+        if self.view is not None:
+            # the live viewer gets the difference, a new render only the current selection
+            remove_keyed(self.view, removed, start=False)
+            self._draw(added, start=False)
+            reset_start(self.view, self._base_js)
+            self._draw(selected, update=False)
+            if self._widgets is not None and (len(added) or len(removed)):
+                # runs the queued JavaScript in the viewer already on screen
+                patch = self._widgets["patch"]
+                patch.clear_output()
+                with patch:
+                    self.view.update()
+        self.metrics.add_span("render", time.perf_counter() - start, f"explorer +{len(added)} -{len(removed)}")
+        if self._widgets is not None:
+            self._widgets["status"].value = f"{len(selected)} of {len(self.table)} interactions shown (+{len(added)} -{len(removed)})"
+        return added, removed
+
+    def show(self):
+        """Display the viewer, the colour bar and the filter widgets; every widget change calls update()"""
+        try:
+            import ipywidgets as widgets
+        except ImportError:
+            raise ImportError("NBOExplorer.show needs ipywidgets, install it with `pip install ipywidgets`") from None
+        from IPython.display import display
+        import matplotlib.pyplot as plt
+
+        self.shown = self.selection()
+        lo, hi = self.filters["E2_above"], self.filters["E2_below"]
+        e2_range = widgets.FloatRangeSlider(value=(self.vmin if lo is None else lo, self.vmax if hi is None else hi),
+                                            min=self.vmin, max=self.vmax, step=(self.vmax - self.vmin) / 200,
+                                            description="E(2)", continuous_update=False, readout_format=".2f")
+        donor = widgets.Text(value=self.filters["donor"] or "", description="Donor", placeholder="e.g. O or CN", continuous_update=False)
+        acceptor = widgets.Text(value=self.filters["acceptor"] or "", description="Acceptor", placeholder="e.g. H or CH", continuous_update=False)
+        donor_type = widgets.Dropdown(options=("any",) + DONOR_TYPES, value=self.filters["donor_type"] or "any", description="Donor type")
+        acceptor_type = widgets.Dropdown(options=("any",) + ACCEPTOR_TYPES, value=self.filters["acceptor_type"] or "any", description="Acceptor type")
+        status = widgets.Label()
+        scene = widgets.Output()
+        patch = widgets.Output(layout={"display": "none"})
+        self._widgets = {"status": status, "patch": patch}
+
+        def changed(_):
+            low, high = e2_range.value
+            self.update(donor=donor.value.strip() or None, acceptor=acceptor.value.strip() or None,
+                        donor_type=None if donor_type.value == "any" else donor_type.value,
+                        acceptor_type=None if acceptor_type.value == "any" else acceptor_type.value,
+                        E2_above=None if low <= e2_range.min else low, E2_below=None if high >= e2_range.max else high)
+
+        for widget in (e2_range, donor, acceptor, donor_type, acceptor_type):
+            widget.observe(changed, names="value")
+        with scene:
+            self.build_view().show()
+            colorbar(self.vmin, self.vmax, f'E(2) kcal/mol range\n[min: {self.vmin:.2f}, max: {self.vmax:.2f}]', ticks=True)
+            plt.show()
+        status.value = f"{len(self.shown)} of {len(self.table)} interactions shown"
+        display(widgets.VBox([widgets.HBox([donor, acceptor]), widgets.HBox([donor_type, acceptor_type]), e2_range, status, scene, patch]))
+        return self
+
+    def __repr__(self):
+        return f"NBOExplorer({len(self.shown)} of {len(self.table)} interactions shown, {len(self._memo)} filters memoized)"
@@ -0,0 +1,107 @@
+import io
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from orca_sections import SECTION_MARKERS, open_output, section_index
+
+ORCA_COORDINATES = SECTION_MARKERS["geometry"].decode()
+# how many parsed geometries load_geometry keeps around
+MEMO_SIZE = 32
+_memo = OrderedDict()
+
+
+class Geometry:
+    """Atoms of one structure: elements (N,) and coordinates (N, 3) in Angstrom, atom i is label number i + 1.
+
+    Every visualiser takes a Geometry wherever it takes an xyz path, so a structure is read once and shared.
+    """
+
+    def __init__(self, elements, coordinates, comment="", path=None, xyz=None):
+        self.elements = np.asarray(elements, dtype=str)
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 3)
+        self.comment = comment
+        self.path = path
+        self._xyz = xyz
+
+    @classmethod
+    def from_xyz(cls, path):
+        # compressed .xyz files are decompressed on the fly, the text reads as open(path, 'r') would give it
+        with io.TextIOWrapper(open_output(path)) as f:
+            text = f.read()
+        lines = text.splitlines()
+        elements, coordinates = [], []
+        # same rule the visualisers always used: every line after the two header lines with 4+ columns is an atom
+        for line in lines[2:]:
+            parts = line.split()
+            if len(parts) >= 4:
+                elements.append(parts[0])
+                coordinates.append((float(parts[1]), float(parts[2]), float(parts[3])))
+        return cls(elements, coordinates, lines[1] if len(lines) > 1 else "", path=path, xyz=text)
+
+    @classmethod
+    def from_orca(cls, path):
+        """Last CARTESIAN COORDINATES (ANGSTROEM) block of an ORCA output, i.e. the final geometry"""
+        index = section_index(path, keep=("geometry",))
+        section = index.last("geometry")
+        if section is None:
+            raise ValueError(f"No '{ORCA_COORDINATES}' block in {path}")
+        elements, coordinates = [], []
+        lines = index.lines(section)
+        next(lines, None)  # dashed underline
+        for atom_line in lines:
+            parts = atom_line.split()
+            if len(parts) != 4:
+                break
+            elements.append(parts[0])
+            coordinates.append((float(parts[1]), float(parts[2]), float(parts[3])))
+        lines.close()
+        return cls(elements, coordinates, f"final geometry from {os.path.basename(path)}", path=path)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def xyz_block(self):
+        """The structure as XYZ text for view.addModel, the original file text when read from an .xyz file"""
+        if self._xyz is None:
+            lines = [str(len(self)), self.comment]
+            lines += [f"{element:<2} {x:>14.8f} {y:>14.8f} {z:>14.8f}" for element, (x, y, z) in zip(self.elements, self.coordinates)]
+            self._xyz = "\n".join(lines) + "\n"
+        return self._xyz
+
+    def write_xyz(self, path):
+        with open(path, 'w') as f:
+            f.write(self.xyz_block())
+
+    def __repr__(self):
+        return f"Geometry({len(self)} atoms, path={self.path!r})"
+
+
+def is_xyz(path):
+    """True when the file (plain or compressed) starts like an XYZ file, with its atom count on the first line"""
+    with open_output(path) as f:
+        # read() rather than readline(), the zstd reader has no readline
+        head = f.read(256)
+    return head.split(b"\n", 1)[0].strip().isdigit()
+
+
+def load_geometry(source):
+    """Geometry from a Geometry (returned as is), an XYZ file or an ORCA output, memoized per unchanged file.
+
+    The format is told from the content, whatever the file is called.
+    """
+    if isinstance(source, Geometry):
+        return source
+    source = os.fspath(source)
+    st = os.stat(source)
+    key = (os.path.abspath(source), st.st_size, st.st_mtime_ns)
+    geometry = _memo.get(key)
+    if geometry is None:
+        geometry = Geometry.from_xyz(source) if is_xyz(source) else Geometry.from_orca(source)
+        _memo[key] = geometry
+        if len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    else:
+        _memo.move_to_end(key)
+    return geometry
@@ -0,0 +1,123 @@
+import numpy as np
+
+from geometry import load_geometry
+
+
+class CellList:
+    """Uniform grid over a set of points for fixed-radius neighbour queries.
+
+    Points are bucketed into cubic cells of edge cell_size, a query only looks at the cells overlapping
+    the search sphere instead of every point.
+    """
+
+    def __init__(self, points, cell_size):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.cell_size = float(cell_size)
+        if self.cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.origin = self.points.min(axis=0) if len(self.points) else np.zeros(3)
+        cells = self._cells(self.points)
+        self.shape = cells.max(axis=0) + 1 if len(cells) else np.ones(3, dtype=np.int64)
+        keys = np.ravel_multi_index(cells.T, self.shape) if len(cells) else np.empty(0, dtype=np.int64)
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.keys, self.starts = np.unique(sorted_keys, return_index=True)
+        self.ends = np.append(self.starts[1:], len(sorted_keys))
+
+    def _cells(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def query(self, point, radius):
+        """Sorted indexes of the points within radius of point"""
+        point = np.asarray(point, dtype=np.float64)
+        lo = np.maximum(self._cells(point - radius), 0)
+        hi = np.minimum(self._cells(point + radius), self.shape - 1)
+        if len(self.points) == 0 or np.any(hi < lo):
+            return np.empty(0, dtype=np.intp)
+        if np.prod(hi - lo + 1) > len(self.points):
+            # search sphere covers more cells than there are points, a direct scan is cheaper
+            return np.flatnonzero(np.sum((self.points - point) ** 2, axis=1) <= radius ** 2)
+        grid = np.stack(np.meshgrid(*(np.arange(a, b + 1) for a, b in zip(lo, hi)), indexing="ij"), axis=-1).reshape(-1, 3)
+        keys = np.ravel_multi_index(grid.T, self.shape)
+        found = np.searchsorted(self.keys, keys)
+        found = found[(found < len(self.keys)) & (self.keys[np.minimum(found, len(self.keys) - 1)] == keys)]
+        if not len(found):
+            return np.empty(0, dtype=np.intp)
+        candidates = np.concatenate([self.order[self.starts[i]:self.ends[i]] for i in found])
+        close = np.sum((self.points[candidates] - point) ** 2, axis=1) <= radius ** 2
+        return np.sort(candidates[close])
+
+
+class InteractionGeometry:
+    """Endpoints, midpoints and lengths of every interaction in an SOPTable, computed in one NumPy pass.
+
+    By default an interaction runs from the last donor atom to the last acceptor atom, which is what
+    visualise_nbo_data draws. With centroid=True a two-atom NBO (BD, BD*) is placed at its bond centroid.
+    Row numbers returned by the queries are positions in the table.
+    """
+
+    def __init__(self, table, geometry, centroid=False, cell_size=4.0):
+        self.table = table
+        self.geometry = load_geometry(geometry)
+        self.centroid = centroid
+        self.cell_size = cell_size
+        self.donor_atom = table.atom_index("donor")
+        self.acceptor_atom = table.atom_index("acceptor")
+        coordinates = self.geometry.coordinates
+        n_atoms = len(coordinates)
+        for atoms in (self.donor_atom, self.acceptor_atom):
+            if atoms.size and atoms.max() >= n_atoms:
+                raise ValueError(f"Interaction refers to atom {atoms.max() + 1}, the geometry has {n_atoms} atoms")
+        self.start_atom = self._last(self.donor_atom)
+        self.end_atom = self._last(self.acceptor_atom)
+        self.start = self._points(self.donor_atom, coordinates)
+        self.end = self._points(self.acceptor_atom, coordinates)
+        self.midpoints = (self.start + self.end) / 2
+        self.distances = np.sqrt(np.sum((self.start - self.end) ** 2, axis=1))
+        self._distance_order = None
+        self._midpoint_cells = None
+        self._atom_cells = None
+
+    @staticmethod
+    def _last(atoms):
+        # atoms is (n, 2) padded with -1: the last real atom is column 1 when it is set, else column 0
+        return np.where(atoms[:, 1] >= 0, atoms[:, 1], atoms[:, 0])
+
+    def _points(self, atoms, coordinates):
+        last = self._last(atoms)
+        if not self.centroid:
+            return coordinates[last]
+        first = atoms[:, 0]
+        return (coordinates[first] + coordinates[last]) / 2
+
+    def bond_centroids(self, side):
+        """(n, 3) centre of the donor or acceptor NBO, the atom itself for one-atom NBOs"""
+        atoms = self.donor_atom if side == "donor" else self.acceptor_atom
+        last = self._last(atoms)
+        return (self.geometry.coordinates[atoms[:, 0]] + self.geometry.coordinates[last]) / 2
+
+    def shorter_than(self, radius):
+        """Sorted rows whose interaction distance is below radius (Angstrom)"""
+        if self._distance_order is None:
+            self._distance_order = np.argsort(self.distances, kind="stable")
+        n = np.searchsorted(self.distances[self._distance_order], radius, side="left")
+        return np.sort(self._distance_order[:n])
+
+    def near_point(self, point, radius):
+        """Sorted rows whose midpoint is within radius of point"""
+        if self._midpoint_cells is None:
+            self._midpoint_cells = CellList(self.midpoints, self.cell_size)
+        return self._midpoint_cells.query(point, radius)
+
+    def near_atom(self, atom_index, radius):
+        """Sorted rows whose midpoint is within radius of the 0-based atom_index"""
+        return self.near_point(self.geometry.coordinates[atom_index], radius)
+
+    def atoms_near(self, atom_index, radius):
+        """0-based indexes of the atoms within radius of atom_index, including itself"""
+        if self._atom_cells is None:
+            self._atom_cells = CellList(self.geometry.coordinates, self.cell_size)
+        return self._atom_cells.query(self.geometry.coordinates[atom_index], radius)
+
+    def __len__(self):
+        return len(self.distances)
@@ -0,0 +1,458 @@
+"""Local SQLite library of parsed NBO/NPA calculations, for queries across many outputs without parsing them again.
+
+    from library import NBOLibrary
+    lib = NBOLibrary("calcs.sqlite")
+    lib.ingest("projects/", max_workers=8)            # new and changed outputs only, unchanged ones are skipped
+    hits = lib.query_sop(donor="O", acceptor="NH", E2_above=5.0)      # {path: NBO_SOP}, filters as visualise_nbo_data
+    for path, nbo in hits.items():
+        nbo.visualise_nbo_data(lib.geometry(path), donor="O", acceptor="NH", E2_above=5.0)
+    lib.query_npa(element="O", below=-0.8)            # {path: NPA} holding only the matching atoms
+
+or from the command line:
+
+    python library.py calcs.sqlite ingest projects/ --workers 8
+    python library.py calcs.sqlite query --donor O --acceptor NH --E2-above 5 --csv hits.csv
+
+Every SOP row keeps its orbital types, the element and 0-based atom index of each NBO atom and E(2) in
+indexed columns, so a query only touches the rows it returns. The labels are stored as ORCA prints them,
+results come back as SOPTables inside NBO_SOP objects (and NPA objects and Geometries), the structures
+visualise_nbo_data and NPA.visualise_property work on.
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+from itertools import repeat
+
+import numpy as np
+
+from batch import analyse_outputs, find_outputs
+from diagnostics import Metrics
+from geometry import Geometry
+from nbo import NBO_SOP
+from npa import NPA, NPA_FIELDS
+from parse_cache import content_hash
+from sop_query import SOPQuery
+from sop_table import ACCEPTOR_TYPES, COLUMNS, DONOR_TYPES, SOPTable
+from tables import write_sop_table
+
+# database column of each NPA field
+NPA_COLUMNS = dict(zip(NPA_FIELDS, ("natural_charge", "core", "valence", "rydberg", "total", "spin_density")))
+# sop table columns holding the SOPTable ones, the atoms of an NBO as label, element and 0-based atom index
+SOP_COLUMNS = ("donor_index", "donor_type", "donor_orb_no", "donor_label1", "donor_label2", "donor_element1", "donor_element2",
+               "donor_atom1", "donor_atom2", "acceptor_index", "acceptor_type", "acceptor_orb_no", "acceptor_label1",
+               "acceptor_label2", "acceptor_element1", "acceptor_element2", "acceptor_atom1", "acceptor_atom2",
+               "e2", "e_diff", "fock")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    ingested REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS atoms (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    atom INTEGER NOT NULL,
+    element TEXT NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    z REAL NOT NULL,
+    PRIMARY KEY (file_id, atom)
+);
+CREATE TABLE IF NOT EXISTS sop (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    position INTEGER NOT NULL,
+    donor_index INTEGER NOT NULL,
+    donor_type TEXT NOT NULL,
+    donor_orb_no INTEGER NOT NULL,
+    donor_label1 TEXT NOT NULL,
+    donor_label2 TEXT,
+    donor_element1 TEXT NOT NULL,
+    donor_element2 TEXT,
+    donor_atom1 INTEGER NOT NULL,
+    donor_atom2 INTEGER,
+    acceptor_index INTEGER NOT NULL,
+    acceptor_type TEXT NOT NULL,
+    acceptor_orb_no INTEGER NOT NULL,
+    acceptor_label1 TEXT NOT NULL,
+    acceptor_label2 TEXT,
+    acceptor_element1 TEXT NOT NULL,
+    acceptor_element2 TEXT,
+    acceptor_atom1 INTEGER NOT NULL,
+    acceptor_atom2 INTEGER,
+    e2 REAL NOT NULL,
+    e_diff REAL NOT NULL,
+    fock REAL NOT NULL,
+    PRIMARY KEY (file_id, position)
+);
+CREATE TABLE IF NOT EXISTS npa (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    atom INTEGER NOT NULL,
+    element TEXT NOT NULL,
+    {", ".join(f"{column} REAL" for column in NPA_COLUMNS.values())},
+    PRIMARY KEY (file_id, position)
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS sop_types_e2 ON sop (donor_type, acceptor_type, e2);
+CREATE INDEX IF NOT EXISTS sop_e2 ON sop (e2);
+CREATE INDEX IF NOT EXISTS sop_donor_elements ON sop (donor_element1, donor_element2);
+CREATE INDEX IF NOT EXISTS sop_donor_element2 ON sop (donor_element2);
+CREATE INDEX IF NOT EXISTS sop_acceptor_elements ON sop (acceptor_element1, acceptor_element2);
+CREATE INDEX IF NOT EXISTS sop_acceptor_element2 ON sop (acceptor_element2);
+CREATE INDEX IF NOT EXISTS sop_donor_atom1 ON sop (donor_atom1);
+CREATE INDEX IF NOT EXISTS sop_donor_atom2 ON sop (donor_atom2);
+CREATE INDEX IF NOT EXISTS sop_acceptor_atom1 ON sop (acceptor_atom1);
+CREATE INDEX IF NOT EXISTS sop_acceptor_atom2 ON sop (acceptor_atom2);
+CREATE INDEX IF NOT EXISTS npa_element ON npa (element, natural_charge);
+"""
+
+# what one ingest() did: paths added and updated, how many were unchanged, {path: traceback} of failures
+IngestResult = namedtuple("IngestResult", ["added", "updated", "unchanged", "failures"])
+
+
+def _sop_rows(file_id, table):
+    # one tuple per interaction in SOP_COLUMNS order, NBO atoms as (label, element, atom index) pairs
+    labels = np.array(table.atom_labels + (None,), dtype=object)
+    elements = np.array([table.elements[code] for code in table.label_element.tolist()] + [None], dtype=object)
+    indices = np.array(table.label_index.tolist() + [None], dtype=object)
+    atoms = {}
+    for side in ("donor", "acceptor"):
+        codes = getattr(table, f"{side}_atoms")
+        atoms[side] = [values[codes[:, i]].tolist() for values in (labels, elements, indices) for i in (0, 1)]
+    donor_types = np.array(DONOR_TYPES, dtype=object)[table.donor_type].tolist()
+    acceptor_types = np.array(ACCEPTOR_TYPES, dtype=object)[table.acceptor_type].tolist()
+    return zip(repeat(file_id), range(len(table)),
+               table.donor_index.tolist(), donor_types, table.donor_orb_no.tolist(), *atoms["donor"],
+               table.acceptor_index.tolist(), acceptor_types, table.acceptor_orb_no.tolist(), *atoms["acceptor"],
+               table.e2.tolist(), table.e_diff.tolist(), table.fock.tolist())
+
+
+def _sop_table(rows):
+    # SOPTable of fetched (file_id, SOP_COLUMNS...) rows, the labels interned across all of them
+    columns = list(zip(*rows)) if rows else [()] * (len(SOP_COLUMNS) + 1)
+    values = dict(zip(SOP_COLUMNS, columns[1:]))
+    label_codes = {}
+
+    def codes(first, second):
+        return [[label_codes.setdefault(a, len(label_codes)), -1 if b is None else label_codes.setdefault(b, len(label_codes))]
+                for a, b in zip(first, second)]
+
+    donor_types = {t: i for i, t in enumerate(DONOR_TYPES)}
+    acceptor_types = {t: i for i, t in enumerate(ACCEPTOR_TYPES)}
+    table = {name: values[name] for name in COLUMNS if name in values}
+    table["donor_type"] = [donor_types[t] for t in values["donor_type"]]
+    table["acceptor_type"] = [acceptor_types[t] for t in values["acceptor_type"]]
+    table["donor_atoms"] = np.array(codes(values["donor_label1"], values["donor_label2"]), dtype=np.int32).reshape(-1, 2)
+    table["acceptor_atoms"] = np.array(codes(values["acceptor_label1"], values["acceptor_label2"]), dtype=np.int32).reshape(-1, 2)
+    return SOPTable(table, label_codes), np.array(columns[0], dtype=np.int64)
+
+
+class NBOLibrary:
+    """SQLite database of the SOP interactions, NPA rows and final geometries of many ORCA outputs"""
+
+    def __init__(self, path, metrics=None):
+        self.path = path
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA + INDEXES)
+        self._elements = None
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- ingest ---
+    def ingest(self, source, pattern="*.out", max_workers=None, quiet=True):
+        """Parse and store every matching output (see batch.find_outputs) that is new or changed.
+
+        A stored file is unchanged while its size and mtime are, or, when only those differ, its content hash
+        (as in parse_cache.py). Outputs are parsed in a process pool by analyse_outputs; one that fails keeps
+        whatever was stored for it before. Returns an IngestResult.
+        """
+        paths = [os.path.abspath(path) for path in find_outputs(source, pattern)]
+        stored = {path: (file_id, size, mtime_ns, digest) for file_id, path, size, mtime_ns, digest
+                  in self.db.execute("SELECT id, path, size, mtime_ns, hash FROM files")}
+        changed, unchanged = {}, 0
+        start = time.perf_counter()
+        with self.db:
+            for path in paths:
+                st = os.stat(path)
+                known = stored.get(path)
+                if known is not None and known[1:3] == (st.st_size, st.st_mtime_ns):
+                    unchanged += 1
+                    continue
+                digest = content_hash(path, st.st_size)
+                if known is not None and known[3] == digest:
+                    # touched or copied back, same content
+                    self.db.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?", (st.st_size, st.st_mtime_ns, known[0]))
+                    unchanged += 1
+                    continue
+                changed[path] = (st, digest)
+        self.metrics.add_span("read", time.perf_counter() - start, "library check")
+
+        # escaped, the paths are files already found and a name such as conf[1].out is not a pattern here
+        parsed = analyse_outputs([glob.escape(path) for path in changed], analyses=("sop", "npa", "geometry"), max_workers=max_workers, quiet=quiet)
+        added, updated = [], []
+        # a first (or mostly new) ingest stores faster without the indexes, they are built once at the end
+        # (and again on opening, should the ingest stop half way)
+        bulk = len(parsed.files) > len(stored)
+        if bulk:
+            for name, in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+                self.db.execute(f"DROP INDEX {name}")
+        with self.metrics.span("export", "library store"):
+            for path in parsed.files:
+                if path in parsed.failures:
+                    continue
+                st, digest = changed[path]
+                with self.db:
+                    if path in stored:
+                        self._delete(stored[path][0])
+                        updated.append(path)
+                    else:
+                        added.append(path)
+                    file_id = self.db.execute("INSERT INTO files (path, size, mtime_ns, hash, ingested) VALUES (?, ?, ?, ?, ?)",
+                                              (path, st.st_size, st.st_mtime_ns, digest, time.time())).lastrowid
+                    self._store(file_id, parsed.sop.get(path), parsed.npa.get(path), parsed.geometry.get(path))
+            if bulk:
+                self.db.executescript(INDEXES)
+        self._elements = None
+        return IngestResult(added, updated, unchanged, parsed.failures)
+
+    def _store(self, file_id, table, npa_data, geometry):
+        if table is not None and len(table):
+            marks = ", ".join("?" * (len(SOP_COLUMNS) + 2))
+            self.db.executemany(f"INSERT INTO sop (file_id, position, {', '.join(SOP_COLUMNS)}) VALUES ({marks})", _sop_rows(file_id, table))
+        if npa_data:
+            npa = NPA.from_data(npa_data)
+            fields = [[None if entry[field] is None else float(entry[field]) for field in NPA_FIELDS] for entry in npa_data.values()]
+            marks = ", ".join("?" * (len(NPA_COLUMNS) + 5))
+            self.db.executemany(f"INSERT INTO npa (file_id, position, label, atom, element, {', '.join(NPA_COLUMNS.values())}) VALUES ({marks})",
+                                [(file_id, i, label, atom, element, *values) for i, (label, atom, element, values)
+                                 in enumerate(zip(npa.labels, npa.atom_indices.tolist(), npa.atom_elements.tolist(), fields))])
+        if geometry is not None:
+            self.db.executemany("INSERT INTO atoms (file_id, atom, element, x, y, z) VALUES (?, ?, ?, ?, ?, ?)",
+                                [(file_id, i, element, *xyz) for i, (element, xyz)
+                                 in enumerate(zip(geometry.elements.tolist(), geometry.coordinates.tolist()))])
+
+    def _delete(self, file_id):
+        for table in ("sop", "npa", "atoms", "files"):
+            self.db.execute(f"DELETE FROM {table} WHERE {'id' if table == 'files' else 'file_id'} = ?", (file_id,))
+
+    def remove(self, path):
+        """Drop one output and everything stored for it"""
+        with self.db:
+            for file_id, in self.db.execute("SELECT id FROM files WHERE path = ?", (os.path.abspath(path),)).fetchall():
+                self._delete(file_id)
+        self._elements = None
+
+    def prune(self):
+        """Drop the outputs that no longer exist on disk, returns their paths"""
+        gone = [path for path in self.files() if not os.path.exists(path)]
+        for path in gone:
+            self.remove(path)
+        return gone
+
+    # --- queries ---
+    def files(self):
+        """Stored output paths, sorted"""
+        return [path for path, in self.db.execute("SELECT path FROM files ORDER BY path")]
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def elements(self):
+        """Every element that occurs in a stored NBO"""
+        if self._elements is None:
+            found = set()
+            for column in ("donor_element1", "donor_element2", "acceptor_element1", "acceptor_element2"):
+                found.update(element for element, in self.db.execute(f"SELECT DISTINCT {column} FROM sop") if element is not None)
+            self._elements = sorted(found)
+        return self._elements
+
+    def _file_filter(self, files, where, params):
+        # files: None (all), a glob matched against the absolute paths, or a list of paths
+        if files is None:
+            return
+        if isinstance(files, str):
+            where.append("file_id IN (SELECT id FROM files WHERE path GLOB ?)")
+            params.append(os.path.abspath(files))
+        else:
+            paths = [os.path.abspath(path) for path in files]
+            where.append(f"file_id IN (SELECT id FROM files WHERE path IN ({', '.join('?' * len(paths))}))")
+            params.extend(paths)
+
+    def sop_table(self, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None,
+                  donor_atom=None, acceptor_atom=None, files=None):
+        """Matching interactions of every stored output in one SOPTable, plus the path of each row's output.
+
+        Filters as in visualise_nbo_data (see SOPQuery); donor_atom/acceptor_atom keep the interactions with
+        that 0-based atom in the donor/acceptor NBO, files limits the search to some outputs (a glob or list).
+        """
+        query = SOPQuery(donor, acceptor, donor_type, acceptor_type, E2_below, E2_above)
+        where, params = [], []
+        for side, orb_type in (("donor", donor_type), ("acceptor", acceptor_type)):
+            if orb_type is not None:
+                where.append(f"{side}_type = ?")
+                params.append(orb_type)
+        if E2_above is not None:
+            where.append("e2 >= ?")
+            params.append(E2_above)
+        if E2_below is not None:
+            where.append("e2 <= ?")
+            params.append(E2_below)
+        for side, atoms in (("donor", query.donor), ("acceptor", query.acceptor)):
+            if atoms is None:
+                continue
+            if len(atoms) == 2:
+                where.append(f"{side}_element1 = ? AND {side}_element2 = ?")
+                params.extend(atoms)
+            elif len(atoms) == 1 and atoms[0].isalpha():
+                # a label contains these letters exactly when its element does
+                elements = [element for element in self.elements() if atoms[0] in element]
+                marks = ", ".join("?" * len(elements))
+                where.append(f"({side}_element1 IN ({marks}) OR {side}_element2 IN ({marks}))")
+                params.extend(elements * 2)
+        for side, atom in (("donor", donor_atom), ("acceptor", acceptor_atom)):
+            if atom is not None:
+                where.append(f"({side}_atom1 = ? OR {side}_atom2 = ?)")
+                params.extend([int(atom)] * 2)
+        self._file_filter(files, where, params)
+
+        start = time.perf_counter()
+        rows = self.db.execute(f"SELECT file_id, {', '.join(SOP_COLUMNS)} FROM sop"
+                               f"{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY file_id, position", params).fetchall()
+        table, file_ids = _sop_table(rows)
+        # labels that are neither one letter group nor a pair are matched as SOPQuery matches them
+        keep = query.rows(table)
+        if len(keep) < len(table):
+            table, file_ids = table.take(keep), file_ids[keep]
+        paths = dict(self.db.execute("SELECT id, path FROM files"))
+        self.metrics.add_span("read", time.perf_counter() - start, "library sop query")
+        return table, np.array([paths[file_id] for file_id in file_ids.tolist()], dtype=object)
+
+    def query_sop(self, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None,
+                  donor_atom=None, acceptor_atom=None, files=None):
+        """{path: NBO_SOP holding the matching interactions of that output}, arguments as sop_table"""
+        table, paths = self.sop_table(donor, acceptor, donor_type, acceptor_type, E2_below, E2_above, donor_atom, acceptor_atom, files)
+        starts = np.flatnonzero(np.r_[True, paths[1:] != paths[:-1]]) if len(paths) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(paths)]
+        return {paths[start]: NBO_SOP.from_table(table.take(slice(start, end)), filepath=paths[start], metrics=self.metrics, quiet=True)
+                for start, end in zip(starts.tolist(), ends.tolist())}
+
+    def nbo(self, path):
+        """NBO_SOP of every stored interaction of one output"""
+        return self.query_sop(donor_type=None, acceptor_type=None, files=[path]).get(os.path.abspath(path)) \
+            or NBO_SOP.from_table(SOPTable.empty(), filepath=os.path.abspath(path), metrics=self.metrics, quiet=True)
+
+    def query_npa(self, element=None, property_name="Natural Charge", below=None, above=None, files=None):
+        """{path: NPA holding the matching atoms of that output}, element like 'O', property range inclusive"""
+        where, params = [], []
+        if element is not None:
+            where.append("element = ?")
+            params.append(element.upper())
+        column = NPA_COLUMNS[property_name]
+        if above is not None:
+            where.append(f"{column} >= ?")
+            params.append(above)
+        if below is not None:
+            where.append(f"{column} <= ?")
+            params.append(below)
+        self._file_filter(files, where, params)
+        start = time.perf_counter()
+        rows = self.db.execute(f"SELECT files.path, label, {', '.join(NPA_COLUMNS.values())} FROM npa JOIN files ON files.id = npa.file_id"
+                               f"{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY file_id, position", params).fetchall()
+        found = {}
+        for path, label, *values in rows:
+            found.setdefault(path, {})[label] = dict(zip(NPA_FIELDS, values))
+        self.metrics.add_span("read", time.perf_counter() - start, "library npa query")
+        return {path: NPA.from_data(npa_data, filepath=path, metrics=self.metrics, quiet=True) for path, npa_data in found.items()}
+
+    def npa(self, path):
+        """NPA of every stored atom of one output"""
+        return self.query_npa(files=[path]).get(os.path.abspath(path)) \
+            or NPA.from_data({}, filepath=os.path.abspath(path), metrics=self.metrics, quiet=True)
+
+    def geometry(self, path):
+        """Stored final geometry of one output, what visualise_nbo_data/visualise_property take as xyz_file"""
+        rows = self.db.execute("SELECT element, x, y, z FROM atoms JOIN files ON files.id = atoms.file_id "
+                               "WHERE files.path = ? ORDER BY atom", (os.path.abspath(path),)).fetchall()
+        if not rows:
+            raise ValueError(f"No geometry stored for {path}")
+        return Geometry([row[0] for row in rows], [row[1:] for row in rows], f"final geometry from {os.path.basename(path)}")
+
+    def print_summary(self):
+        counts = {name: self.db.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in ("files", "sop", "npa", "atoms")}
+        print(f"{self.path}: {counts['files']} outputs, {counts['sop']} SOP interactions, "
+              f"{counts['npa']} NPA atoms, {counts['atoms']} geometry atoms")
+
+    def __repr__(self):
+        return f"NBOLibrary({self.path!r}, {len(self)} outputs)"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store parsed NBO SOP/NPA data of many ORCA outputs in SQLite and query it.")
+    parser.add_argument("database", help="SQLite file, created if missing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="parse and store new or changed outputs")
+    ingest.add_argument("source", nargs="+", help="directories or glob patterns of ORCA outputs")
+    ingest.add_argument("--pattern", default="*.out", help="file pattern used inside directories (default *.out)")
+    ingest.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    ingest.add_argument("--prune", action="store_true", help="also drop stored outputs that no longer exist")
+    query = commands.add_parser("query", help="print (or write) the stored interactions matching the filters")
+    query.add_argument("--donor", help="e.g. O or CN, as in visualise_nbo_data")
+    query.add_argument("--acceptor", help="e.g. H or NH")
+    query.add_argument("--donor-type", default="LP", help="LP, BD or any (default LP)")
+    query.add_argument("--acceptor-type", default="BD*", help="BD*, RY, LV or any (default BD*)")
+    query.add_argument("--E2-above", type=float, default=None)
+    query.add_argument("--E2-below", type=float, default=None)
+    query.add_argument("--files", help="glob of the outputs to search")
+    query.add_argument("--top", type=int, default=50, help="rows to print, largest E(2) first (default 50)")
+    query.add_argument("--csv", help="write every matching interaction, keyed by file, to this CSV file")
+    args = parser.parse_args(argv)
+
+    with NBOLibrary(args.database) as lib:
+        if args.command == "ingest":
+            result = lib.ingest(args.source, args.pattern, args.workers)
+            for path, error in result.failures.items():
+                print(f"\n{path}:\n{error}")
+            print(f"{len(result.added)} added, {len(result.updated)} updated, {result.unchanged} unchanged, {len(result.failures)} failed")
+            if args.prune:
+                print(f"{len(lib.prune())} removed")
+            lib.print_summary()
+            return 1 if result.failures else 0
+
+        table, paths = lib.sop_table(args.donor, args.acceptor, None if args.donor_type == "any" else args.donor_type,
+                                     None if args.acceptor_type == "any" else args.acceptor_type, args.E2_below, args.E2_above,
+                                     files=args.files)
+        header = f"{'File':<40} {'Donor':<22} {'Acceptor':<26} {'E(2)':>8}"
+        print(header)
+        print("=" * len(header))
+        for i in np.argsort(-table.e2, kind="stable")[:args.top].tolist():
+            entry = table[i]
+            print(f"{os.path.basename(paths[i])[:40]:<40} {entry['Donor Type'] + ' ' + '-'.join(entry['Donor Atoms']):<22} "
+                  f"{entry['Acceptor Type'] + ' ' + '-'.join(entry['Acceptor Atoms']):<26} {entry['E(2)']:>8.2f}")
+        print("=" * len(header))
+        print(f"{len(table)} interactions in {len(set(paths.tolist()))} outputs")
+        if args.csv:
+            write_sop_table(table, args.csv, "csv", extra={"File": lambda start, n: paths[start:start + n].tolist()})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
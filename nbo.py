@@ -1,117 +1,238 @@
-from matplotlib import cm, colors
 import re
-import py3Dmol
-import matplotlib.pyplot as plt
+import time
+import numpy as np
+from diagnostics import MAX_ERROR_SAMPLES, Metrics
+from e2_matrix import E2Matrix
+from geometry import load_geometry
+from interaction_geometry import InteractionGeometry
+from orca_sections import SECTION_MARKERS, is_path, section_index
+from parse_cache import resolve_cache
+from scene import add_cylinders, add_labels, colorbar, export, level_of_detail, new_view, value_colors
+from sop_diff import SOPDiff
+from sop_query import SOPQuery
+from sop_table import SOPTable
+from tables import CHUNK_ROWS, PAGE_SIZE, write_sop_table
+
+SOP_START = SECTION_MARKERS["sop"].decode()
+SOP_END = SECTION_MARKERS["nbo_summary"].decode()
+
+# compiled once at import and shared by every parse of the SOP table.
+# The three trailing numbers are split off with str.rsplit before matching, which avoids most of the
+# backtracking the lazy acceptor group needed to find them.
+SOP_PATTERN = re.compile(r"""
+    ^\s*
+    (\d+)\.\s+                          # Donor Index (1)
+    (LP|BD)\s*\(\s*(\d+)\s*\)\s+       # Donor Type (2), Donor Orb No (3)
+    (.+?)\s{3,}                         # Donor Atom String (4) - Capture until 3+ spaces (separator)
+    (\d+)\.\s+                          # Acceptor Index (5)
+    (BD\*|RY|LV)\s*\(\s*(\d+)\s*\)\s+     # Acceptor Type (6), Acceptor Orb No (7)
+    (.+)                                # Acceptor Atom String (8) - everything before E(2), E Diff, Fock Elem
+""", re.VERBOSE)
+
+
+def split_atoms(atom_string):
+    """'C   1 - H   7' -> ['C   1', 'H   7']"""
+    return [atom.strip() for atom in atom_string.strip().split('-')]
+
+
+def iter_sop_lines(filepath):
+    """Yield the raw lines of the (first) SOP table, reading only its byte range of the file"""
+    index = section_index(filepath, first=("sop",))
+    section = index.first("sop")
+    if section is None:
+        return
+    yield from sop_body(index.lines(section))
+
+
+def sop_body(lines):
+    """The lines of an SOP section up to the NBO summary that ends the table"""
+    for line in lines:
+        if SOP_END in line:
+            return
+        yield line
+
+
+def parse_sop_line(line):
+    """Parse one line of the SOP table, returns None for headers, separators and blank lines"""
+    parts = line.rsplit(None, 3)
+    match = SOP_PATTERN.match(parts[0]) if len(parts) == 4 else None
+    if match:
+        donor_index, donor_type, donor_orb_no, donor_atoms, acceptor_index, acceptor_type, acceptor_orb_no, acceptor_atoms = match.groups()
+        return {
+            "Donor Index": donor_index,
+            "Donor Type": donor_type,
+            "Donor Orb No": donor_orb_no,
+            "Donor Atoms": split_atoms(donor_atoms),
+            "Acceptor Index": acceptor_index,
+            "Acceptor Type": acceptor_type,
+            "Acceptor Orb No": acceptor_orb_no,
+            "Acceptor Atoms": split_atoms(acceptor_atoms),
+            "E(2)": float(parts[1]),
+            "E Diff": float(parts[2]),
+            "Fock Elem": float(parts[3])
+        }
+    # same skip rules as before, only checked for lines that did not parse
+    if (not line.strip() or "Donor (L) NBO" in line or "from" in line or "within unit" in line
+            or "threshold" in line or "Threshold" in line or "E(2) E(NL)-E(L) F(L,NL)" in line or "=" in line):
+        return None
+    raise ValueError(line.strip())
+
+
+def iter_nbo_data(filepath, metrics=None, quiet=False):
+    """Stream the donor -> acceptor interactions of the SOP section one dictionary at a time.
+
+    Lines that do not parse are printed, or with quiet=True only counted; the counts go to metrics.
+    """
+    yield from parse_sop_lines(iter_sop_lines(filepath), metrics, quiet)
+
+
+def parse_sop_lines(lines, metrics=None, quiet=False):
+    """iter_nbo_data over any SOP table lines, e.g. one block of a multi-step output (see blocks.py)"""
+    parsed = skipped = errors = 0
+    samples = []
+    try:
+        for line in lines:
+            try:
+                entry = parse_sop_line(line)
+            except ValueError:
+                errors += 1
+                if len(samples) < MAX_ERROR_SAMPLES:
+                    samples.append(line.strip())
+                if not quiet:
+                    print(f"Parse error in line: {line.strip()}")
+                continue
+            if entry is None:
+                skipped += 1
+                continue
+            parsed += 1
+            yield entry
+    finally:
+        if metrics is not None:
+            metrics.add_counts("sop", parsed, skipped, errors, samples, quiet)
+
+
+def table_rows(e2, top=None, page=None, page_size=PAGE_SIZE):
+    """Rows a printer shows: the top N by E(2) (largest first) if top is given, then one 1-based page of them"""
+    rows = np.arange(len(e2)) if top is None else np.argsort(-e2, kind="stable")[:top]
+    if page is not None:
+        pages = max(1, -(-len(rows) // page_size))
+        if not 1 <= page <= pages:
+            raise ValueError(f"page {page} out of range, there are {pages} pages of {page_size} rows")
+        rows = rows[(page - 1) * page_size:page * page_size]
+    return rows
+
+
+def shown_rows_note(shown, total, top=None, page=None, page_size=PAGE_SIZE):
+    """'Showing 50 of 1200 interactions (top 200 by E(2), page 2/4)'"""
+    details = []
+    if top is not None:
+        details.append(f"top {top} by E(2)")
+    if page is not None:
+        details.append(f"page {page}/{max(1, -(-min(total, top if top is not None else total) // page_size))}")
+    return f"Showing {shown} of {total} interactions ({', '.join(details)})"
+
 
 # Donor (donates electron density) = LP or BD (L=Lewis) if lone pair then the donor is one atom if bonding orbital then the donor is two atoms connected by a bond
 #Acceptor (receives electron density hence being stabilised) = BD* or RY (NL=Non-Lewis) if rydberg orbital then the acceptor is one atom if antibodning orbital then the acceptor is two atoms connected by a bond
 class NBO_SOP:
-    def __init__(self, filepath):
+    def __init__(self, filepath, cache=None, workers=None, metrics=None, quiet=False):
+        # a path or a readable binary/text object, plain or gzip/xz/zstd compressed (see orca_sections.py)
         self.filepath = filepath
+        # the parse cache is keyed by path, file-like objects are always parsed
+        self.cache = resolve_cache(cache) if is_path(filepath) else None
+        self.workers = workers
+        # stage timings and line counters of this instance, see diagnostics.py
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.quiet = quiet
         self.extract_nbo_data()
 
+    @classmethod
+    def from_table(cls, table, filepath=None, metrics=None, quiet=False):
+        """An NBO_SOP over an SOPTable that was not parsed here (a diff, a stored or filtered table)"""
+        nbo = cls.__new__(cls)
+        nbo.filepath = filepath
+        nbo.cache = None
+        nbo.workers = None
+        nbo.metrics = metrics if metrics is not None else Metrics()
+        nbo.quiet = quiet
+        nbo.nbo_data = table
+        return nbo
+
     def help():
         table_header = f"{'Command':<35} {'Description'}"
         print(table_header)
         print("-" * len(table_header))
         print(f"{'nbo = NBO_SOP(filepath)':<35} Create an instance with the file path to the NBO data.")
+        print(f"{'nbo = NBO_SOP(job.out.gz / file)':<35} gzip/xz/zstd outputs (by magic bytes) and open file objects are read streaming.")
+        print(f"{'nbo = NBO_SOP(filepath, cache=True)':<35} Reuse the parse from the on-disk cache while the file is unchanged.")
         print(f"{'nbo.extract_nbo_data()':<35} Extract NBO data from the file.")
+        print(f"{'nbo = NBO_SOP(filepath, workers=8)':<35} Parse a very large SOP table in chunks across 8 processes (0: all cores).")
+        print(f"{'OutputBlocks(filepath).sop(step, spin)':<35} Every SOP/NPA block of multi-step and open-shell outputs in one read (blocks.py).")
+        print(f"{'iter_nbo_data(filepath)':<35} Stream the interactions one at a time without building the list.")
+        print(f"{'OutputTail(filepath).poll()':<35} Parse only what a running job appended since the last poll (tail.py).")
+        print(f"{'OutputTail(filepath).follow(xyz)':<35} Poll until the job ends, drawing new interactions into the shown view.")
+        print(f"{'nbo.nbo_data':<35} SOPTable of the interactions: NumPy columns (e2, donor_type, ...), rows read like dicts.")
         print(f"{'nbo.print_nbo_data()':<35} Print all NBO data as a formatted table.")
         print(f"{'nbo.print_loneToAnti()':<35} Print LP → BD* interactions only.")
+        print(f"{'':<35} both take top=N (largest E(2) first) and page=p, page_size=n to print less")
+        print(f"{'nbo.export_table(path, ...)':<35} Stream the filtered interactions to .csv, or .parquet/.arrow with pyarrow.")
+        print(f"{'nbo.query(...)':<35} SOPTable of the interactions matching the visualise_nbo_data filters below.")
+        print(f"{'nbo.e2_matrix(fragments=..., how=...)':<35} Sparse donor → acceptor E(2) sum/max/count per atom or fragment, with totals and heatmap().")
+        print(f"{'nbo.compare(other).print_diff()':<35} Appeared, vanished and changed interactions with ΔE(2); .visualise(xyz) draws the deltas.")
+        print(f"{'NBOExplorer(nbo, xyz).show()':<35} Filter widgets over one live view, only added/removed interactions are redrawn (explorer.py).")
+        print(f"{'NBOLibrary(db).ingest(dir)':<35} Store SOP/NPA/geometry of many outputs in SQLite; query_sop(...) across them (library.py).")
+        print(f"{'Trajectory(frames, sop).visualise()':<35} Animate interactions over a multi-frame .xyz or a series of outputs (trajectory.py).")
+        print(f"{'nbo.interaction_geometry(xyz, ...)':<35} Distances/midpoints of the filtered interactions, with radius queries.")
         print(f"{'nbo.visualise_nbo_data(...)':<35} Visualise interactions with py3Dmol.")
-        print(f"{'':<35} xyz_file: path to .xyz file")
+        print(f"{'':<35} xyz_file: path to .xyz file, a Geometry, or the ORCA output itself")
         print(f"{'':<35} view: optional py3Dmol view object")
         print(f"{'':<35} display: bool to show the plot")
         print(f"{'':<35} donor, acceptor: filter by atoms, can be single atom or double e.g. 'C' or 'CN' or 'CC'")
-        print(f"{'':<35} donor_type, acceptor_type: e.g. 'LP', 'BD*', 'RY'")
+        print(f"{'':<35} donor_type, acceptor_type: e.g. 'LP', 'BD*', 'RY'; None for any type (default LP -> BD*)")
         print(f"{'':<35} E2_below, E2_above: numeric thresholds for E(2)")
         print(f"{'':<35} label: bool to label cylinders")
         print(f"{'':<35} print_latex: bool to output a LaTeX table")
+        print(f"{'':<35} renderer: 'calls' (one py3Dmol call per interaction) or 'batched' (few JS calls, for large sets)")
+        print(f"{'':<35} max_cylinders: batched only, draw the top-N by E(2) and merge the rest per atom pair")
+        print(f"{'':<35} label_min_e2: batched only, no labels below this E(2)")
+        print(f"{'':<35} color_bins: batched only, number of quantized colours (None for exact colours)")
+        print(f"{'':<35} export_to: path prefix, writes .html, _colorbar.png and .json and displays nothing")
+        print(f"{'':<35} quiet: no banner or table (defaults to the quiet given to NBO_SOP)")
+        print(f"{'':<35} table_top: print only the top-N interactions by E(2) in the table and LaTeX output")
+        print(f"{'nbo = NBO_SOP(filepath, quiet=True)':<35} Count unparsable lines instead of printing each one.")
+        print(f"{'nbo.metrics.report()':<35} Stage timings and parsed/skipped/errored line counts (diagnostics.py).")
 
     def extract_nbo_data(self):
-        self.nbo_data = []
-        with open(self.filepath, 'r') as f:
-            lines = f.readlines()
-
-        nbo_analysis_started = False
-        for line in lines:
-            if "SECOND ORDER PERTURBATION THEORY ANALYSIS OF FOCK MATRIX IN NBO BASIS" in line:
-                nbo_analysis_started = True
-                continue  
-    
-            if nbo_analysis_started:
-                if "Donor (L) NBO" in line:  
-                    continue  
-                if line.strip() == "":
-                    continue
-                if "from" in line:
-                    continue
-                if "within unit" in line:
-                    continue
-                if "threshold" in line or "Threshold" in line:
-                    continue
-                if "E(2) E(NL)-E(L) F(L,NL)" in line:
-                    continue
-                if "=" in line:
-                    continue
-                if "NATURAL BOND ORBITALS (Summary):" in line:
-                    break
-
-
-                pattern = re.compile(r"""
-                    ^\s*
-                    (\d+)\.\s+                          # Donor Index (1)
-                    (LP|BD)\s*\(\s*(\d+)\s*\)\s+       # Donor Type (2), Donor Orb No (3)
-                    (.+?)\s{3,}                         # Donor Atom String (4) - Capture until 2+ spaces (separator)
-                    (\d+)\.\s+                          # Acceptor Index (5)
-                    (BD\*|RY|LV)\s*\(\s*(\d+)\s*\)\s+     # Acceptor Type (6), Acceptor Orb No (7)
-                    (.+?)\s+                            # Acceptor Atom String (8) - Capture until space before numbers
-                    ([\d.-]+)\s+                        # E(2) (9)
-                    ([\d.-]+)\s+                        # E Diff (10)
-                    ([\d.-]+)                           # Fock Elem (11)
-                    \s*$
-                """, re.VERBOSE)
-
-                match = pattern.match(line)
-
-                if match:
-                    donor_index = match.group(1)
-                    donor_type = match.group(2)
-                    donor_orb_no = match.group(3)
-                    donor_atom_string = match.group(4).strip()
-                    acceptor_index = match.group(5)
-                    acceptor_type = match.group(6)
-                    acceptor_orb_no = match.group(7)
-                    acceptor_atom_string = match.group(8).strip()
-                    e2 = float(match.group(9))
-                    e_diff = float(match.group(10))
-                    fock_elem = float(match.group(11))
-                    # Split the atom strings into individual atoms
-                    donor_atoms = re.split(r'\s*-\s*', donor_atom_string)
-                    acceptor_atoms = re.split(r'\s*-\s*', acceptor_atom_string)
-                    # Create a dictionary for the NBO data
-                else:
-                    print(f"Parse error in line: {line.strip()}")
-                    continue
-
-                nbo_entry = {
-                    "Donor Index": donor_index,
-                    "Donor Type": donor_type,
-                    "Donor Orb No": donor_orb_no,
-                    "Donor Atoms": donor_atoms,
-                    "Acceptor Index": acceptor_index,
-                    "Acceptor Type": acceptor_type,
-                    "Acceptor Orb No": acceptor_orb_no,
-                    "Acceptor Atoms": acceptor_atoms,
-                    "E(2)": e2,
-                    "E Diff": e_diff,
-                    "Fock Elem": fock_elem
-                }
-                self.nbo_data.append(nbo_entry)
+        if self.cache is not None:
+            with self.metrics.span("read", "cache"):
+                arrays = self.cache.load(self.filepath, "sop")
+            if arrays is not None:
+                self.nbo_data = SOPTable.from_arrays(arrays)
+                return self.nbo_data
+        with self.metrics.span("read", "sections"):
+            section_index(self.filepath, first=("sop",))
+        with self.metrics.span("parse", "sop"):
+            if self.workers is not None and self.workers != 1:
+                from sop_parallel import parse_sop_parallel  # imported here, sop_parallel imports this module
+                self.nbo_data = parse_sop_parallel(self.filepath, workers=self.workers or None, metrics=self.metrics, quiet=self.quiet)
+            else:
+                self.nbo_data = SOPTable.from_entries(iter_nbo_data(self.filepath, self.metrics, self.quiet))
+        if self.cache is not None:
+            self.cache.store(self.filepath, "sop", self.nbo_data.to_arrays())
         return self.nbo_data
     
-    def print_nbo_data(self):
-        """Print the NBO data in a formatted table with better alignment"""
+    def _page(self, table, top, page, page_size, distances=None):
+        # what the printers show for their top/page options: (rows, their distances, footer or None)
+        if top is None and page is None:
+            return table, distances, None
+        rows = table_rows(table.e2, top, page, page_size)
+        if distances is not None:
+            distances = np.asarray(distances)[rows].tolist()
+        return table.take(rows), distances, shown_rows_note(len(rows), len(table), top, page, page_size)
+
+    def print_nbo_data(self, top=None, page=None, page_size=PAGE_SIZE):
+        """Print the NBO data in a formatted table with better alignment, optionally only the top N by E(2) and/or one page"""
+        shown, _, note = self._page(self.nbo_data, top, page, page_size)
         header = (
             f"{'Donor Index':<12} {'Donor Type':<10} {'Donor Orb No':<12} "
             f"{'Donor Atoms':<25} {'Acceptor Index':<15} {'Acceptor Type':<12} "
@@ -119,7 +240,7 @@ class NBO_SOP:
         )
         print(header)
         print("=" * len(header))
-        for entry in self.nbo_data:
+        for entry in shown:
             donor_atoms = ", ".join(entry["Donor Atoms"])
             acceptor_atoms = ", ".join(entry["Acceptor Atoms"])
             row = (
@@ -131,9 +252,11 @@ class NBO_SOP:
             print(row)
         print("=" * len(header))
         print(f"Total number of NBO interactions: {len(self.nbo_data)}")
+        if note:
+            print(note)
 
-    def print_loneToAnti(self):
-        """Print interactions of donor LP and acceptor BD*"""
+    def print_loneToAnti(self, top=None, page=None, page_size=PAGE_SIZE):
+        """Print interactions of donor LP and acceptor BD*, top/page as in print_nbo_data"""
         header = (
             f"{'Donor Index':<12} {'Donor Type':<10} {'Donor Orb No':<12} "
             f"{'Donor Atoms':<25} {'Acceptor Index':<15} {'Acceptor Type':<12} "
@@ -141,21 +264,130 @@ class NBO_SOP:
         )
         print(header)
         print("=" * len(header))
-        counter = 0
-        for entry in self.nbo_data:
-            if entry["Donor Type"] == "LP" and entry["Acceptor Type"] == "BD*":
-                donor_atoms = ", ".join(entry["Donor Atoms"])
-                acceptor_atoms = ", ".join(entry["Acceptor Atoms"])
-                row = (
-                    f"{entry['Donor Index']:<12} {entry['Donor Type']:<10} {entry['Donor Orb No']:<12} "
-                    f"{donor_atoms:<25} {entry['Acceptor Index']:<15} {entry['Acceptor Type']:<12} "
-                    f"{entry['Acceptor Orb No']:<15} {acceptor_atoms:<25} {entry['E(2)']:>8.2f} "
-                    f"{entry['E Diff']:>8.2f} {entry['Fock Elem']:>10.2f}"
-                )
-                print(row)
-                counter += 1
+        selected = self.query(donor_type="LP", acceptor_type="BD*")
+        shown, _, note = self._page(selected, top, page, page_size)
+        for entry in shown:
+            donor_atoms = ", ".join(entry["Donor Atoms"])
+            acceptor_atoms = ", ".join(entry["Acceptor Atoms"])
+            row = (
+                f"{entry['Donor Index']:<12} {entry['Donor Type']:<10} {entry['Donor Orb No']:<12} "
+                f"{donor_atoms:<25} {entry['Acceptor Index']:<15} {entry['Acceptor Type']:<12} "
+                f"{entry['Acceptor Orb No']:<15} {acceptor_atoms:<25} {entry['E(2)']:>8.2f} "
+                f"{entry['E Diff']:>8.2f} {entry['Fock Elem']:>10.2f}"
+            )
+            print(row)
         print("=" * len(header))
-        print(f"Total number of LP to BD* interactions: {counter}")
+        print(f"Total number of LP to BD* interactions: {len(selected)}")
+        if note:
+            print(note)
+
+    def query(self, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None):
+        """Interactions matching the visualise_nbo_data criteria, as an SOPTable (see SOPQuery)"""
+        return SOPQuery(donor, acceptor, donor_type, acceptor_type, E2_below, E2_above).select(self.nbo_data)
+
+    def export_table(self, path, format=None, chunk_rows=CHUNK_ROWS, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None):
+        """Write the interactions matching the visualise_nbo_data filters to CSV, Parquet or Arrow (see tables.py).
+
+        The format comes from the extension unless given, Parquet and Arrow need pyarrow. Returns the number of rows.
+        """
+        selected = self.query(donor=donor, acceptor=acceptor, donor_type=donor_type, acceptor_type=acceptor_type, E2_below=E2_below, E2_above=E2_above)
+        with self.metrics.span("export", path):
+            return write_sop_table(selected, path, format, chunk_rows)
+
+    def e2_matrix(self, fragments=None, how="sum", assign="last", rest=None, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None):
+        """Sparse donor -> acceptor E2Matrix of the filtered interactions, per atom or per fragment (see e2_matrix.py)"""
+        selected = self.query(donor=donor, acceptor=acceptor, donor_type=donor_type, acceptor_type=acceptor_type, E2_below=E2_below, E2_above=E2_above)
+        with self.metrics.span("filter", "e2 matrix"):
+            return E2Matrix.from_table(selected, fragments=fragments, how=how, assign=assign, rest=rest)
+
+    def compare(self, other, tolerance=0.0):
+        """SOPDiff from this calculation to other (an NBO_SOP or SOPTable): appeared, vanished and changed interactions"""
+        other_table = other.nbo_data if isinstance(other, NBO_SOP) else other
+        names = (str(self.filepath), str(getattr(other, "filepath", "other")))
+        return SOPDiff.of(self.nbo_data, other_table, tolerance, names)
+
+    def interaction_geometry(self, xyz_file, centroid=False, **filters):
+        """InteractionGeometry (distances, midpoints, spatial queries) of the interactions matching filters"""
+        return InteractionGeometry(self.query(**filters), xyz_file, centroid=centroid)
+
+    def print_selection(self, selected, interaction_distances, top=None, page=None, page_size=PAGE_SIZE):
+        """Table of the visualised interactions with their interaction distances, top/page as in print_nbo_data"""
+        shown, shown_distances, note = self._page(selected, top, page, page_size, interaction_distances)
+        print(f"{'Donor Index':<12} {'Donor Type':<10} {'Donor Orb No':<12} "
+            f"{'Donor Atoms':<25} {'Acceptor Index':<15} {'Acceptor Type':<12} "
+            f"{'Acceptor Orb No':<15} {'Acceptor Atoms':<25} {'E(2)':>8} {'E Diff':>8} {'Fock Elem':>10} {'Int. Dist Å':>15}")
+        print("=" * 180)
+        for entry, int_dist in zip(shown, shown_distances):
+            donor_atoms = ", ".join(entry["Donor Atoms"])
+            acceptor_atoms = ", ".join(entry["Acceptor Atoms"])
+            row = (
+                f"{entry['Donor Index']:<12} {entry['Donor Type']:<10} {entry['Donor Orb No']:<12} "
+                f"{donor_atoms:<25} {entry['Acceptor Index']:<15} {entry['Acceptor Type']:<12} "
+                f"{entry['Acceptor Orb No']:<15} {acceptor_atoms:<25} {entry['E(2)']:>8.2f} "
+                f"{entry['E Diff']:>8.2f} {entry['Fock Elem']:>10.2f} {int_dist:>15.2f}"
+            )
+            print(row)
+        print("=" * 180)
+        print(f"Total number of NBO interactions of interest: {len(selected)}")
+        if note:
+            print(note)
+
+    def print_latex(self, selected, interaction_distances, top=None, page=None, page_size=PAGE_SIZE):
+        """prints same as print_selection but in latex table format ready for copy and paste without the donor/acceptor index and orbital numbers"""
+        shown, shown_distances, note = self._page(selected, top, page, page_size, interaction_distances)
+        print("\\begin{table}[H]")
+        print("\\centering")
+        print("\\begin{tabular}{|c|c|c|c|c|c|c|c}")
+        print("\\hline")
+        print(f"{'Donor Type':<10} & {'Donor Atoms':<25} & {'Acceptor Type':<12} & "
+            f"{'Acceptor Atoms':<25} & {'E(2)':>8} & {'E Diff':>8} & {'Fock Elem':>10} & {'IntDist':>10}\\\\")
+        print("\\hline")
+        for entry, int_dist in zip(shown, shown_distances):
+            donor_atoms = ", ".join(entry["Donor Atoms"])
+            acceptor_atoms = ", ".join(entry["Acceptor Atoms"])
+            row = (f"{entry['Donor Type']:<10} & {donor_atoms:<25} & {entry['Acceptor Type']:<12} "
+                f"& {acceptor_atoms:<25} & {entry['E(2)']:>8.2f} & {entry['E Diff']:>8.2f} & {entry['Fock Elem']:>10.2f} & {int_dist:>10.2f} \\\\")
+            print(row)
+        print("\\hline")
+        print("\\end{tabular}")
+        print("\\caption{NBO Second Order Perturbation Theory Analysis}")
+        print("\\label{tab:nbo_sop}")
+        print("\\end{table}")
+        if note:
+            print(f"% {note}")
+
+    def _render_batched(self, view, selected, interactions, vmin, vmax, label, proportional_radius, max_cylinders, label_min_e2, color_bins, quiet=False):
+        """Cylinders and labels of the selection in a few JavaScript calls, see scene.py"""
+        e2 = selected.e2
+        if len(e2):
+            # one normalization for the whole scene, the one the colour bar shows
+            vmin = min(vmin, float(e2.min()))
+            vmax = max(vmax, float(e2.max()))
+        pair_keys = interactions.start_atom.astype(np.int64) * len(interactions.geometry) + interactions.end_atom
+        kept, aggregated, aggregated_e2, aggregated_counts = level_of_detail(e2, pair_keys, max_cylinders)
+
+        colors, codes = value_colors(e2[kept], vmin, vmax, bins=color_bins)
+        shown_e2 = e2[kept] if codes is None else vmin + (codes + 0.5) / color_bins * (vmax - vmin)
+        radii = 0.01 + (shown_e2 / vmax) * 0.04 if proportional_radius else 0.05
+        add_cylinders(view, interactions.start[kept], interactions.end[kept], colors, radii, opacity=0.8)
+        if len(aggregated):
+            # everything over the cap: one thin grey cylinder per donor -> acceptor atom pair
+            add_cylinders(view, interactions.start[aggregated], interactions.end[aggregated], ['#a0a0a0'] * len(aggregated), 0.02, opacity=0.4)
+        if len(aggregated) and not quiet:
+            print(f"{len(e2) - len(kept)} interactions beyond the top {len(kept)} drawn as {len(aggregated)} grey cylinders "
+                  f"(one per atom pair, summed E(2) up to {aggregated_e2.max():.2f}, at most {aggregated_counts.max()} interactions each)")
+
+        if label:
+            labelled = kept if label_min_e2 is None else kept[e2[kept] >= label_min_e2]
+            label_colors = [colors[i] for i in np.flatnonzero(np.isin(kept, labelled))]
+            add_labels(view, [f"E(2): {value:.2f}" for value in e2[labelled].tolist()], interactions.midpoints[labelled], label_colors, {
+                'backgroundOpacity': 0.3,
+                'fontSize': 10,
+                'fontColor': 'black',
+                'fontWeight': 'bold'
+            })
+        connection_indexes = list(zip(interactions.start_atom.tolist(), interactions.end_atom.tolist()))
+        return vmin, vmax, connection_indexes
 
 ##########################################
 # For visualisation of NBO Second Order Perturbation Theory Analysis i am thinking of using xyz file for atom numbers with their positions and using the 
@@ -163,30 +395,25 @@ class NBO_SOP:
 ## i.e. the larger the E(2) value the thicker the cylinder and the more red it is
 # i.e. the smaller the E(2) value the thinner the cylinder and the more blue it is
 ##########################################
-    def visualise_nbo_data(self, xyz_file, view=None, display=True, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None, label=True, print_latex=False, proportional_radius=False):
-        print("*" * 150)
-        print("     Note this defaults to LP to BD* interactions, if you want to see other interactions please specify the donor and acceptor types.")
-        print("*" * 150)
-        print("")
+    def visualise_nbo_data(self, xyz_file, view=None, display=True, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None, label=True, print_latex=False, proportional_radius=False, renderer="calls", max_cylinders=None, label_min_e2=None, color_bins=64, export_to=None, quiet=None, table_top=None):
+        quiet = self.quiet if quiet is None else quiet
+        if not quiet:
+            print("*" * 150)
+            print("     Note this defaults to LP to BD* interactions, if you want to see other interactions please specify the donor and acceptor types (None for any type).")
+            print("*" * 150)
+            print("")
         connection_indexes = []
-        interaction_distances = []
         vmin = E2_above if E2_above is not None else 0  # Minimum E(2) value for color normalization
         vmax = E2_below if E2_below is not None else 1 if vmin == 0 else vmin + 0.1  # Maximum E(2) value for color normalization
-        with open(xyz_file, 'r') as f:
-            lines = f.readlines()
-        coordinates = []
-        for line in lines[2:]:
-            parts = line.split()
-            if len(parts) >= 4:
-                x = float(parts[1])
-                y = float(parts[2])
-                z = float(parts[3])
-                coordinates.append((x, y, z))
+        # xyz_file can also be a Geometry or an ORCA output (its final coordinates are used)
+        start = time.perf_counter()
+        geometry = load_geometry(xyz_file)
+        self.metrics.add_span("geometry", time.perf_counter() - start, "load")
 
         # Create a view for visualization
         if view is None:
-            view = py3Dmol.view(width=1500, height=1000)
-            view.addModel(open(xyz_file, 'r').read(), 'xyz')
+            view = new_view(1500, 1000)
+            view.addModel(geometry.xyz_block(), 'xyz')
             view.setStyle({'stick': {'radius': 0.03}})
             view.setBackgroundColor('white')
 
@@ -194,52 +421,28 @@ class NBO_SOP:
         # for i, coord in enumerate(coordinates):
         #     view.addSphere({'center': {'x': coord[0], 'y': coord[1], 'z': coord[2]}, 'radius': 0.2, 'color': 'gray'})
         
-        if donor is not None:
-            if isinstance(donor, str) and len(donor) == 1:
-                donor = [donor]
-            if isinstance(donor, str) and len(donor) in [1, 2]:
-                donor = list(donor)
-
-        if acceptor is not None:
-            if isinstance(acceptor, str) and len(acceptor) == 1:
-                acceptor = [acceptor]
-            if isinstance(acceptor, str) and len(acceptor) in [1, 2]:
-                acceptor = list(acceptor)
-
-        for entry in self.nbo_data:
-            if entry["Donor Type"] == donor_type and entry["Acceptor Type"] == acceptor_type:
-                if donor is not None:
-                    if len(donor) == 1:
-                        if not any(donor[0] in atom for atom in entry["Donor Atoms"]):
-                            continue
-                    if len(donor) == 2:
-                        if len(entry["Donor Atoms"]) != 2:
-                            continue
-                        elif not (donor[0] == ''.join(filter(str.isalpha, entry["Donor Atoms"][0])) and donor[1] == ''.join(filter(str.isalpha, entry["Donor Atoms"][1]))):
-                            continue
-                if acceptor is not None:
-                    if len(acceptor) == 1:
-                        if not any(acceptor[0] in atom for atom in entry["Acceptor Atoms"]):
-                            continue
-                    if len(acceptor) == 2:
-                        if len(entry["Acceptor Atoms"]) != 2:
-                            continue
-                        elif not (acceptor[0] == ''.join(filter(str.isalpha, entry["Acceptor Atoms"][0])) and acceptor[1] == ''.join(filter(str.isalpha, entry["Acceptor Atoms"][1]))):
-                            continue
-                if E2_below is not None and entry["E(2)"] > E2_below:
-                    continue
-                if E2_above is not None and entry["E(2)"] < E2_above:
-                    continue
-
-
-                donor_atoms = entry["Donor Atoms"]
-                acceptor_atoms = entry["Acceptor Atoms"]
-                # if donor or acceptor:
-                #     if len(donor_atoms) != len(donor) or len(acceptor_atoms) != len(acceptor):
-                #         continue
-
-                donor_index = int(re.findall(r'\d+', donor_atoms[-1])[-1]) - 1
-                acceptor_index = int(re.findall(r'\d+', acceptor_atoms[-1])[-1]) - 1
+        # the criteria are evaluated once, the cylinders, the table and the LaTeX output all use this selection
+        with self.metrics.span("filter"):
+            selected = self.query(donor=donor, acceptor=acceptor, donor_type=donor_type, acceptor_type=acceptor_type, E2_below=E2_below, E2_above=E2_above)
+
+        # endpoints, midpoints and distances of the whole selection in one NumPy pass
+        with self.metrics.span("geometry", "interactions"):
+            interactions = InteractionGeometry(selected, geometry)
+            interaction_distances = interactions.distances.tolist()
+
+        start = time.perf_counter()
+        if renderer == "batched":
+            vmin, vmax, connection_indexes = self._render_batched(view, selected, interactions, vmin, vmax, label, proportional_radius, max_cylinders, label_min_e2, color_bins, quiet)
+        else:
+            from matplotlib import colors
+            import matplotlib.pyplot as plt
+            starts = interactions.start.tolist()
+            ends = interactions.end.tolist()
+            midpoints = interactions.midpoints.tolist()
+
+            for i, entry in enumerate(selected):
+                donor_index = int(interactions.start_atom[i])
+                acceptor_index = int(interactions.end_atom[i])
                 e2_value = entry["E(2)"]
                 norm = colors.Normalize(vmin=vmin, vmax=vmax)  
                 cmap = plt.colormaps.get_cmap('rainbow')
@@ -250,17 +453,10 @@ class NBO_SOP:
                 else:
                     radius = 0.05                
 
-
                 # show e2 value as label at midpoint of the cylinder
-                mid_x = (coordinates[donor_index][0] + coordinates[acceptor_index][0]) / 2
-                mid_y = (coordinates[donor_index][1] + coordinates[acceptor_index][1]) / 2
-                mid_z = (coordinates[donor_index][2] + coordinates[acceptor_index][2]) / 2
-
-                # calculating interaction distance as the distance between the midpoints of the donor and acceptor atoms in 3D space (note angstroms)
-                int_dist = ((coordinates[donor_index][0] - coordinates[acceptor_index][0]) ** 2 +
-                            (coordinates[donor_index][1] - coordinates[acceptor_index][1]) ** 2 +
-                            (coordinates[donor_index][2] - coordinates[acceptor_index][2]) ** 2) ** 0.5
-                interaction_distances.append(int_dist)
+                mid_x, mid_y, mid_z = midpoints[i]
+                start_x, start_y, start_z = starts[i]
+                end_x, end_y, end_z = ends[i]
 
                 if label:
                     view.addLabel(f"E(2): {e2_value:.2f}", {
@@ -272,8 +468,8 @@ class NBO_SOP:
                         'fontWeight': 'bold'
                     })
                 view.addCylinder({
-                    'start': {'x': coordinates[donor_index][0], 'y': coordinates[donor_index][1], 'z': coordinates[donor_index][2]},
-                    'end': {'x': coordinates[acceptor_index][0], 'y': coordinates[acceptor_index][1], 'z': coordinates[acceptor_index][2]},
+                    'start': {'x': start_x, 'y': start_y, 'z': start_z},
+                    'end': {'x': end_x, 'y': end_y, 'z': end_z},
                     'color': color,
                     'radius': radius,
                     'opacity': 0.8
@@ -283,117 +479,30 @@ class NBO_SOP:
                     vmax = entry["E(2)"]
                 if entry["E(2)"] < vmin:
                     vmin = entry["E(2)"]
+        self.metrics.add_span("render", time.perf_counter() - start, renderer)
 
         # print only the visualised data in a table
-        print(f"{'Donor Index':<12} {'Donor Type':<10} {'Donor Orb No':<12} "
-            f"{'Donor Atoms':<25} {'Acceptor Index':<15} {'Acceptor Type':<12} "
-            f"{'Acceptor Orb No':<15} {'Acceptor Atoms':<25} {'E(2)':>8} {'E Diff':>8} {'Fock Elem':>10} {'Int. Dist Å':>15}")
-        print("=" * 180)
-        counter = 0
-        for entry in self.nbo_data:
-            if entry["Donor Type"] == donor_type and entry["Acceptor Type"] == acceptor_type:
-                if donor is not None:
-                    if len(donor) == 1:
-                        if not any(donor[0] in atom for atom in entry["Donor Atoms"]):
-                            continue
-                    elif len(donor) == 2:
-                        if len(entry["Donor Atoms"]) != 2:
-                            continue
-                        elif not (donor[0] == ''.join(filter(str.isalpha, entry["Donor Atoms"][0])) and donor[1] == ''.join(filter(str.isalpha, entry["Donor Atoms"][1]))):
-                            continue
-                if acceptor is not None:
-                    if len(acceptor) == 1:
-                        if not any(acceptor[0] in atom for atom in entry["Acceptor Atoms"]):
-                            continue
-                    elif len(acceptor) == 2:
-                        if len(entry["Acceptor Atoms"]) != 2:
-                            continue
-                        elif not (acceptor[0] == ''.join(filter(str.isalpha, entry["Acceptor Atoms"][0])) and acceptor[1] == ''.join(filter(str.isalpha, entry["Acceptor Atoms"][1]))):
-                            continue
-                if E2_below is not None and entry["E(2)"] > E2_below:
-                    continue
-                if E2_above is not None and entry["E(2)"] < E2_above:
-                    continue
-                # interaction distance is the distance between the midpoints of the donors and acceptors
-
-            
-                donor_atoms = ", ".join(entry["Donor Atoms"])
-                acceptor_atoms = ", ".join(entry["Acceptor Atoms"])
-                row = (
-                    f"{entry['Donor Index']:<12} {entry['Donor Type']:<10} {entry['Donor Orb No']:<12} "
-                    f"{donor_atoms:<25} {entry['Acceptor Index']:<15} {entry['Acceptor Type']:<12} "
-                    f"{entry['Acceptor Orb No']:<15} {acceptor_atoms:<25} {entry['E(2)']:>8.2f} "
-                    f"{entry['E Diff']:>8.2f} {entry['Fock Elem']:>10.2f} {(interaction_distances[counter]):>15.2f}"
-                )
-                print(row)
-                counter += 1
-        print("=" * 180)
-        print(f"Total number of NBO interactions of interest: {counter}")
+        if not quiet:
+            self.print_selection(selected, interaction_distances, top=table_top)
 
         if print_latex:
-            """prints same as above but in latex table format ready for copy and paste without the donor/acceptor index and orbital numbers"""
-            counter = 0
-            print("\\begin{table}[H]")
-            print("\\centering")
-            print("\\begin{tabular}{|c|c|c|c|c|c|c|c}")
-            print("\\hline")
-            print(f"{'Donor Type':<10} & {'Donor Atoms':<25} & {'Acceptor Type':<12} & "
-                f"{'Acceptor Atoms':<25} & {'E(2)':>8} & {'E Diff':>8} & {'Fock Elem':>10} & {'IntDist':>10}\\\\")
-            print("\\hline")
-            for entry in self.nbo_data:
-                if entry["Donor Type"] == donor_type and entry["Acceptor Type"] == acceptor_type:
-                    if donor is not None:
-                        if len(donor) == 1:
-                            if not any(donor[0] in atom for atom in entry["Donor Atoms"]):
-                                continue
-                        elif len(donor) == 2:
-                            if len(entry["Donor Atoms"]) != 2:
-                                continue
-                            elif not (donor[0] == ''.join(filter(str.isalpha, entry["Donor Atoms"][0])) and
-                                    donor[1] == ''.join(filter(str.isalpha, entry["Donor Atoms"][1]))):
-                                continue
-                    if acceptor is not None:
-                        if len(acceptor) == 1:
-                            if not any(acceptor[0] in atom for atom in entry["Acceptor Atoms"]):
-                                continue
-                        elif len(acceptor) == 2:
-                            if len(entry["Acceptor Atoms"]) != 2:
-                                continue
-                            elif not (acceptor[0] == ''.join(filter(str.isalpha, entry["Acceptor Atoms"][0])) and
-                                    acceptor[1] == ''.join(filter(str.isalpha, entry["Acceptor Atoms"][1]))):
-                                continue
-                    if E2_below is not None and entry["E(2)"] > E2_below:
-                        continue
-                    if E2_above is not None and entry["E(2)"] < E2_above:
-                        continue
-                    donor_atoms = ", ".join(entry["Donor Atoms"])
-                    acceptor_atoms = ", ".join(entry["Acceptor Atoms"])
-                    row = (f"{entry['Donor Type']:<10} & {donor_atoms:<25} & {entry['Acceptor Type']:<12} "
-                        f"& {acceptor_atoms:<25} & {entry['E(2)']:>8.2f} & {entry['E Diff']:>8.2f} & {entry['Fock Elem']:>10.2f} & {interaction_distances[counter]:>10.2f} \\\\")
-                    print(row)
-                    counter += 1
-            print("\\hline")
-            print("\\end{tabular}")
-            print("\\caption{NBO Second Order Perturbation Theory Analysis}")
-            print("\\label{tab:nbo_sop}")
-            print("\\end{table}")
-        # Show the view
-        if display:
+            self.print_latex(selected, interaction_distances, top=table_top)
+        # -- color bar to show the spread of E(2) values --
+        fig = colorbar(vmin, vmax, f'E(2) kcal/mol range\n[min: {vmin:.2f}, max: {vmax:.2f}]', ticks=True, headless=export_to is not None or not display)
+        if export_to is not None:
+            # headless: files only, no display calls
+            data = {"vmin": vmin, "vmax": vmax, "interactions": [
+                dict(entry, **{"Int. Dist": int_dist}) for entry, int_dist in zip(selected, interaction_distances)]}
+            with self.metrics.span("export"):
+                written = export(export_to, view=view, fig=fig, data=data)
+            if not quiet:
+                for path in written:
+                    print(f"Written {path}")
+        elif display:
+            import matplotlib.pyplot as plt
             view.zoomTo()
             view.show()
-        
-        # -- color bar to show the spread of E(2) values --
-        fig, ax = plt.subplots(figsize=(6, 1))
-        fig.subplots_adjust(bottom=0.5)
-        cmap = cm.rainbow
-        norm = colors.Normalize(vmin=vmin, vmax=vmax)
-        sm = cm.ScalarMappable(norm=norm, cmap=cmap)
-        sm.set_array([])  # Needed for the ScalarMappable
-        cb = fig.colorbar(sm, cax=ax, orientation='horizontal')
-        cb.set_ticks([vmin, (vmin+vmax)/2, vmax])
-        cb.set_ticklabels([f"{vmin:.2f}", f"{(vmin+vmax)/2:.2f}", f"{vmax:.2f}"])
-        cb.set_label(f'E(2) kcal/mol range\n[min: {vmin:.2f}, max: {vmax:.2f}]')
-        plt.show()
+            plt.show()
 
         connection_indexes = set(connection_indexes)
         return connection_indexes if not display else None
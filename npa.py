@@ -1,183 +1,298 @@
 import re
-import py3Dmol
-import matplotlib.cm as cm
-import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
+import time
+import numpy as np
+from diagnostics import MAX_ERROR_SAMPLES, Metrics, logger
+from geometry import load_geometry
+from orca_sections import SECTION_MARKERS, is_path, section_index
+from parse_cache import resolve_cache
+from scene import add_labels, colorbar, export, new_view, value_colors
+from tables import CHUNK_ROWS, PAGE_SIZE, write_npa_table
+
+ATOM_LABEL = re.compile(r'^([A-Za-z]+)(\d+)$', re.IGNORECASE)
+NPA_FIELDS = ("Natural Charge", "Core", "Valence", "Rydberg", "Total", "Spin Density")
+NPA_START = SECTION_MARKERS["npa"].decode()
+NPA_HEADER = "Atom No    Charge"
+
+
+def npa_block_end(line):
+    """Separator, total and blank lines, which end the table once atoms were read"""
+    return NPA_HEADER not in line and ("=============" in line or "Total" in line.split() or not line.strip())
+
+
+def parse_npa_line(line):
+    """(atom label, fields) of one row of the NPA summary, None for the header and short lines"""
+    parts = line.split()
+    if NPA_HEADER in line or len(parts) < 6:
+        return None
+    if re.match(r'^[A-Za-z]+\d+$', parts[0]):
+        atom_label = parts[0]
+        offset = 0
+    elif re.match(r'^[A-Za-z]+$', parts[0]) and re.match(r'^\d+$', parts[1]):
+        atom_label = parts[0] + parts[1]
+        offset = 1
+    else:
+        raise ValueError("Unexpected atom label format")
+    try:
+        charge = float(parts[offset + 1])
+        core = float(parts[offset + 2])
+        valence = float(parts[offset + 3])
+        rydberg = float(parts[offset + 4])
+        total = float(parts[offset + 5])
+    except IndexError:
+        raise ValueError("Too few columns")
+    spin_density = float(parts[offset + 6]) if len(parts) > offset + 6 else None
+    return atom_label, {
+        "Natural Charge": charge,
+        "Core": core,
+        "Valence": valence,
+        "Rydberg": rydberg,
+        "Total": total,
+        "Spin Density": spin_density
+    }
+
+
+def parse_npa_lines(lines, quiet=False):
+    """(npa_data, skipped, errors, error samples) of the lines of one NPA summary, up to the end of its table"""
+    npa_data = {}
+    skipped = errors = 0
+    samples = []
+    for line in lines:
+        if npa_block_end(line):
+            if npa_data:
+                break
+            skipped += 1
+            continue
+        try:
+            row = parse_npa_line(line)
+        except ValueError:
+            errors += 1
+            if len(samples) < MAX_ERROR_SAMPLES:
+                samples.append(line.strip())
+            if not quiet:
+                print(f"Parse error in line: {line.strip()}")
+            continue
+        if row is not None:
+            atom_label, entry = row
+            npa_data[atom_label] = entry
+        else:
+            skipped += 1
+    return npa_data, skipped, errors, samples
+
+
+def npa_to_arrays(npa_data):
+    """npa_data as flat arrays for the parse cache, a missing spin density is stored as NaN"""
+    arrays = {"labels": np.array(list(npa_data), dtype=str)}
+    for i, field in enumerate(NPA_FIELDS):
+        values = [data[field] for data in npa_data.values()]
+        arrays[f"field{i}"] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return arrays
+
+
+def npa_from_arrays(arrays):
+    npa_data = {}
+    for row, label in enumerate(arrays["labels"]):
+        entry = {field: float(arrays[f"field{i}"][row]) for i, field in enumerate(NPA_FIELDS)}
+        if np.isnan(entry["Spin Density"]):
+            entry["Spin Density"] = None
+        npa_data[str(label)] = entry
+    return npa_data
+
 
 class NPA:
-    def __init__(self, filepath):
+    def __init__(self, filepath, cache=None, metrics=None, quiet=False):
+        # a path or a readable object, plain or compressed, as for NBO_SOP
         self.filepath = filepath
+        self.cache = resolve_cache(cache) if is_path(filepath) else None
+        # stage timings and line counters of this instance, see diagnostics.py
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.quiet = quiet
         self.extract_npa_data()
 
+    @classmethod
+    def from_data(cls, npa_data, filepath=None, metrics=None, quiet=False):
+        """An NPA over {atom label: fields} that was not parsed here, e.g. read back from a library.py store"""
+        npa = cls.__new__(cls)
+        npa.filepath = filepath
+        npa.cache = None
+        npa.metrics = metrics if metrics is not None else Metrics()
+        npa.quiet = quiet
+        npa.npa_data = npa_data
+        npa.index_labels()
+        return npa
+
     def extract_npa_data(self):
-        self.npa_data = {}
-        with open(self.filepath, 'r') as f:
-            lines = f.readlines()
-
-        npa_summary_started = False
-        for line in lines:
-            if "Summary of Natural Population Analysis:" in line:
-                npa_summary_started = True
-                continue  
-
-            if npa_summary_started:
-                
-                if "Atom No    Charge" in line:  
-                    continue  
-
-                if "=============" in line or "Total" in line.split() or not line.strip():
-                    if self.npa_data:  
-                        break
-                    else:
-                        continue  
-
-                parts = line.split()
-                if len(parts) >= 6:
-                    try:
-                        if re.match(r'^[A-Za-z]+\d+$', parts[0]):
-                            atom_label = parts[0]
-                            offset = 0
-                        elif re.match(r'^[A-Za-z]+$', parts[0]) and re.match(r'^\d+$', parts[1]):
-                            atom_label = parts[0] + parts[1]
-                            offset = 1
-                        else:
-                            raise ValueError("Unexpected atom label format")
-                        charge = float(parts[offset + 1])   
-                        core = float(parts[offset + 2])       
-                        valence = float(parts[offset + 3])    
-                        rydberg = float(parts[offset + 4])    
-                        total = float(parts[offset + 5])
-                        spin_density = float(parts[offset + 6]) if len(parts) > offset + 6 else None      
-
-                        self.npa_data[atom_label] = {
-                            "Natural Charge": charge,
-                            "Core": core,
-                            "Valence": valence,
-                            "Rydberg": rydberg,
-                            "Total": total,
-                            "Spin Density": spin_density
-                        }
-                    except (ValueError, IndexError) as e:
-                        print(f"Parse error in line: {line.strip()}")
-                continue
+        if self.cache is not None:
+            with self.metrics.span("read", "cache"):
+                arrays = self.cache.load(self.filepath, "npa")
+            if arrays is not None:
+                self.npa_data = npa_from_arrays(arrays)
+                self.index_labels()
+                return self.npa_data
+        # only the byte range of the (first) NPA summary is read, the section index is shared with NBO_SOP
+        with self.metrics.span("read", "sections"):
+            index = section_index(self.filepath, first=("npa",))
+        section = index.first("npa")
+        lines = index.lines(section) if section is not None else ()
+
+        start = time.perf_counter()
+        self.npa_data, skipped, errors, samples = parse_npa_lines(lines, self.quiet)
+        self.metrics.add_span("parse", time.perf_counter() - start, "npa")
+        self.metrics.add_counts("npa", len(self.npa_data), skipped, errors, samples, self.quiet)
 
+        if self.cache is not None:
+            self.cache.store(self.filepath, "npa", npa_to_arrays(self.npa_data))
+        self.index_labels()
         return self.npa_data
     
     # --- print the NPA data ---
-    def print_npa_data(self):
-        for atom, data in self.npa_data.items():
+    def print_npa_data(self, page=None, page_size=PAGE_SIZE):
+        """All atoms, or only the atoms of one 1-based page of page_size"""
+        atoms = list(self.npa_data.items())
+        if page is not None:
+            pages = max(1, -(-len(atoms) // page_size))
+            if not 1 <= page <= pages:
+                raise ValueError(f"page {page} out of range, there are {pages} pages of {page_size} atoms")
+            atoms = atoms[(page - 1) * page_size:page * page_size]
+        for atom, data in atoms:
             print(f"Atom: {atom}")
             for key, value in data.items():
                 print(f"  {key}: {value}")
+        if page is not None:
+            print(f"Showing {len(atoms)} of {len(self.npa_data)} atoms (page {page}/{pages})")
+
+    def export_table(self, path, format=None, chunk_rows=CHUNK_ROWS):
+        """Write one row per atom (label and NPA_FIELDS) to CSV, Parquet or Arrow, see tables.py"""
+        with self.metrics.span("export", path):
+            return write_npa_table(self.npa_data, NPA_FIELDS, path, format, chunk_rows)
+
+    # --- atom labels as arrays, parsed once per extraction ---
+    def index_labels(self):
+        """Fill self.labels, self.atom_elements and self.atom_indices (0-based, -1 if the label does not parse)"""
+        self.labels = list(self.npa_data)
+        elements, indices = [], []
+        for atom_label in self.labels:
+            match = ATOM_LABEL.match(atom_label)
+            elements.append(match.group(1).upper() if match else "")
+            indices.append(int(match.group(2)) - 1 if match else -1)
+        self.atom_elements = np.array(elements, dtype=str)
+        self.atom_indices = np.array(indices, dtype=np.int64)
+
+    def property_values(self, property_name):
+        """Values of one NPA field in label order, NaN where the value is missing or not a number"""
+        values = np.full(len(self.labels), np.nan)
+        for row, data in enumerate(self.npa_data.values()):
+            try:
+                values[row] = float(data[property_name])
+            except (ValueError, TypeError):
+                pass
+        return values
+
+    def match_geometry(self, geometry, property_name):
+        """(values, in range, element matches, valid) per NPA atom against a Geometry; valid atoms can be drawn at atom_indices"""
+        values = self.property_values(property_name)
+        indices = self.atom_indices
+        in_range = (indices >= 0) & (indices < len(geometry))
+        xyz_elements = np.char.upper(geometry.elements)
+        matches = in_range & (xyz_elements[np.where(in_range, indices, 0)] == self.atom_elements)
+        return values, in_range, matches, matches & ~np.isnan(values)
 
     # --- visualise with py3dmol ---
-    def visualise_property(self, xyz_file, property_name = "Natural Charge", gradient = "rainbow", labels=True, stick_size=0.15, sphere_size=0.25):
+    def visualise_property(self, xyz_file, property_name = "Natural Charge", gradient = "rainbow", labels=True, stick_size=0.15, sphere_size=0.25, color_bins=64, display=True, export_to=None, quiet=None):
+        quiet = self.quiet if quiet is None else quiet
         g = gradient.lower()
-        xyz_data = open(xyz_file).read()
-        xyz_lines = xyz_data.splitlines()
-        num_atoms_xyz = int(xyz_lines[0])
-        print("Number of atoms in XYZ file:", num_atoms_xyz)
+        # xyz_file can also be a Geometry or an ORCA output (its final coordinates are used)
+        with self.metrics.span("geometry", "load"):
+            geometry = load_geometry(xyz_file)
+        num_atoms_xyz = len(geometry)
+        if not quiet:
+            print("Number of atoms in XYZ file:", num_atoms_xyz)
+        start = time.perf_counter()
 
-        view = py3Dmol.view(width=1000, height=800)
-        view.addModel(xyz_data, 'xyz')
+        view = new_view(1000, 800)
+        view.addModel(geometry.xyz_block(), 'xyz')
         view.setStyle({'stick': {'radius': 0.15}})  # Keep bonds visible
 
-        # --- Color mapping based on NPA value ---
-        values = []
-        atom_indices_with_value = []
-        xyz_elements = [line.split()[0] for line in xyz_data.split('\n')[2:2+num_atoms_xyz]]  # Extract XYZ elements
+        # --- Match NPA atoms to the geometry, all atoms at once ---
+        indices = self.atom_indices
+        values, in_range, matches, valid = self.match_geometry(geometry, property_name)
+        xyz_elements = np.char.upper(geometry.elements)
 
-        for atom_label, data in self.npa_data.items():
-            # Parse atom label with updated regex
-            match = re.match(r'^([A-Za-z]+)(\d+)$', atom_label, re.IGNORECASE)
-            if not match:
+        # only the problem atoms get a message, quiet logs how many there are instead
+        problems = np.flatnonzero(~valid)
+        if quiet and len(problems):
+            logger.warning("%d of %d NPA atoms not shown (label, index, element or value problem), first: %s",
+                           len(problems), len(valid), self.labels[problems[0]])
+        for row in problems if not quiet else ():
+            atom_label, atom_index = self.labels[row], indices[row]
+            if atom_index < 0:
                 print(f"Warning: Could not parse atom label: {atom_label}")
-                continue
-            
-            element = match.group(1).upper()
-            atom_index = int(match.group(2)) - 1  # Convert to 0-based index
-            
-            # Validate index and element
-            if 0 <= atom_index < num_atoms_xyz:
-                if xyz_elements[atom_index].upper() != element.upper():
-                    print(f"Element mismatch at index {atom_index}: XYZ={xyz_elements[atom_index].upper()}, NPA={element.upper()}")
-                    continue
-                
-                try:
-                    value = float(data[property_name])
-                    values.append(value)
-                    atom_indices_with_value.append(atom_index)
-                except (ValueError, TypeError):
-                    print(f"Invalid value for {atom_label}: {data[property_name]}")
-            else:
+            elif not in_range[row]:
                 print(f"Warning: Atom index {atom_index + 1} from NPA data out of range (XYZ has {num_atoms_xyz} atoms)")
+            elif not matches[row]:
+                print(f"Element mismatch at index {atom_index}: XYZ={xyz_elements[atom_index]}, NPA={self.atom_elements[row]}")
+            else:
+                print(f"Invalid value for {atom_label}: {self.npa_data[atom_label][property_name]}")
 
-        # if not values:
-        #     print("Error: No valid values found. Using default colors.")
-        #     view.setStyle({}, {'sphere': {'color': 'grey', 'scale': 0.25}})
-        else:
-            min_value, max_value = min(values), max(values)
-            norm = mcolors.Normalize(vmin=min_value, vmax=max_value)
-            cmap = cm.get_cmap(g)
-
-            styled_indices = set()
-            for atom_label, data in self.npa_data.items():
-                match = re.match(r'^([A-Za-z]+)(\d+)$', atom_label, re.IGNORECASE)
-                if not match:
-                    continue
-                    
-                atom_index = int(match.group(2)) - 1
-                if 0 <= atom_index < num_atoms_xyz and xyz_elements[atom_index].upper() == match.group(1).upper():
-                    try:
-                        value = float(data[property_name])
-                        hex_color = mcolors.to_hex(cmap(norm(value)))
-                        # Maintain both stick and sphere styles
-                        view.setStyle({'index': atom_index}, {
-                            'stick': {'radius': stick_size},
-                            'sphere': {'color': hex_color, 'scale': sphere_size}
-                        })
-                        styled_indices.add(atom_index)
-                    except (ValueError, TypeError):
-                        continue
-
-            #  missing atoms (hopefully not needed)
-            missing_indices = set(range(num_atoms_xyz)) - styled_indices
-            if missing_indices:
-                view.setStyle({'index': list(missing_indices)}, {'sphere': {'color': 'grey', 'scale': 0.2}})
+        if not valid.any():
+            print("Error: No valid values found. Using default colors.")
+            view.setStyle({}, {'sphere': {'color': 'grey', 'scale': 0.2}})
+            if export_to is not None:
+                with self.metrics.span("export"):
+                    export(export_to, view=view)
+            elif display:
+                view.zoomTo()
+                view.show()
+            return view if not display else None
+
+        rows = np.flatnonzero(valid)
+        min_value, max_value = float(values[rows].min()), float(values[rows].max())
+        # one colormap call for every atom; with color_bins the colours are quantized so atoms share them
+        hex_colors, _ = value_colors(values[rows], min_value, max_value, cmap=g, bins=color_bins)
 
+        # --- one setStyle per colour instead of one per atom ---
+        by_color = {}
+        for atom_index, hex_color in zip(indices[rows].tolist(), hex_colors):
+            by_color.setdefault(hex_color, []).append(atom_index)
+        for hex_color, atom_indices in by_color.items():
+            # Maintain both stick and sphere styles
+            view.setStyle({'index': atom_indices}, {
+                'stick': {'radius': stick_size},
+                'sphere': {'color': hex_color, 'scale': sphere_size}
+            })
+        styled_indices = set(indices[rows].tolist())
+
+        #  missing atoms (hopefully not needed)
+        missing_indices = set(range(num_atoms_xyz)) - styled_indices
+        if missing_indices:
+            view.setStyle({'index': sorted(missing_indices)}, {'sphere': {'color': 'grey', 'scale': 0.2}})
+
+        if not quiet:
             print(f"NPA Value range: {min_value:.3f} to {max_value:.3f}")
             print(f"Found {len(styled_indices)}/{num_atoms_xyz} atoms")
+            print(f"Coloured with {len(by_color)} setStyle calls")
+
         if labels:
-            for atom_label, data in self.npa_data.items():
-                match = re.match(r'^([A-Za-z]+)(\d+)$', atom_label, re.IGNORECASE)
-                if not match:
-                    continue
-                element = match.group(1).upper()
-                atom_index = int(match.group(2)) - 1  # 0 indexed
-                if 0 <= atom_index < num_atoms_xyz and xyz_elements[atom_index] == element:
-                    try:
-                        value = float(data[property_name])
-                    except (ValueError, TypeError):
-                        continue
-                    parts = xyz_lines[atom_index+2].split()
-                    x, y, z = map(float, parts[1:4])
-
-                    hex_color = mcolors.to_hex(cmap(norm(value)))
-                    view.addLabel(f"{value:.3f}", {
-                        'position': {'x': x, 'y': y, 'z': z},
-                        'backgroundColor': hex_color,
-                        'backgroundOpacity': 0.5,
-                        'fontColor': 'black',
-                        'fontSize': 10
-                    })
+            add_labels(view, [f"{value:.3f}" for value in values[rows].tolist()], geometry.coordinates[indices[rows]], hex_colors, {
+                'backgroundOpacity': 0.5,
+                'fontColor': 'black',
+                'fontSize': 10
+            })
+        self.metrics.add_span("render", time.perf_counter() - start, "npa")
 
         # --- Color bar for visualization ---
-        fig, ax = plt.subplots(figsize=(6, 1))
-        fig.subplots_adjust(bottom=0.5)
-        cmap = cm.get_cmap(g)
-        norm = mcolors.Normalize(vmin=min_value, vmax=max_value)
-        cb = fig.colorbar(cm.ScalarMappable(norm=norm, cmap=cmap), cax=ax, orientation='horizontal')
-        cb.set_label(property_name)
-        plt.show()
-        view.zoomTo()
-        view.show()
\ No newline at end of file
+        fig = colorbar(min_value, max_value, property_name, cmap=g, headless=export_to is not None or not display)
+        if export_to is not None:
+            # headless: files only, no display calls
+            data = {"property": property_name, "min": min_value, "max": max_value,
+                    "atoms": {self.labels[row]: value for row, value in zip(rows.tolist(), values[rows].tolist())}}
+            with self.metrics.span("export"):
+                written = export(export_to, view=view, fig=fig, data=data)
+            if not quiet:
+                for path in written:
+                    print(f"Written {path}")
+        elif display:
+            import matplotlib.pyplot as plt
+            plt.show()
+            view.zoomTo()
+            view.show()
+        return view if not display else None
@@ -0,0 +1,463 @@
+"""Byte offsets of the sections of an ORCA output, found in one pass over the file.
+
+    from orca_sections import section_index
+    index = section_index("job.out")
+    sop = index.first("sop")
+    for line in index.lines(sop):
+        ...
+
+NBO_SOP, NPA and Geometry.from_orca share the memoized index, so analysing one file reads it once to
+find the sections and after that only the byte ranges each parser needs.
+
+Outputs compressed with gzip, xz or zstandard (recognised by their magic bytes, whatever the file is
+called) and file-like objects are stream-decompressed instead, into a StreamIndex that keeps the bodies
+of the sections. With first=("sop",) the read stops once the first SOP table has ended, so nothing after
+it is decompressed.
+"""
+import gzip
+import io
+import lzma
+import mmap
+import os
+import re
+import weakref
+from collections import OrderedDict, namedtuple
+
+# kind of section -> marker line that opens it
+SECTION_MARKERS = {
+    "sop": b"SECOND ORDER PERTURBATION THEORY ANALYSIS OF FOCK MATRIX IN NBO BASIS",
+    "nbo_summary": b"NATURAL BOND ORBITALS (Summary):",
+    "npa": b"Summary of Natural Population Analysis:",
+    "geometry": b"CARTESIAN COORDINATES (ANGSTROEM)",
+}
+# markers that tag the sections after them: a new job step of a compound/multi-job run, the banner of each
+# NBO analysis (several can run in one job), and the alpha/beta halves of an open-shell NBO analysis
+JOB_MARKER = b"JOB NUMBER"
+ANALYSIS_MARKER = b"N A T U R A L   A T O M I C   O R B I T A L"
+SPIN_MARKER = b"spin orbitals"
+JOB_NUMBER = re.compile(rb"JOB NUMBER\s+(\d+)")
+# every marker the scan looks for, and the same as text for code that reads line by line
+MARKERS = list(SECTION_MARKERS.items()) + [("job", JOB_MARKER), ("analysis", ANALYSIS_MARKER), ("spin", SPIN_MARKER)]
+TEXT_MARKERS = [(kind, marker.decode()) for kind, marker in MARKERS]
+BLANK_LINE = re.compile(rb"^[ \t\r]*$", re.MULTILINE)
+
+# the file is searched this many bytes at a time, every marker is looked for while the chunk is in cache
+SCAN_CHUNK = 1024 * 1024
+READ_CHUNK = 4 * 1024 * 1024
+MEMO_SIZE = 32
+_memo = OrderedDict()
+# StreamIndex of the file-like objects given instead of a path, for as long as the object lives
+_stream_memo = weakref.WeakKeyDictionary()
+# leading bytes -> compression
+MAGIC = {b"\x1f\x8b": "gzip", b"\xfd7zXZ\x00": "xz", b"\x28\xb5\x2f\xfd": "zstd"}
+
+# marker: offset of the marker line; start/end: byte range of the lines after it, up to the next marker
+# line or the end of the file; step: ORCA job number (1 for single jobs); spin: "alpha", "beta" or None
+Section = namedtuple("Section", ["kind", "marker", "start", "end", "step", "spin"])
+
+
+class SectionIndex:
+    """Every SOP, NBO summary, NPA summary and ANGSTROEM coordinate block of one output, in file order"""
+
+    def __init__(self, path, sections, size, mtime_ns):
+        self.path = path
+        self.sections = sections
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def scan(cls, path):
+        st = os.stat(path)
+        hits = []
+        if st.st_size:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                hits = _find_markers(mm, len(mm))
+                hits = [(offset, kind, _line_at(mm, offset)) for offset, kind in hits]
+        sections = []
+        tags = _Tags()
+        for i, (offset, kind, (line_start, line_end, line)) in enumerate(hits):
+            tagged = tags.advance(kind, line)
+            if tagged is not None:
+                end = hits[i + 1][2][0] if i + 1 < len(hits) else st.st_size
+                sections.append(Section(kind, line_start, line_end, max(end, line_end), *tagged))
+        return cls(path, sections, st.st_size, st.st_mtime_ns)
+
+    def find(self, kind, step=None, spin=None):
+        """Sections of one kind, optionally only those of one job step and/or spin"""
+        return [s for s in self.sections if s.kind == kind and (step is None or s.step == step)
+                and (spin is None or s.spin == spin)]
+
+    def first(self, kind, **tags):
+        found = self.find(kind, **tags)
+        return found[0] if found else None
+
+    def last(self, kind, **tags):
+        found = self.find(kind, **tags)
+        return found[-1] if found else None
+
+    def covers(self, first=None, keep=None):
+        """Whether the index holds what a reader of the first sections of these kinds needs, always for files"""
+        return True
+
+    def lines(self, section):
+        """Lines of the section body as text, read lazily from its byte range only"""
+        with open(self.path, 'rb') as f:
+            yield from self._read_lines(f, section)
+
+    def iter_sections(self, sections):
+        """(section, its lines) for several sections in file order, all read through one open file.
+
+        Each section's lines are read when they are iterated, so go through them before the next section.
+        """
+        with open(self.path, 'rb') as f:
+            for section in sorted(sections, key=lambda s: s.start):
+                yield section, self._read_lines(f, section)
+
+    @staticmethod
+    def _read_lines(f, section):
+        f.seek(section.start)
+        remaining = section.end - section.start
+        carry = b""
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            chunk = carry + chunk
+            if remaining > 0:
+                # hold back the partial last line until the rest of it is read
+                cut = chunk.rfind(b"\n") + 1
+                chunk, carry = chunk[:cut], chunk[cut:]
+                if not chunk:
+                    continue
+            else:
+                carry = b""
+            # newline=None gives the same line endings as reading the file in text mode
+            yield from io.StringIO(chunk.decode(errors="replace"), newline=None)
+        if carry:
+            yield from io.StringIO(carry.decode(errors="replace"), newline=None)
+
+    def __repr__(self):
+        kinds = {}
+        for s in self.sections:
+            kinds[s.kind] = kinds.get(s.kind, 0) + 1
+        return f"{type(self).__name__}({self.path!r}, {kinds})"
+
+
+class StreamIndex(SectionIndex):
+    """SectionIndex of a compressed output or a file-like object, built while decompressing it once.
+
+    Only the bodies of the section kinds in kept are kept (bodies[section] is its bytes), a geometry body
+    only up to the blank line after its coordinates. complete is False when the read stopped early because
+    every kind in stop_after had a finished section.
+    """
+
+    def __init__(self, path, sections, bodies, stop_after, complete, size, mtime_ns, kept=()):
+        super().__init__(path, sections, size, mtime_ns)
+        self.bodies = bodies
+        self.stop_after = stop_after
+        self.complete = complete
+        self.kept = kept
+
+    @classmethod
+    def scan(cls, source, first=None, st=None, keep=None):
+        keep = _kept_kinds(first, keep)
+        stream = open_output(source)
+        sections, bodies, closed = [], {}, set()
+        tags = _Tags()
+        current = None  # [kind, marker, start, step, spin, pieces, done] of the open section, pieces None when not kept
+        offset = 0
+        carry = b""
+        complete = False
+
+        def append(piece):
+            # current[6] is set once a geometry body reached the blank line after its coordinates
+            if current[5] is None or current[6]:
+                return
+            current[5].append(piece)
+            if current[0] == "geometry":
+                body = b"".join(current[5])
+                block = _coordinates_block(body)
+                current[5], current[6] = [block], len(block) < len(body)
+
+        def close(end):
+            kind, marker, start, section_step, section_spin, pieces, _ = current
+            section = Section(kind, marker, start, end, section_step, section_spin)
+            sections.append(section)
+            if pieces is not None:
+                bodies[section] = b"".join(pieces)
+            closed.add(kind)
+
+        try:
+            while True:
+                chunk = stream.read(READ_CHUNK)
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                if chunk:
+                    # markers are found in whole lines only, the partial last line waits for the next chunk
+                    buffer = carry + chunk
+                    cut = buffer.rfind(b"\n") + 1
+                    buffer, carry = buffer[:cut], buffer[cut:]
+                else:
+                    buffer, carry = carry, b""
+                pos = 0
+                for hit, kind in _find_markers(buffer, len(buffer)):
+                    line_start, line_end, line = _line_at(buffer, hit)
+                    if line_start < pos:
+                        continue  # a second marker on a line already handled
+                    if current is not None:
+                        append(buffer[pos:line_start])
+                        close(offset + line_start)
+                        current = None
+                    tagged = tags.advance(kind, line)
+                    if tagged is not None:
+                        current = [kind, offset + line_start, offset + line_end, *tagged, [] if kind in keep else None, False]
+                    pos = line_end
+                if current is not None:
+                    append(buffer[pos:])
+                offset += len(buffer)
+                if not chunk:
+                    if current is not None:
+                        close(offset)
+                    complete = True
+                    break
+                if first is not None and all(kind in closed for kind in first):
+                    break
+        finally:
+            if stream is not source:
+                stream.close()
+        size, mtime_ns = (st.st_size, st.st_mtime_ns) if st is not None else (offset, None)
+        return cls(source if is_path(source) else None, sections, bodies, first, complete, size, mtime_ns, keep)
+
+    def covers(self, first=None, keep=None):
+        if not set(_kept_kinds(first, keep)) <= set(self.kept):
+            return False
+        return self.complete or (first is not None and all(any(s.kind == kind for s in self.sections) for kind in first))
+
+    def lines(self, section):
+        """Lines of the section body as text, decoded a chunk at a time from the kept bytes"""
+        body = memoryview(self.bodies[section])
+        carry = b""
+        for pos in range(0, len(body), READ_CHUNK):
+            chunk = carry + bytes(body[pos:pos + READ_CHUNK])
+            if pos + READ_CHUNK < len(body):
+                cut = chunk.rfind(b"\n") + 1
+                chunk, carry = chunk[:cut], chunk[cut:]
+                if not chunk:
+                    continue
+            else:
+                carry = b""
+            yield from io.StringIO(chunk.decode(errors="replace"), newline=None)
+        if carry:
+            yield from io.StringIO(carry.decode(errors="replace"), newline=None)
+
+    def iter_sections(self, sections):
+        """(section, its lines) for several sections in file order, from the kept bytes"""
+        for section in sorted(sections, key=lambda s: s.start):
+            yield section, self.lines(section)
+
+
+class _Prefixed:
+    # the bytes already read to look at the magic number, then the rest of the object
+    def __init__(self, head, rest):
+        self.head = head
+        self.rest = rest
+
+    def read(self, size=-1):
+        if self.head:
+            if size is None or size < 0:
+                data, self.head = self.head + _as_bytes(self.rest.read()), b""
+                return data
+            data, self.head = self.head[:size], self.head[size:]
+            return data
+        return _as_bytes(self.rest.read(size))
+
+    def close(self):
+        pass
+
+
+def _as_bytes(data):
+    return data.encode() if isinstance(data, str) else data
+
+
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+def compression_of(head):
+    """'gzip', 'xz', 'zstd' or None from the first bytes of a file"""
+    for magic, name in MAGIC.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def is_compressed(path):
+    with open(path, 'rb') as f:
+        return compression_of(f.read(6)) is not None
+
+
+def open_output(source):
+    """Binary stream of the text of an output: a path or a readable object, plain or gzip/xz/zstd compressed"""
+    if is_path(source):
+        raw = open(source, 'rb')
+        compression = compression_of(raw.peek(6)[:6])
+    else:
+        head = _as_bytes(source.read(6))
+        compression = compression_of(head)
+        raw = _Prefixed(head, source)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw) if not is_path(source) else gzip.open(_reopen(raw), 'rb')
+    if compression == "xz":
+        return lzma.LZMAFile(raw) if not is_path(source) else lzma.open(_reopen(raw), 'rb')
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading .zst outputs needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=is_path(source))
+    return raw
+
+
+def _reopen(raw):
+    # gzip/lzma open the path themselves and close it with the stream
+    raw.close()
+    return raw.name
+
+
+def _find_markers(mm, size):
+    """(offset, kind) of every marker, sorted by offset"""
+    overlap = max(len(marker) for _, marker in MARKERS) - 1
+    hits = []
+    for pos in range(0, size, SCAN_CHUNK):
+        # a match may run into the next chunk, it is kept only if it starts in this one
+        stop = min(size, pos + SCAN_CHUNK + overlap)
+        for kind, marker in MARKERS:
+            i = mm.find(marker, pos, stop)
+            while i != -1 and i < pos + SCAN_CHUNK:
+                hits.append((i, kind))
+                i = mm.find(marker, i + 1, stop)
+    hits.sort()
+    return hits
+
+
+class _Tags:
+    """Job step and spin of the sections, followed marker by marker through a scan"""
+
+    def __init__(self):
+        self.step, self.spin = 1, None
+        self.seen = set()  # section kinds met since the last spin marker
+
+    def advance(self, kind, line):
+        """Take one marker line, (step, spin) when it opens a section, None for the tagging markers"""
+        if kind == "job":
+            match = JOB_NUMBER.search(line)
+            self.step, self.spin = (int(match.group(1)) if match else self.step + 1), None
+        elif kind == "analysis":
+            self.spin = None
+        elif kind == "spin":
+            lowered = line.lower()
+            self.spin = "alpha" if b"alpha" in lowered else "beta" if b"beta" in lowered else self.spin
+        else:
+            # without the NBO banner (a trimmed output) a later analysis still starts with total density:
+            # coordinates are printed between analyses only, and a beta half holds each kind once
+            if kind == "geometry" or (self.spin == "beta" and kind in self.seen):
+                self.spin = None
+            self.seen.add(kind)
+            return self.step, self.spin
+        self.seen = set()
+        return None
+
+
+def line_marker(line):
+    """Kind of the marker in a line of text ('sop', 'npa', ..., 'job', 'analysis', 'spin'), None for ordinary lines.
+
+    A section read line by line ends where line_marker is not None, the same place the index ends it.
+    """
+    for kind, marker in TEXT_MARKERS:
+        if marker in line:
+            return kind
+    return None
+
+
+def _line_at(mm, offset):
+    """(start of the line holding offset, start of the line after it, the line's bytes)"""
+    start = mm.rfind(b"\n", 0, offset) + 1
+    end = mm.find(b"\n", offset)
+    end = len(mm) if end == -1 else end + 1
+    return start, end, mm[start:end]
+
+
+def section_index(path, first=None, keep=None):
+    """SectionIndex of path, memoized per unchanged file.
+
+    Compressed files and file-like objects give a StreamIndex; first (kinds such as ("sop",)) lets it stop
+    reading after the first section of each kind, None reads the whole output. keep names the kinds whose
+    bodies the caller reads from a StreamIndex, by default those in first, or every kind when first is None.
+    """
+    if not is_path(path):
+        return _object_index(path, first, keep)
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    index = _memo.get(key)
+    if index is None or not index.covers(first, keep):
+        if index is None and not is_compressed(path):
+            index = SectionIndex.scan(path)
+        else:
+            # a partial StreamIndex is read again far enough for both readers
+            index = StreamIndex.scan(path, _wanted(index, first), st, _kept_union(index, first, keep))
+        _memo[key] = index
+        if len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    else:
+        _memo.move_to_end(key)
+    return index
+
+
+def _wanted(index, first):
+    if first is None or index is None:
+        return first
+    return None if index.stop_after is None else tuple(dict.fromkeys(index.stop_after + tuple(first)))
+
+
+def _kept_kinds(first, keep):
+    # kinds whose bodies a reader needs: keep, else the kinds of first, else every kind it can read
+    if keep is not None:
+        return tuple(keep)
+    if first is not None:
+        return tuple(first)
+    return tuple(kind for kind in SECTION_MARKERS if kind != "nbo_summary")
+
+
+def _kept_union(index, first, keep):
+    if index is None:
+        return _kept_kinds(first, keep)
+    return tuple(dict.fromkeys(index.kept + _kept_kinds(first, keep)))
+
+
+def _coordinates_block(body):
+    # a geometry body up to (not including) its first blank line
+    match = BLANK_LINE.search(body)
+    return body if match is None else body[:match.start()]
+
+
+def _object_index(source, first, keep=None):
+    try:
+        index = _stream_memo.get(source)
+    except TypeError:
+        index = None  # not weakly referenceable, so not memoized
+    if index is not None and index.covers(first, keep):
+        return index
+    if index is not None:
+        # only a seekable object can be read a second time
+        if not (hasattr(source, "seekable") and source.seekable()):
+            raise ValueError("The sections needed are past what was read of this stream, pass a path or a seekable object")
+        source.seek(index.origin)
+    origin = source.tell() if hasattr(source, "seekable") and source.seekable() else None
+    index = StreamIndex.scan(source, _wanted(index, first), keep=_kept_union(index, first, keep))
+    index.origin = origin
+    try:
+        _stream_memo[source] = index
+    except TypeError:
+        pass
+    return index
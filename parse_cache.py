@@ -0,0 +1,132 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "nbo_vis")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# bytes hashed from the start, the middle and the end of the source, together with size and mtime
+HASH_SAMPLE = 1024 * 1024
+# prefix of the files entries are written to before they are moved into place, never read as entries
+TMP_PREFIX = ".tmp-"
+
+
+def content_hash(filepath, size=None):
+    """blake2b over sampled 1 MiB blocks of the file, cheap enough to check on every load of a 500 MB output"""
+    size = os.path.getsize(filepath) if size is None else size
+    h = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        if size <= 3 * HASH_SAMPLE:
+            h.update(f.read())
+        else:
+            for offset in (0, size // 2, size - HASH_SAMPLE):
+                f.seek(offset)
+                h.update(f.read(HASH_SAMPLE))
+    return h.hexdigest()
+
+
+class ParseCache:
+    """On-disk cache of parsed SOP/NPA tables, one .npz per (source file, kind).
+
+    An entry is only used while the source has the same path, size, mtime and content hash as when it
+    was stored. Once the directory grows past max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _entry_path(self, filepath, kind):
+        name = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()
+        return os.path.join(self.directory, f"{kind}-{name}.npz")
+
+    def _fingerprint(self, filepath):
+        st = os.stat(filepath)
+        return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64), content_hash(filepath, st.st_size)
+
+    def load(self, filepath, kind):
+        """Stored arrays for filepath, or None if there is no entry or the source has changed"""
+        entry = self._entry_path(filepath, kind)
+        if not os.path.exists(entry):
+            return None
+        stat, digest = self._fingerprint(filepath)
+        try:
+            with np.load(entry, allow_pickle=False) as data:
+                if (str(data["__source__"]) != os.path.abspath(filepath) or not np.array_equal(data["__stat__"], stat)
+                        or str(data["__hash__"]) != digest):
+                    return None
+                arrays = {name: data[name] for name in data.files if not name.startswith("__")}
+        except (OSError, ValueError, KeyError):
+            # unreadable or truncated entry, drop it and parse again
+            self._remove(entry)
+            return None
+        os.utime(entry)  # mark as recently used for eviction
+        return arrays
+
+    def store(self, filepath, kind, arrays):
+        entry = self._entry_path(filepath, kind)
+        stat, digest = self._fingerprint(filepath)
+        # a temporary file of its own per write, so concurrent writers (batch workers) never share one
+        fd, tmp = tempfile.mkstemp(prefix=TMP_PREFIX, suffix=".npz", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, __source__=np.array(os.path.abspath(filepath)), __stat__=stat, __hash__=np.array(digest), **arrays)
+            os.replace(tmp, entry)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def invalidate(self, filepath=None):
+        """Drop the entries of one source file, or every entry when filepath is None"""
+        if filepath is None:
+            for name in self._entries():
+                self._remove(os.path.join(self.directory, name))
+            return
+        name = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()
+        for entry in self._entries():
+            if entry.endswith(f"-{name}.npz"):
+                self._remove(os.path.join(self.directory, entry))
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name, st in self._stat_entries():
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(os.path.join(self.directory, name))
+            total -= size
+
+    def size(self):
+        return sum(st.st_size for _, st in self._stat_entries())
+
+    def _entries(self):
+        # names of the stored entries, other writers' temporary files left out
+        return [name for name in os.listdir(self.directory) if name.endswith(".npz") and not name.startswith(TMP_PREFIX)]
+
+    def _stat_entries(self):
+        # (name, stat) of every entry still there, another process may remove one after listdir
+        for name in self._entries():
+            try:
+                yield name, os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def resolve_cache(cache):
+    """cache argument of NBO_SOP/NPA: None/False for no cache, True for the default cache, or a ParseCache"""
+    if cache is True:
+        return ParseCache()
+    return cache or None
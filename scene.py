@@ -0,0 +1,258 @@
+"""Batched py3Dmol scene emission.
+
+Every view.addCylinder/view.addLabel call becomes its own line of JavaScript in the notebook output.
+The helpers here pack many primitives into one JavaScript statement that loops over compact arrays
+instead, cylinders grouped by (quantized) colour and radius so the per-cylinder payload is six numbers.
+export() writes a finished scene, its colour bar and the data behind it to files without displaying anything.
+"""
+import json
+
+import numpy as np
+
+# matplotlib and py3Dmol are imported inside the functions that render, so importing nbo/npa for parsing
+# or batch work stays cheap
+
+# coordinates are written with this many decimals, far below what is visible at any zoom
+PRECISION = 3
+
+
+def _append_js(view, js, start=True, update=True):
+    # the same two buffers py3Dmol's own method calls are appended to: startjs is replayed whenever the
+    # view is rendered, updatejs is run by view.update() in a viewer already on screen
+    if start:
+        view.startjs += js
+    if update:
+        view.updatejs += js
+
+
+def reset_start(view, base):
+    """Make base (an earlier view.startjs) the script a new render replays, dropping what was added since.
+
+    The viewer already on screen is not touched, for that the JavaScript still queued in updatejs is run.
+    """
+    view.startjs = base
+
+
+def _can_batch(view):
+    # a viewer grid has no single viewer_UNIQUEID to loop over
+    return not getattr(view, "viewergrid", None) and hasattr(view, "startjs")
+
+
+def _flat(points):
+    return np.round(np.asarray(points, dtype=np.float64).reshape(-1), PRECISION).tolist()
+
+
+def to_hex(rgba):
+    """(n, 4) RGBA floats -> '#rrggbb' strings, truncating like visualise_nbo_data always did"""
+    rgb = (np.asarray(rgba)[:, :3] * 255).astype(int)
+    return ['#%02x%02x%02x' % tuple(c) for c in rgb]
+
+
+def value_colors(values, vmin, vmax, cmap="rainbow", bins=None):
+    """Hex colours of values on cmap in one vectorized call.
+
+    With bins, values are quantized to that many equal steps between vmin and vmax first, so there are
+    at most bins distinct colours. Returns (hex colours, bin codes or None).
+    """
+    import matplotlib
+    values = np.asarray(values, dtype=np.float64)
+    # matplotlib's Normalize, which maps everything to 0 when vmin == vmax
+    scaled = np.zeros_like(values) if vmax == vmin else np.clip((values - vmin) / (vmax - vmin), 0, 1)
+    codes = None
+    if bins:
+        codes = np.minimum((scaled * bins).astype(int), bins - 1)
+        scaled = (codes + 0.5) / bins
+    return to_hex(matplotlib.colormaps[cmap](scaled)), codes
+
+
+def add_cylinders(view, starts, ends, colors, radii, opacity=0.8, frames=None):
+    """Add n cylinders with one JavaScript statement, grouped by (colour, radius).
+
+    frames gives each cylinder the animation frame it is shown in (see trajectory.py), None shows them in all.
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(starts),))
+    if not len(starts):
+        return view
+    if not _can_batch(view):
+        for i, (start, end, color, radius) in enumerate(zip(starts.tolist(), ends.tolist(), colors, radii.tolist())):
+            spec = {'start': dict(zip('xyz', start)), 'end': dict(zip('xyz', end)),
+                    'color': color, 'radius': radius, 'opacity': opacity}
+            if frames is not None:
+                spec['frame'] = int(frames[i])
+            view.addCylinder(spec)
+        return view
+    groups = {}
+    for i, key in enumerate(zip(colors, np.round(radii, 4).tolist())):
+        groups.setdefault(key, []).append(i)
+    payload = [{"c": color, "r": radius, "p": _flat(np.hstack([starts[rows], ends[rows]]))}
+               for (color, radius), rows in groups.items()]
+    if frames is not None:
+        frames = np.asarray(frames, dtype=np.int64)
+        for group, rows in zip(payload, groups.values()):
+            group["f"] = frames[rows].tolist()
+    _append_js(view, (
+        "\t(function(v){var g=%s;for(var k=0;k<g.length;k++){var s=g[k],p=s.p;"
+        "for(var i=0;i<p.length;i+=6){var c={start:{x:p[i],y:p[i+1],z:p[i+2]},"
+        "end:{x:p[i+3],y:p[i+4],z:p[i+5]},color:s.c,radius:s.r,opacity:%s};if(s.f)c.frame=s.f[i/6];"
+        "v.addCylinder(c);}}})(viewer_UNIQUEID);\n"
+    ) % (json.dumps(payload, separators=(',', ':')), json.dumps(opacity)))
+    return view
+
+
+def add_spheres(view, centers, colors, radii, opacity=1.0):
+    """Add n spheres with one JavaScript statement, grouped by (colour, radius) like add_cylinders"""
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(centers),))
+    if not len(centers):
+        return view
+    if not _can_batch(view):
+        for center, color, radius in zip(centers.tolist(), colors, radii.tolist()):
+            view.addSphere({'center': dict(zip('xyz', center)), 'radius': radius, 'color': color, 'opacity': opacity})
+        return view
+    groups = {}
+    for i, key in enumerate(zip(colors, np.round(radii, 4).tolist())):
+        groups.setdefault(key, []).append(i)
+    payload = [{"c": color, "r": radius, "p": _flat(centers[rows])} for (color, radius), rows in groups.items()]
+    _append_js(view, (
+        "\t(function(v){var g=%s;for(var k=0;k<g.length;k++){var s=g[k],p=s.p;"
+        "for(var i=0;i<p.length;i+=3){v.addSphere({center:{x:p[i],y:p[i+1],z:p[i+2]},"
+        "color:s.c,radius:s.r,opacity:%s});}}})(viewer_UNIQUEID);\n"
+    ) % (json.dumps(payload, separators=(',', ':')), json.dumps(opacity)))
+    return view
+
+
+def add_labels(view, texts, positions, colors, style, frames=None):
+    """Add n labels with one JavaScript statement, style holds the options shared by every label.
+
+    frames as in add_cylinders.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    texts = list(texts)
+    if not texts:
+        return view
+    if not _can_batch(view):
+        for i, (text, position, color) in enumerate(zip(texts, positions.tolist(), colors)):
+            spec = dict(style, position=dict(zip('xyz', position)), backgroundColor=color)
+            if frames is not None:
+                spec['frame'] = int(frames[i])
+            view.addLabel(text, spec)
+        return view
+    palette = sorted(set(colors))
+    codes = {color: i for i, color in enumerate(palette)}
+    frames = None if frames is None else np.asarray(frames, dtype=np.int64).tolist()
+    _append_js(view, (
+        "\t(function(v){var t=%s,p=%s,c=%s,q=%s,o=%s,f=%s;for(var i=0;i<t.length;i++){"
+        "var s=Object.assign({},o);s.position={x:p[3*i],y:p[3*i+1],z:p[3*i+2]};s.backgroundColor=q[c[i]];"
+        "if(f)s.frame=f[i];v.addLabel(t[i],s);}})(viewer_UNIQUEID);\n"
+    ) % tuple(json.dumps(x, separators=(',', ':')) for x in
+              (texts, _flat(positions), [codes[color] for color in colors], palette, style, frames)))
+    return view
+
+
+def add_keyed(view, keys, starts, ends, colors, radius, opacity=0.8, texts=None, label_style=None, start=True, update=True):
+    """Add n cylinders (and with texts, a label at each midpoint) the viewer keeps under keys[i],
+    so remove_keyed can take single ones out again. Needs a single viewer, as every call here batches.
+
+    start=False leaves them out of the script a new render replays, update=False out of the next view.update().
+    """
+    if not _can_batch(view):
+        raise ValueError("Keyed shapes need a single py3Dmol viewer, not a viewer grid")
+    keys = np.asarray(keys, dtype=np.int64).tolist()
+    if not keys:
+        return view
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+    palette = sorted(set(colors))
+    codes = {color: i for i, color in enumerate(palette)}
+    _append_js(view, (
+        "\t(function(v){var r=v.__keyed||(v.__keyed={}),k=%s,p=%s,c=%s,q=%s,t=%s,o=%s;for(var i=0;i<k.length;i++){"
+        "var j=6*i,a={x:p[j],y:p[j+1],z:p[j+2]},b={x:p[j+3],y:p[j+4],z:p[j+5]};"
+        "var e=[v.addCylinder({start:a,end:b,color:q[c[i]],radius:%s,opacity:%s})];"
+        "if(t){var s=Object.assign({},o);s.position={x:(a.x+b.x)/2,y:(a.y+b.y)/2,z:(a.z+b.z)/2};"
+        "s.backgroundColor=q[c[i]];e.push(v.addLabel(t[i],s));}r[k[i]]=e;}})(viewer_UNIQUEID);\n"
+    ) % (tuple(json.dumps(x, separators=(',', ':')) for x in
+               (keys, _flat(np.hstack([starts, ends])), [codes[color] for color in colors], palette,
+                None if texts is None else list(texts), label_style or {}))
+         + (json.dumps(radius), json.dumps(opacity))), start, update)
+    return view
+
+
+def remove_keyed(view, keys, start=True, update=True):
+    """Remove the cylinders and labels add_keyed drew under keys, start/update as in add_keyed"""
+    keys = np.asarray(keys, dtype=np.int64).tolist()
+    if not keys:
+        return view
+    if not _can_batch(view):
+        raise ValueError("Keyed shapes need a single py3Dmol viewer, not a viewer grid")
+    _append_js(view, (
+        "\t(function(v){var r=v.__keyed||{},k=%s;for(var i=0;i<k.length;i++){var e=r[k[i]];if(!e)continue;"
+        "v.removeShape(e[0]);if(e[1])v.removeLabel(e[1]);delete r[k[i]];}})(viewer_UNIQUEID);\n"
+    ) % json.dumps(keys, separators=(',', ':')), start, update)
+    return view
+
+
+def level_of_detail(values, pair_keys, max_items):
+    """Split rows into the max_items largest values and the rest, the rest summed per pair key.
+
+    Returns (kept rows sorted by value, descending; representative row of each aggregated pair;
+    summed value of each pair; number of rows in each pair).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(-values, kind="stable")
+    if max_items is None or len(order) <= max_items:
+        empty = np.empty(0, dtype=np.intp)
+        return order, empty, np.empty(0), empty
+    kept, rest = order[:max_items], order[max_items:]
+    keys, first, inverse, counts = np.unique(np.asarray(pair_keys)[rest], return_index=True, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse.reshape(-1), weights=values[rest], minlength=len(keys))
+    return kept, rest[first], sums, counts
+
+
+def new_view(width, height):
+    import py3Dmol
+    return py3Dmol.view(width=width, height=height)
+
+
+def colorbar(vmin, vmax, label, cmap="rainbow", ticks=False, headless=False):
+    """Horizontal colour bar figure; headless builds a bare Figure, so no pyplot state or GUI backend is touched"""
+    from matplotlib import cm, colors
+    if headless:
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(6, 1))
+        ax = fig.subplots()
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=(6, 1))
+    fig.subplots_adjust(bottom=0.5)
+    norm = colors.Normalize(vmin=vmin, vmax=vmax)
+    sm = cm.ScalarMappable(norm=norm, cmap=cmap)
+    sm.set_array([])  # Needed for the ScalarMappable
+    cb = fig.colorbar(sm, cax=ax, orientation='horizontal')
+    if ticks:
+        cb.set_ticks([vmin, (vmin+vmax)/2, vmax])
+        cb.set_ticklabels([f"{vmin:.2f}", f"{(vmin+vmax)/2:.2f}", f"{vmax:.2f}"])
+    cb.set_label(label)
+    return fig
+
+
+def export(prefix, view=None, fig=None, data=None):
+    """Write prefix.html (standalone scene), prefix_colorbar.png and prefix.json, whichever are given.
+
+    Nothing is displayed. Returns the paths written.
+    """
+    written = []
+    if view is not None:
+        view.zoomTo()
+        with open(prefix + ".html", "w") as f:
+            view.write_html(f)
+        written.append(prefix + ".html")
+    if fig is not None:
+        fig.savefig(prefix + "_colorbar.png", dpi=150, bbox_inches="tight")
+        written.append(prefix + "_colorbar.png")
+    if data is not None:
+        with open(prefix + ".json", "w") as f:
+            json.dump(data, f, indent=1)
+        written.append(prefix + ".json")
+    return written
@@ -0,0 +1,243 @@
+"""Compare the SOP interactions of two or more calculations.
+
+    diff = nbo_a.compare(nbo_b)                  # or SOPDiff.of(table_a, table_b)
+    diff.print_diff(top=20)
+    diff.appeared, diff.vanished, diff.changed   # SOPTables, changed holds the after rows
+    diff.visualise("b.xyz")                      # every type, ΔE(2) from blue (weaker) to red (stronger)
+
+    comparison = compare_tables([nbo.nbo_data for nbo in conformers], names=["c1", "c2", "c3"])
+    comparison.e2           # (interactions, calculations) E(2), NaN where an interaction is absent
+    comparison.diff(0, 2)
+
+Interactions are matched on a key that does not depend on the NBO numbering of a run: donor type,
+orbital number and atom set -> acceptor type, orbital number and atom set (atom labels without their
+spaces, a two-atom NBO in either order). The keys of every table are packed into one integer each and
+joined with a single sort, instead of comparing every interaction of one run with every one of the
+other. An interaction listed twice in one table (separate spin blocks) counts with its summed E(2).
+"""
+import numpy as np
+
+from interaction_geometry import InteractionGeometry
+from scene import add_cylinders, add_labels, colorbar, export, new_view, value_colors
+from sop_query import SOPQuery
+from sop_table import COLUMNS, SOPTable
+
+
+def _atom_keys(codes, remap):
+    # (n, 2) label codes -> shared codes + 1 (0 is padding), in ascending order per row
+    return np.sort(remap[codes] + 1, axis=1)
+
+
+def interaction_keys(tables):
+    """Per table, the key number of each of its rows, and the number of distinct keys over all tables"""
+    label_codes = {}
+    columns = []
+    for table in tables:
+        remap = np.array([label_codes.setdefault(label.replace(" ", ""), len(label_codes)) for label in table.atom_labels] + [-1], dtype=np.int64)
+        donor = _atom_keys(table.donor_atoms, remap)
+        acceptor = _atom_keys(table.acceptor_atoms, remap)
+        columns.append(np.column_stack([table.donor_type, table.donor_orb_no, donor, table.acceptor_type,
+                                        table.acceptor_orb_no, acceptor]).astype(np.int64))
+    stacked = np.concatenate(columns) if columns else np.empty((0, 8), dtype=np.int64)
+    dims = tuple(int(d) for d in stacked.max(axis=0) + 1) if len(stacked) else (1,) * 8
+    try:
+        packed = np.ravel_multi_index(stacked.T, dims)
+        keys, inverse = np.unique(packed, return_inverse=True)
+    except ValueError:
+        # more combinations than an int64 holds, join on the rows themselves
+        keys, inverse = np.unique(stacked, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    bounds = np.cumsum([0] + [len(table) for table in tables])
+    return [inverse[start:end] for start, end in zip(bounds[:-1], bounds[1:])], len(keys)
+
+
+def with_e2(table, e2):
+    """Copy of table with its E(2) column replaced"""
+    columns = {name: getattr(table, name) for name in COLUMNS}
+    columns["e2"] = e2
+    return SOPTable(columns, table.atom_labels)
+
+
+class SOPComparison:
+    """E(2) of every distinct interaction across several SOPTables.
+
+    e2[k, t] is the (summed) E(2) of interaction k in table t, NaN where it does not occur, and
+    row_of[k, t] the first row of table t holding it, -1 where it does not occur.
+    """
+
+    def __init__(self, tables, names=None):
+        self.tables = list(tables)
+        self.names = list(names) if names is not None else [str(i + 1) for i in range(len(self.tables))]
+        keys, n_keys = interaction_keys(self.tables)
+        self.e2 = np.full((n_keys, len(self.tables)), np.nan)
+        self.row_of = np.full((n_keys, len(self.tables)), -1, dtype=np.int64)
+        for t, (table, key) in enumerate(zip(self.tables, keys)):
+            present, first = np.unique(key, return_index=True)
+            self.e2[present, t] = np.bincount(key, weights=table.e2, minlength=n_keys)[present]
+            self.row_of[present, t] = first
+
+    @property
+    def present(self):
+        return self.row_of >= 0
+
+    def spread(self):
+        """Per interaction, largest minus smallest E(2) over the tables where it occurs"""
+        return np.nanmax(self.e2, axis=1) - np.nanmin(self.e2, axis=1) if len(self.e2) else np.empty(0)
+
+    def interactions(self):
+        """SOPTable with one row per interaction, taken from the first table holding it, E(2) as there"""
+        if not self.tables:
+            return SOPTable.empty()
+        first = np.argmax(self.present, axis=1)
+        parts, order = [], []
+        for t, table in enumerate(self.tables):
+            keys = np.flatnonzero(first == t)
+            parts.append(table.take(self.row_of[keys, t]))
+            order.append(keys)
+        return SOPTable.concat(parts).take(np.argsort(np.concatenate(order), kind="stable"))
+
+    def diff(self, before=0, after=1, tolerance=0.0):
+        """SOPDiff of two of the tables, by position or name"""
+        before = self.names.index(before) if isinstance(before, str) else before
+        after = self.names.index(after) if isinstance(after, str) else after
+        return SOPDiff(self, before, after, tolerance)
+
+    def print_summary(self, top=20):
+        """Interactions that change the most across the tables, E(2) per table ('-' where absent)"""
+        table = self.interactions()
+        spread = np.where(self.present.all(axis=1), self.spread(), np.nanmax(self.e2, axis=1))
+        order = np.argsort(-spread, kind="stable")[:top]
+        header = f"{'Donor':<22} {'Acceptor':<26}" + "".join(f" {name[:10]:>10}" for name in self.names) + f" {'Spread':>10}"
+        print(header)
+        print("=" * len(header))
+        for k in order.tolist():
+            entry = table[k]
+            values = "".join(f" {'-':>10}" if np.isnan(value) else f" {value:>10.2f}" for value in self.e2[k].tolist())
+            print(f"{entry['Donor Type'] + ' ' + '-'.join(entry['Donor Atoms']):<22} "
+                  f"{entry['Acceptor Type'] + ' ' + '-'.join(entry['Acceptor Atoms']):<26}{values} {spread[k]:>10.2f}")
+        print("=" * len(header))
+        print(f"{len(self.e2)} distinct interactions in {len(self.tables)} calculations, "
+              f"{int(self.present.all(axis=1).sum())} in all of them")
+
+
+class SOPDiff:
+    """Interactions that appeared, vanished or changed by more than tolerance from one table to another"""
+
+    def __init__(self, comparison, before=0, after=1, tolerance=0.0):
+        self.comparison = comparison
+        self.before = comparison.tables[before]
+        self.after = comparison.tables[after]
+        self.names = (comparison.names[before], comparison.names[after])
+        e2_before = comparison.e2[:, before]
+        e2_after = comparison.e2[:, after]
+        row_before = comparison.row_of[:, before]
+        row_after = comparison.row_of[:, after]
+        in_before, in_after = row_before >= 0, row_after >= 0
+
+        appeared = np.flatnonzero(in_after & ~in_before)
+        vanished = np.flatnonzero(in_before & ~in_after)
+        both = np.flatnonzero(in_before & in_after)
+        changed = both[np.abs(e2_after[both] - e2_before[both]) > tolerance]
+        # before/after E(2) of the changed interactions, after - before as delta
+        self.e2_before = e2_before[changed]
+        self.e2_after = e2_after[changed]
+        self.delta = self.e2_after - self.e2_before
+        self.appeared = with_e2(self.after.take(row_after[appeared]), e2_after[appeared])
+        self.vanished = with_e2(self.before.take(row_before[vanished]), e2_before[vanished])
+        self.changed = with_e2(self.after.take(row_after[changed]), e2_after[changed])
+        self.n_unchanged = len(both) - len(changed)
+
+    @classmethod
+    def of(cls, before, after, tolerance=0.0, names=("before", "after")):
+        """SOPDiff of two SOPTables"""
+        return cls(SOPComparison([before, after], names), 0, 1, tolerance)
+
+    def delta_table(self):
+        """One SOPTable of every difference with E(2) replaced by ΔE(2): after - before for changed rows,
+        +E(2) for appeared and -E(2) for vanished ones, largest |ΔE(2)| first"""
+        table = SOPTable.concat([
+            with_e2(self.changed, self.delta),
+            self.appeared,
+            with_e2(self.vanished, -self.vanished.e2),
+        ])
+        return table.take(np.argsort(-np.abs(table.e2), kind="stable"))
+
+    def print_diff(self, top=None):
+        """Table of the differences, largest |ΔE(2)| first"""
+        status = ["changed"] * len(self.changed) + ["appeared"] * len(self.appeared) + ["vanished"] * len(self.vanished)
+        before = np.concatenate([self.e2_before, np.full(len(self.appeared), np.nan), self.vanished.e2])
+        after = np.concatenate([self.e2_after, self.appeared.e2, np.full(len(self.vanished), np.nan)])
+        delta = np.concatenate([self.delta, self.appeared.e2, -self.vanished.e2])
+        rows = SOPTable.concat([self.changed, self.appeared, self.vanished])
+        order = np.argsort(-np.abs(delta), kind="stable")[:top]
+
+        def value(x):
+            return f"{'-':>10}" if np.isnan(x) else f"{x:>10.2f}"
+
+        header = (f"{'Status':<9} {'Donor Type':<10} {'Donor Atoms':<25} {'Acceptor Type':<13} {'Acceptor Atoms':<25} "
+                  f"{self.names[0][:10]:>10} {self.names[1][:10]:>10} {'ΔE(2)':>10}")
+        print(header)
+        print("=" * len(header))
+        for i in order.tolist():
+            entry = rows[i]
+            print(f"{status[i]:<9} {entry['Donor Type']:<10} {', '.join(entry['Donor Atoms']):<25} "
+                  f"{entry['Acceptor Type']:<13} {', '.join(entry['Acceptor Atoms']):<25} "
+                  f"{value(before[i])} {value(after[i])} {delta[i]:>10.2f}")
+        print("=" * len(header))
+        print(f"{len(self.changed)} changed, {len(self.appeared)} appeared, {len(self.vanished)} vanished, "
+              f"{self.n_unchanged} unchanged")
+
+    def visualise(self, xyz_file, view=None, display=True, donor=None, acceptor=None, donor_type=None, acceptor_type=None,
+                  E2_below=None, E2_above=None, label=True, label_min_e2=None, proportional_radius=False, cmap="coolwarm",
+                  color_bins=64, export_to=None):
+        """Cylinders of delta_table() on a diverging colour scale centred on ΔE(2) = 0.
+
+        Filters as in visualise_nbo_data, E2_above/E2_below apply to ΔE(2); every donor and acceptor type by
+        default. proportional_radius and label_min_e2 go by |ΔE(2)|.
+        """
+        selected = SOPQuery(donor, acceptor, donor_type, acceptor_type, E2_below, E2_above).select(self.delta_table())
+        interactions = InteractionGeometry(selected, xyz_file)
+        delta = selected.e2
+        magnitude = np.abs(delta)
+        # symmetric about 0, so white is no change whatever the range of the selection
+        limit = float(magnitude.max()) if len(delta) and magnitude.max() > 0 else 1.0
+        vmin, vmax = -limit, limit
+        if view is None:
+            view = new_view(1500, 1000)
+            view.addModel(interactions.geometry.xyz_block(), 'xyz')
+            view.setStyle({'stick': {'radius': 0.03}})
+            view.setBackgroundColor('white')
+        colors, codes = value_colors(delta, vmin, vmax, cmap=cmap, bins=color_bins)
+        shown = magnitude if codes is None else np.abs(vmin + (codes + 0.5) / color_bins * (vmax - vmin))
+        radii = 0.01 + (shown / limit) * 0.04 if proportional_radius else 0.05
+        add_cylinders(view, interactions.start, interactions.end, colors, radii, opacity=0.8)
+        if label:
+            labelled = np.arange(len(delta)) if label_min_e2 is None else np.flatnonzero(magnitude >= label_min_e2)
+            add_labels(view, [f"ΔE(2): {value:+.2f}" for value in delta[labelled].tolist()], interactions.midpoints[labelled],
+                       [colors[i] for i in labelled.tolist()],
+                       {'backgroundOpacity': 0.3, 'fontSize': 10, 'fontColor': 'black', 'fontWeight': 'bold'})
+
+        fig = colorbar(vmin, vmax, f'ΔE(2) kcal/mol, {self.names[0]} -> {self.names[1]}', cmap=cmap, ticks=True,
+                       headless=export_to is not None or not display)
+        connection_indexes = set(zip(interactions.start_atom.tolist(), interactions.end_atom.tolist()))
+        if export_to is not None:
+            data = {"vmin": vmin, "vmax": vmax, "interactions": [
+                dict(entry, **{"ΔE(2)": entry["E(2)"], "Int. Dist": distance})
+                for entry, distance in zip(selected, interactions.distances.tolist())]}
+            return export(export_to, view=view, fig=fig, data=data)
+        if display:
+            import matplotlib.pyplot as plt
+            view.zoomTo()
+            view.show()
+            plt.show()
+            return None
+        return connection_indexes
+
+    def __repr__(self):
+        return (f"SOPDiff({self.names[0]} -> {self.names[1]}: {len(self.changed)} changed, "
+                f"{len(self.appeared)} appeared, {len(self.vanished)} vanished)")
+
+
+def compare_tables(tables, names=None):
+    """SOPComparison of several SOPTables, e.g. [nbo.nbo_data for nbo in runs] or BatchResult.compare()"""
+    return SOPComparison(tables, names)
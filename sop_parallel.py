@@ -0,0 +1,106 @@
+"""Parse one very large SOP table on several cores.
+
+The byte range of the table (from the section index) is cut into line-aligned chunks, each chunk is
+parsed into an SOPTable in a worker process and the tables are joined back in file order, so the result
+is the same table the serial parser builds:
+
+    from sop_parallel import parse_sop_parallel
+    table = parse_sop_parallel("huge.out", workers=8)
+
+or NBO_SOP("huge.out", workers=8). On platforms that spawn rather than fork worker processes, call it
+from under an `if __name__ == "__main__":` guard.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from diagnostics import MAX_ERROR_SAMPLES
+from nbo import iter_nbo_data, parse_sop_line
+from orca_sections import StreamIndex, section_index
+from sop_table import SOPTable
+
+# chunks smaller than this are not worth a round trip to a worker
+MIN_CHUNK_BYTES = 4 * 1024 * 1024
+# chunks per worker, so a slow chunk at the end does not leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+
+def chunk_ranges(filepath, start, end, n_chunks):
+    """Split [start, end) into at most n_chunks ranges that each begin at the start of a line"""
+    size = end - start
+    bounds = [start]
+    with open(filepath, 'rb') as f:
+        for i in range(1, n_chunks):
+            f.seek(start + size * i // n_chunks)
+            f.readline()  # finish the line the cut falls into
+            bound = min(f.tell(), end)
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    if end > bounds[-1]:
+        bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_chunk(args):
+    # runs in the worker processes: the chunk as SOPTable arrays, the lines that did not parse in order
+    # (only the first few when quiet) and the counts of skipped and bad lines
+    filepath, start, end, quiet = args
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(errors="replace")
+    entries, errors = [], []
+    skipped = n_errors = 0
+    for line in io.StringIO(text, newline=None):
+        try:
+            entry = parse_sop_line(line)
+        except ValueError:
+            n_errors += 1
+            if not quiet or len(errors) < MAX_ERROR_SAMPLES:
+                errors.append(line.strip())
+            continue
+        if entry is None:
+            skipped += 1
+        else:
+            entries.append(entry)
+    return SOPTable.from_entries(entries).to_arrays(), errors, skipped, n_errors
+
+
+def parse_sop_parallel(filepath, workers=None, min_chunk_bytes=MIN_CHUNK_BYTES, metrics=None, quiet=False):
+    """SOPTable of the first SOP table of filepath, parsed in chunks across workers processes.
+
+    Gives the same table, prints the same parse errors in the same order (none when quiet) and adds the
+    same counts to metrics as NBO_SOP's serial parser. Falls back to parsing in this process when the
+    table fits in one chunk.
+    """
+    workers = workers or os.cpu_count() or 1
+    index = section_index(filepath, first=("sop",))
+    if isinstance(index, StreamIndex):
+        # compressed or file-like: there are no byte ranges to hand out, parse the kept section here
+        return SOPTable.from_entries(iter_nbo_data(filepath, metrics, quiet))
+    section = index.first("sop")
+    if section is None:
+        return _merge([], metrics, quiet)
+    n_chunks = min(workers * CHUNKS_PER_WORKER, max(1, (section.end - section.start) // min_chunk_bytes))
+    jobs = [(filepath, start, end, quiet) for start, end in chunk_ranges(filepath, section.start, section.end, n_chunks)]
+    if workers == 1 or len(jobs) == 1:
+        return _merge(map(_parse_chunk, jobs), metrics, quiet)
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        # map keeps the file order whatever order the chunks finish in
+        return _merge(pool.map(_parse_chunk, jobs), metrics, quiet)
+
+
+def _merge(results, metrics, quiet):
+    tables, samples = [], []
+    skipped = n_errors = 0
+    for arrays, errors, chunk_skipped, chunk_errors in results:
+        if not quiet:
+            for line in errors:
+                print(f"Parse error in line: {line}")
+        samples.extend(errors[:MAX_ERROR_SAMPLES - len(samples)])
+        skipped += chunk_skipped
+        n_errors += chunk_errors
+        tables.append(SOPTable.from_arrays(arrays))
+    table = SOPTable.concat(tables)
+    if metrics is not None:
+        metrics.add_counts("sop", len(table), skipped, n_errors, samples, quiet)
+    return table
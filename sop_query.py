@@ -0,0 +1,164 @@
+import weakref
+
+import numpy as np
+
+from sop_table import ACCEPTOR_TYPES, DONOR_TYPES
+
+
+def normalise_atom_filter(atoms):
+    """'C' -> ['C'], 'CN' -> ['C', 'N'], lists are kept as they are (same rules visualise_nbo_data always used)"""
+    if isinstance(atoms, str) and len(atoms) in [1, 2]:
+        atoms = list(atoms)
+    return atoms
+
+
+class SOPIndex:
+    """Lookup structures over one SOPTable, built once and shared by every query on it.
+
+    rows_by_type:  side -> type code -> sorted row numbers
+    rows_by_label: side -> label code -> sorted row numbers of interactions with that atom on that side
+    e2_order:      row numbers sorted by E(2), for range queries with searchsorted
+    """
+
+    _cache = weakref.WeakKeyDictionary()
+
+    def __init__(self, table):
+        self.table = table
+        self.rows_by_type = {
+            "donor": {code: np.flatnonzero(table.donor_type == code) for code in range(len(DONOR_TYPES))},
+            "acceptor": {code: np.flatnonzero(table.acceptor_type == code) for code in range(len(ACCEPTOR_TYPES))},
+        }
+        self.rows_by_label = {side: self._group_by_label(codes) for side, codes in
+                              (("donor", table.donor_atoms), ("acceptor", table.acceptor_atoms))}
+        self.e2_order = np.argsort(table.e2, kind="stable")
+        self.e2_sorted = table.e2[self.e2_order]
+
+    @classmethod
+    def of(cls, table):
+        index = cls._cache.get(table)
+        if index is None:
+            index = cls._cache[table] = cls(table)
+        return index
+
+    def _group_by_label(self, codes):
+        n_labels = len(self.table.atom_labels)
+        rows = np.repeat(np.arange(len(codes)), 2)
+        flat = codes.ravel()
+        keep = flat >= 0
+        rows, flat = rows[keep], flat[keep]
+        order = np.argsort(flat, kind="stable")
+        rows, flat = rows[order], flat[order]
+        bounds = np.searchsorted(flat, np.arange(n_labels + 1))
+        # a row holding the same label twice would show up twice, np.unique also keeps it sorted
+        return [np.unique(rows[bounds[i]:bounds[i + 1]]) for i in range(n_labels)]
+
+    def rows_with_type(self, side, orb_type):
+        types = DONOR_TYPES if side == "donor" else ACCEPTOR_TYPES
+        if orb_type not in types:
+            return np.empty(0, dtype=np.intp)
+        return self.rows_by_type[side][types.index(orb_type)]
+
+    def rows_with_labels(self, side, label_codes):
+        parts = [self.rows_by_label[side][code] for code in label_codes]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        if len(parts) == 1:
+            return parts[0]
+        # union through a mask rather than np.unique, which would sort again
+        mask = np.zeros(len(self.table), dtype=bool)
+        for part in parts:
+            mask[part] = True
+        return np.flatnonzero(mask)
+
+    def rows_with_element(self, side, element):
+        codes = [i for i, label_element in enumerate(self.table.label_element)
+                 if self.table.elements[label_element] == element]
+        return self.rows_with_labels(side, codes)
+
+    def rows_with_atom(self, side, atom_index):
+        """Rows where the 0-based atom_index is one of the donor (or acceptor) atoms"""
+        return self.rows_with_labels(side, np.flatnonzero(self.table.label_index == atom_index))
+
+    def rows_e2_between(self, above=None, below=None):
+        """Sorted rows with above <= E(2) <= below, either bound may be None"""
+        lo = 0 if above is None else np.searchsorted(self.e2_sorted, above, side="left")
+        hi = len(self.e2_sorted) if below is None else np.searchsorted(self.e2_sorted, below, side="right")
+        # only the rows in the window are touched, a narrow range stays cheap on a large table
+        return np.sort(self.e2_order[lo:hi])
+
+
+class SOPQuery:
+    """Donor/acceptor selection criteria, compiled once and evaluated against the indexes of an SOPTable.
+
+    The criteria are the ones visualise_nbo_data takes: donor/acceptor as 'C' (any atom whose label
+    contains C) or 'CN' (two-atom NBO, first C, second N), the orbital types, and the E(2) bounds.
+    Every criterion set to None is left out, donor_type=None and acceptor_type=None included: they match
+    any type (the legacy filters compared the type with None and so selected nothing). The type defaults
+    are visualise_nbo_data's, LP -> BD*.
+    """
+
+    def __init__(self, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None):
+        self.donor = normalise_atom_filter(donor)
+        self.acceptor = normalise_atom_filter(acceptor)
+        self.donor_type = donor_type
+        self.acceptor_type = acceptor_type
+        self.E2_below = E2_below
+        self.E2_above = E2_above
+
+    def key(self):
+        """Hashable form of the criteria, for memoizing results"""
+        atoms = lambda a: tuple(a) if a is not None else None  # noqa: E731
+        return (atoms(self.donor), atoms(self.acceptor), self.donor_type, self.acceptor_type, self.E2_below, self.E2_above)
+
+    def rows(self, table):
+        """Sorted row numbers of the table that match every criterion"""
+        index = SOPIndex.of(table)
+        candidates = []
+        if self.donor_type is not None:
+            candidates.append(index.rows_with_type("donor", self.donor_type))
+        if self.acceptor_type is not None:
+            candidates.append(index.rows_with_type("acceptor", self.acceptor_type))
+        if self.E2_below is not None or self.E2_above is not None:
+            candidates.append(index.rows_e2_between(self.E2_above, self.E2_below))
+        pairs = []
+        for side, atoms in (("donor", self.donor), ("acceptor", self.acceptor)):
+            if atoms is None:
+                continue
+            if len(atoms) == 1:
+                # substring match on the label, like `donor[0] in atom` did
+                codes = [i for i, label in enumerate(table.atom_labels) if atoms[0] in label]
+                candidates.append(index.rows_with_labels(side, codes))
+            elif len(atoms) == 2:
+                pairs.append((side, atoms))
+
+        if candidates:
+            candidates.sort(key=len)
+            rows = candidates[0]
+            keep = np.zeros(len(table), dtype=bool)
+            for other in candidates[1:]:
+                if not len(rows):
+                    break
+                keep[other] = True
+                rows = rows[keep[rows]]
+                keep[other] = False
+        else:
+            rows = np.arange(len(table))
+
+        # two-atom criteria check the element pair in order, only on the rows that are left
+        for side, atoms in pairs:
+            if not len(rows):
+                break
+            if atoms[0] not in table.elements or atoms[1] not in table.elements:
+                return np.empty(0, dtype=np.intp)
+            elements = table.atom_elements(side, rows)
+            wanted = (table.elements.index(atoms[0]), table.elements.index(atoms[1]))
+            rows = rows[(elements[:, 0] == wanted[0]) & (elements[:, 1] == wanted[1])]
+        return rows
+
+    def select(self, table):
+        """The matching interactions as a new SOPTable"""
+        return table.take(self.rows(table))
+
+    def __repr__(self):
+        return (f"SOPQuery(donor={self.donor!r}, acceptor={self.acceptor!r}, donor_type={self.donor_type!r}, "
+                f"acceptor_type={self.acceptor_type!r}, E2_below={self.E2_below!r}, E2_above={self.E2_above!r})")
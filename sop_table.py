@@ -0,0 +1,210 @@
+import re
+from array import array
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+# the orbital types SOP_PATTERN in nbo.py can produce, stored as int8 codes into these tuples
+DONOR_TYPES = ("LP", "BD")
+ACCEPTOR_TYPES = ("BD*", "RY", "LV")
+
+# name -> dtype of every column, the atom columns are (n, 2) codes into SOPTable.atom_labels padded with -1
+COLUMNS = {
+    "donor_index": np.int32,
+    "donor_type": np.int8,
+    "donor_orb_no": np.int32,
+    "donor_atoms": np.int32,
+    "acceptor_index": np.int32,
+    "acceptor_type": np.int8,
+    "acceptor_orb_no": np.int32,
+    "acceptor_atoms": np.int32,
+    "e2": np.float64,
+    "e_diff": np.float64,
+    "fock": np.float64,
+}
+
+
+def _label_element(label):
+    return ''.join(filter(str.isalpha, label))
+
+
+def _label_index(label):
+    # 0-based atom index, same convention as the xyz coordinates in visualise_nbo_data
+    return int(re.findall(r'\d+', label)[-1]) - 1
+
+
+class SOPTable(Sequence):
+    """Columnar store of the SOP interactions.
+
+    Numbers live in NumPy arrays, the orbital types are int8 codes into DONOR_TYPES/ACCEPTOR_TYPES and
+    the atom labels ('C   1') are interned once in atom_labels with per-row int32 codes. Indexing with an
+    int gives an SOPEntry, which behaves like the dictionaries nbo_data used to hold.
+    """
+
+    def __init__(self, columns, atom_labels):
+        self.atom_labels = tuple(atom_labels)
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.asarray(columns[name], dtype=dtype))
+        self.donor_atoms = self.donor_atoms.reshape(-1, 2)
+        self.acceptor_atoms = self.acceptor_atoms.reshape(-1, 2)
+
+        # per unique label: element code and 0-based atom index
+        self.elements = tuple(sorted({_label_element(label) for label in self.atom_labels}))
+        element_codes = {element: i for i, element in enumerate(self.elements)}
+        self.label_element = np.array([element_codes[_label_element(label)] for label in self.atom_labels], dtype=np.int16)
+        self.label_index = np.array([_label_index(label) for label in self.atom_labels], dtype=np.int32)
+
+    @classmethod
+    def empty(cls):
+        return cls({name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}, [])
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build the table from an iterable of interaction dictionaries, e.g. iter_nbo_data(filepath)"""
+        # array.array keeps the growing columns as packed C values rather than lists of Python objects
+        columns = {name: array(np.dtype(dtype).char, []) for name, dtype in COLUMNS.items()}
+        label_codes = {}
+        donor_types = {t: i for i, t in enumerate(DONOR_TYPES)}
+        acceptor_types = {t: i for i, t in enumerate(ACCEPTOR_TYPES)}
+
+        def atom_codes(atoms):
+            codes = [label_codes.setdefault(atom, len(label_codes)) for atom in atoms]
+            if len(codes) > 2:
+                raise ValueError(f"NBO with more than two atoms: {atoms}")
+            return codes + [-1] * (2 - len(codes))
+
+        for entry in entries:
+            columns["donor_index"].append(int(entry["Donor Index"]))
+            columns["donor_type"].append(donor_types[entry["Donor Type"]])
+            columns["donor_orb_no"].append(int(entry["Donor Orb No"]))
+            columns["donor_atoms"].extend(atom_codes(entry["Donor Atoms"]))
+            columns["acceptor_index"].append(int(entry["Acceptor Index"]))
+            columns["acceptor_type"].append(acceptor_types[entry["Acceptor Type"]])
+            columns["acceptor_orb_no"].append(int(entry["Acceptor Orb No"]))
+            columns["acceptor_atoms"].extend(atom_codes(entry["Acceptor Atoms"]))
+            columns["e2"].append(entry["E(2)"])
+            columns["e_diff"].append(entry["E Diff"])
+            columns["fock"].append(entry["Fock Elem"])
+        return cls(columns, label_codes)
+
+    @classmethod
+    def concat(cls, tables):
+        """Join several tables in order, remapping their atom label codes onto one shared list"""
+        tables = list(tables)
+        if not tables:
+            return cls.empty()
+        label_codes = {}
+        columns = {name: [] for name in COLUMNS}
+        for table in tables:
+            remap = np.array([label_codes.setdefault(label, len(label_codes)) for label in table.atom_labels] + [-1], dtype=np.int32)
+            for name in COLUMNS:
+                values = getattr(table, name)
+                # code -1 indexes the trailing -1 of remap, so padding stays padding
+                columns[name].append(remap[values] if name in ("donor_atoms", "acceptor_atoms") else values)
+        return cls({name: np.concatenate(parts) for name, parts in columns.items()}, label_codes)
+
+    # --- compact storage, used by the parse cache ---
+    def to_arrays(self, prefix=""):
+        arrays = {prefix + name: getattr(self, name) for name in COLUMNS}
+        arrays[prefix + "atom_labels"] = np.array(self.atom_labels, dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=""):
+        return cls({name: arrays[prefix + name] for name in COLUMNS}, [str(label) for label in arrays[prefix + "atom_labels"]])
+
+    # --- derived per-row arrays ---
+    def atom_index(self, side, rows=None):
+        """(n, 2) 0-based atom indexes of the donor or acceptor atoms, -1 where the NBO has one atom"""
+        codes = self.donor_atoms if side == "donor" else self.acceptor_atoms
+        if rows is not None:
+            codes = codes[rows]
+        return np.where(codes >= 0, self.label_index[codes], -1)
+
+    def atom_elements(self, side, rows=None):
+        """(n, 2) codes into self.elements of the donor or acceptor atoms, -1 where the NBO has one atom"""
+        codes = self.donor_atoms if side == "donor" else self.acceptor_atoms
+        if rows is not None:
+            codes = codes[rows]
+        return np.where(codes >= 0, self.label_element[codes], -1)
+
+    def n_atoms(self, side):
+        codes = self.donor_atoms if side == "donor" else self.acceptor_atoms
+        return (codes >= 0).sum(axis=1)
+
+    def take(self, rows):
+        """New table holding only the given rows (index array or boolean mask), in that order"""
+        return SOPTable({name: getattr(self, name)[rows] for name in COLUMNS}, self.atom_labels)
+
+    def to_dicts(self):
+        return [dict(entry) for entry in self]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    def __len__(self):
+        return len(self.e2)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice) or isinstance(i, np.ndarray):
+            return self.take(i)
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError("SOPTable index out of range")
+        return SOPEntry(self, i % n)
+
+    def __repr__(self):
+        return f"SOPTable({len(self)} interactions, {len(self.atom_labels)} atom labels)"
+
+
+class SOPEntry(Mapping):
+    """Read-only dictionary view of one row of an SOPTable, with the keys and value types nbo_data always had"""
+
+    KEYS = ("Donor Index", "Donor Type", "Donor Orb No", "Donor Atoms",
+            "Acceptor Index", "Acceptor Type", "Acceptor Orb No", "Acceptor Atoms",
+            "E(2)", "E Diff", "Fock Elem")
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def _atoms(self, codes):
+        return [self.table.atom_labels[code] for code in codes[self.row] if code >= 0]
+
+    def __getitem__(self, key):
+        t, i = self.table, self.row
+        if key == "Donor Index":
+            return str(t.donor_index[i])
+        if key == "Donor Type":
+            return DONOR_TYPES[t.donor_type[i]]
+        if key == "Donor Orb No":
+            return str(t.donor_orb_no[i])
+        if key == "Donor Atoms":
+            return self._atoms(t.donor_atoms)
+        if key == "Acceptor Index":
+            return str(t.acceptor_index[i])
+        if key == "Acceptor Type":
+            return ACCEPTOR_TYPES[t.acceptor_type[i]]
+        if key == "Acceptor Orb No":
+            return str(t.acceptor_orb_no[i])
+        if key == "Acceptor Atoms":
+            return self._atoms(t.acceptor_atoms)
+        if key == "E(2)":
+            return float(t.e2[i])
+        if key == "E Diff":
+            return float(t.e_diff[i])
+        if key == "Fock Elem":
+            return float(t.fock[i])
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -0,0 +1,144 @@
+"""Streaming export of SOP and NPA data to CSV, Parquet and Arrow.
+
+Rows are converted chunk_rows at a time straight from the NumPy columns, so the memory used on top of
+the table itself stays bounded however many interactions are written. Parquet and Arrow need pyarrow,
+which is only imported when one of them is written.
+
+    nbo.export_table("lp_bd.csv", donor="C")                          # same filters as visualise_nbo_data
+    nbo.export_table("all.parquet", donor_type=None, acceptor_type=None)
+    npa.export_table("charges.arrow")
+"""
+import csv
+import os
+
+import numpy as np
+
+from sop_table import ACCEPTOR_TYPES, DONOR_TYPES
+
+CHUNK_ROWS = 100_000
+# rows per page of the printed tables when a page is asked for
+PAGE_SIZE = 50
+# Parquet/Arrow column types, so every chunk has the same schema even where a chunk is all None
+SOP_TYPES = {"Donor Index": "int32", "Donor Type": "string", "Donor Orb No": "int32", "Donor Atoms": "string",
+             "Acceptor Index": "int32", "Acceptor Type": "string", "Acceptor Orb No": "int32",
+             "Acceptor Atoms": "string", "E(2)": "float64", "E Diff": "float64", "Fock Elem": "float64"}
+SOP_HEADER = tuple(SOP_TYPES)
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+
+def table_format(path, format=None):
+    """'csv', 'parquet' or 'arrow', from format or else the file extension"""
+    format = format or FORMATS.get(os.path.splitext(path)[1].lower())
+    if format not in ("csv", "parquet", "arrow"):
+        raise ValueError(f"Unknown table format for {path}, use .csv, .parquet or .arrow (or pass format=)")
+    return format
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Arrow export need pyarrow (pip install pyarrow), CSV works without it")
+    return pyarrow
+
+
+def _joined_atoms(table, codes):
+    # 'C   1-H   7' like batch.write_sop_csv always wrote, one-atom NBOs without the dash
+    labels = np.array(table.atom_labels + ("",), dtype=object)
+    first, second = labels[codes[:, 0]], labels[codes[:, 1]]
+    return [a if b == "" else f"{a}-{b}" for a, b in zip(first.tolist(), second.tolist())]
+
+
+def sop_chunks(table, chunk_rows=CHUNK_ROWS):
+    """Yield {column: list of values} for chunk_rows rows of the table at a time, columns as in SOP_HEADER"""
+    donor_types = np.array(DONOR_TYPES, dtype=object)
+    acceptor_types = np.array(ACCEPTOR_TYPES, dtype=object)
+    for start in range(0, len(table), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        yield {
+            "Donor Index": table.donor_index[rows].tolist(),
+            "Donor Type": donor_types[table.donor_type[rows]].tolist(),
+            "Donor Orb No": table.donor_orb_no[rows].tolist(),
+            "Donor Atoms": _joined_atoms(table, table.donor_atoms[rows]),
+            "Acceptor Index": table.acceptor_index[rows].tolist(),
+            "Acceptor Type": acceptor_types[table.acceptor_type[rows]].tolist(),
+            "Acceptor Orb No": table.acceptor_orb_no[rows].tolist(),
+            "Acceptor Atoms": _joined_atoms(table, table.acceptor_atoms[rows]),
+            "E(2)": table.e2[rows].tolist(),
+            "E Diff": table.e_diff[rows].tolist(),
+            "Fock Elem": table.fock[rows].tolist(),
+        }
+
+
+def npa_chunks(npa_data, fields, chunk_rows=CHUNK_ROWS):
+    """Yield {"Atom": labels, field: values, ...} for chunk_rows atoms of an NPA npa_data dict at a time"""
+    labels = list(npa_data)
+    for start in range(0, len(labels), chunk_rows):
+        part = labels[start:start + chunk_rows]
+        chunk = {"Atom": part}
+        for field in fields:
+            chunk[field] = [npa_data[label][field] for label in part]
+        yield chunk
+
+
+def write_chunks(chunks, types, path, format=None, extra=None):
+    """Write column chunks to path as CSV, Parquet or Arrow; returns the number of rows written.
+
+    types maps the column names, in order, to pyarrow type names. extra maps more (string) columns to a
+    callable (start row, n rows) -> values, they are put before the others.
+    """
+    header = list(types)
+    format = table_format(path, format)
+    extra = extra or {}
+    columns = list(extra) + list(header)
+    n = 0
+    if format == "csv":
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for chunk in chunks:
+                size = len(chunk[header[0]])
+                chunk.update({name: values(n, size) for name, values in extra.items()})
+                writer.writerows(zip(*(chunk[name] for name in columns)))
+                n += size
+        return n
+    pa = _pyarrow()
+    schema = pa.schema([(name, "string") for name in extra] + list(types.items()))
+    writer = None
+    try:
+        for chunk in chunks:
+            size = len(chunk[header[0]])
+            chunk.update({name: values(n, size) for name, values in extra.items()})
+            batch = pa.RecordBatch.from_pydict({name: chunk[name] for name in columns}, schema=schema)
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(path, schema) if format == "parquet" else pa.ipc.new_file(path, schema)
+            if format == "parquet":
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            n += size
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # nothing to write: an empty file with the columns
+        empty = schema.empty_table()
+        if format == "parquet":
+            pa.parquet.write_table(empty, path)
+        else:
+            with pa.ipc.new_file(path, schema) as f:
+                f.write_table(empty)
+    return n
+
+
+def write_sop_table(table, path, format=None, chunk_rows=CHUNK_ROWS, extra=None):
+    """Write an SOPTable, columns as SOP_HEADER"""
+    return write_chunks(sop_chunks(table, chunk_rows), SOP_TYPES, path, format, extra)
+
+
+def write_npa_table(npa_data, fields, path, format=None, chunk_rows=CHUNK_ROWS):
+    """Write an NPA npa_data dict, one row per atom"""
+    types = dict({"Atom": "string"}, **{field: "float64" for field in fields})
+    return write_chunks(npa_chunks(npa_data, fields, chunk_rows), types, path, format)
@@ -0,0 +1,217 @@
+"""Incremental parsing of an ORCA output that is still being written.
+
+    from tail import OutputTail
+    tail = OutputTail("running.out")
+    update = tail.poll()          # only the bytes appended since the last poll are read
+    update.sop, update.npa        # the new interactions (SOPTable) and NPA rows (dict)
+    tail.nbo_data, tail.npa_data  # everything so far, what NBO_SOP/NPA would give for the file as it is
+
+    tail.follow("geometry.xyz", interval=10)   # poll until the job ends, drawing new interactions in place
+"""
+import io
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from diagnostics import MAX_ERROR_SAMPLES, Metrics
+from geometry import load_geometry
+from interaction_geometry import InteractionGeometry
+from nbo import SOP_END, SOP_START, parse_sop_line
+from npa import NPA_START, npa_block_end, parse_npa_line
+from orca_sections import READ_CHUNK, line_marker
+from scene import add_cylinders, add_labels, new_view, value_colors
+from sop_query import SOPQuery
+from sop_table import SOPTable
+
+# lines ORCA ends a run with, follow() stops once one of them is read
+TERMINATION = (b"ORCA TERMINATED NORMALLY", b"ORCA finished by error termination", b"aborting the run")
+
+# what one poll() found: the new interactions as an SOPTable and the new NPA rows as {atom label: fields}
+TailUpdate = namedtuple("TailUpdate", ["sop", "npa"])
+
+
+class OutputTail:
+    """Remembers how far into the output it has read and where in the SOP/NPA tables it is.
+
+    Only complete lines are consumed, a line still being written is picked up by the next poll. Like
+    NBO_SOP and NPA, the first SOP table and the first NPA summary of the file are parsed, the sections
+    end at the same lines the section index ends them. A file that shrinks is parsed again from the start.
+    """
+
+    def __init__(self, filepath, metrics=None, quiet=False):
+        self.filepath = filepath
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.quiet = quiet
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.state = None       # None, "sop" or "npa": the table the next line belongs to
+        self.sop_done = False
+        self.npa_done = False
+        self.finished = False
+        self.npa_data = {}
+        self._sop_parts = []
+        self._nbo_data = SOPTable.empty()
+
+    @property
+    def nbo_data(self):
+        if self._sop_parts:
+            self._nbo_data = SOPTable.concat([self._nbo_data] + self._sop_parts)
+            self._sop_parts = []
+        return self._nbo_data
+
+    def poll(self):
+        """Parse whatever was appended since the last poll, returns a TailUpdate of the new rows"""
+        if os.path.getsize(self.filepath) < self.offset:
+            # truncated or replaced, e.g. the job was restarted
+            self.reset()
+        new_sop, new_npa = [], {}
+        # parsed, skipped, errors and error samples of this poll per section
+        self._counts = {"sop": [0, 0, 0, []], "npa": [0, 0, 0, []]}
+        start = time.perf_counter()
+        with open(self.filepath, 'rb') as f:
+            f.seek(self.offset)
+            carry = b""
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    break
+                chunk = carry + chunk
+                cut = chunk.rfind(b"\n") + 1
+                chunk, carry = chunk[:cut], chunk[cut:]
+                if chunk:
+                    self._feed(chunk, new_sop, new_npa)
+                    self.offset += len(chunk)
+        sop = SOPTable.from_entries(new_sop)
+        if len(sop):
+            self._sop_parts.append(sop)
+        self.metrics.add_span("parse", time.perf_counter() - start, "tail")
+        for section, (parsed, skipped, errors, samples) in self._counts.items():
+            if parsed or skipped or errors:
+                self.metrics.add_counts(section, parsed, skipped, errors, samples, self.quiet)
+        return TailUpdate(sop, new_npa)
+
+    def _error(self, section, line):
+        counts = self._counts[section]
+        counts[2] += 1
+        if len(counts[3]) < MAX_ERROR_SAMPLES:
+            counts[3].append(line.strip())
+        if not self.quiet:
+            print(f"Parse error in line: {line.strip()}")
+
+    def _feed(self, chunk, new_sop, new_npa):
+        if any(marker in chunk for marker in TERMINATION):
+            self.finished = True
+        if self.state is None:
+            # between the tables only the lines from the next start marker on are looked at
+            starts = [chunk.find(marker.encode()) for marker, done in ((SOP_START, self.sop_done), (NPA_START, self.npa_done)) if not done]
+            starts = [i for i in starts if i != -1]
+            if not starts:
+                return
+            chunk = chunk[chunk.rfind(b"\n", 0, min(starts)) + 1:]
+        for line in io.StringIO(chunk.decode(errors="replace"), newline=None):
+            self._feed_line(line, new_sop, new_npa)
+
+    def _feed_line(self, line, new_sop, new_npa):
+        if self.state is None:
+            if not self.sop_done and SOP_START in line:
+                self.state = "sop"
+            elif not self.npa_done and NPA_START in line:
+                self.state = "npa"
+            return
+        if self.state == "sop":
+            if SOP_END in line or line_marker(line) is not None:
+                self.state, self.sop_done = None, True
+                self._feed_line(line, new_sop, new_npa)
+                return
+            try:
+                entry = parse_sop_line(line)
+            except ValueError:
+                self._error("sop", line)
+                return
+            if entry is not None:
+                new_sop.append(entry)
+                self._counts["sop"][0] += 1
+            else:
+                self._counts["sop"][1] += 1
+            return
+        # NPA summary
+        if line_marker(line) is not None or (npa_block_end(line) and self.npa_data):
+            self.state, self.npa_done = None, True
+            self._feed_line(line, new_sop, new_npa)
+            return
+        if npa_block_end(line):
+            self._counts["npa"][1] += 1
+            return
+        try:
+            row = parse_npa_line(line)
+        except ValueError:
+            self._error("npa", line)
+            return
+        if row is not None:
+            atom_label, entry = row
+            self.npa_data[atom_label] = entry
+            new_npa[atom_label] = entry
+            self._counts["npa"][0] += 1
+        else:
+            self._counts["npa"][1] += 1
+
+    def follow(self, xyz_file=None, view=None, interval=5.0, timeout=None, on_update=None, e2_range=None, label=True,
+               donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None):
+        """Poll every interval seconds until the job terminates (or timeout seconds pass).
+
+        on_update(tail, update) is called for every poll that found new rows. With xyz_file (or an existing
+        view of the structure) the new interactions matching the filters are drawn as they appear and the
+        shown viewer is updated in place. e2_range fixes the colour scale; without it the scale follows the
+        E(2) range seen so far and the cylinders are redrawn when it grows.
+        """
+        query = SOPQuery(donor, acceptor, donor_type, acceptor_type, E2_below, E2_above)
+        if view is None and xyz_file is not None:
+            view = new_view(1500, 1000)
+            view.addModel(load_geometry(xyz_file).xyz_block(), 'xyz')
+            view.setStyle({'stick': {'radius': 0.03}})
+            view.setBackgroundColor('white')
+            view.zoomTo()
+            view.show()
+        drawn = SOPTable.empty()
+        geometry = None
+        scale = e2_range
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            update = self.poll()
+            if len(update.sop) or update.npa:
+                if on_update is not None:
+                    on_update(self, update)
+                selected = query.select(update.sop)
+                if view is not None and len(selected):
+                    e2 = np.concatenate([drawn.e2, selected.e2])
+                    grown = e2_range is None and (scale is None or e2.min() < scale[0] or e2.max() > scale[1])
+                    if grown:
+                        scale = (float(e2.min()), float(e2.max()))
+                        view.removeAllShapes()
+                        view.removeAllLabels()
+                    drawn = SOPTable.concat([drawn, selected])
+                    if geometry is None:
+                        # read once, by now the output holds its final geometry if xyz_file was not given
+                        geometry = load_geometry(xyz_file if xyz_file is not None else self.filepath)
+                    self._draw(view, drawn if grown else selected, geometry, scale, label)
+                    view.update()
+            if self.finished or (deadline is not None and time.monotonic() >= deadline):
+                return view
+            time.sleep(interval)
+
+    def _draw(self, view, table, geometry, scale, label):
+        # same look as visualise_nbo_data
+        interactions = InteractionGeometry(table, geometry)
+        colors, _ = value_colors(table.e2, scale[0], scale[1], bins=None)
+        add_cylinders(view, interactions.start, interactions.end, colors, 0.05, opacity=0.8)
+        if label:
+            add_labels(view, [f"E(2): {value:.2f}" for value in table.e2.tolist()], interactions.midpoints, colors, {
+                'backgroundOpacity': 0.3,
+                'fontSize': 10,
+                'fontColor': 'black',
+                'fontWeight': 'bold'
+            })
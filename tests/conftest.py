@@ -0,0 +1,45 @@
+"""Shared fixtures: small synthetic ORCA outputs from benchmarks/synthetic.py"""
+import os
+import sys
+
+import matplotlib
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+matplotlib.use("Agg")
+
+import orca_sections  # noqa: E402
+from sop_table import COLUMNS  # noqa: E402
+from synthetic import write_orca_output, write_xyz  # noqa: E402
+
+N_INTERACTIONS = 400
+N_ATOMS = 20
+
+
+def same_table(a, b):
+    """Equal SOPTables: same atom labels and every column equal"""
+    return a.atom_labels == b.atom_labels and all(np.array_equal(getattr(a, name), getattr(b, name)) for name in COLUMNS)
+
+
+@pytest.fixture(autouse=True)
+def forget_parsed_files():
+    # the section index and geometries are memoized per file, every test starts cold
+    import geometry
+    orca_sections._memo.clear()
+    geometry._memo.clear()
+    yield
+
+
+@pytest.fixture
+def sop_output(tmp_path):
+    """An output with the final geometry, an NPA summary and a SOP table of N_INTERACTIONS rows"""
+    return write_orca_output(str(tmp_path / "job.out"), N_INTERACTIONS, N_ATOMS, preamble_lines=50, seed=3,
+                             npa_rows=N_ATOMS, geometry=True)
+
+
+@pytest.fixture
+def xyz_file(tmp_path):
+    return write_xyz(str(tmp_path / "job.xyz"), N_ATOMS, seed=3)
@@ -0,0 +1,43 @@
+import pathlib
+
+import numpy as np
+
+from batch import analyse_outputs, find_outputs
+from conftest import same_table
+from nbo import NBO_SOP
+from npa import NPA
+from sop_table import SOPTable
+from synthetic import write_orca_output
+
+
+def write_outputs(directory, sizes):
+    directory.mkdir()
+    return [write_orca_output(str(directory / f"run_{i}.out"), n, 20, seed=i, npa_rows=20) for i, n in enumerate(sizes)]
+
+
+def test_find_outputs_takes_paths(tmp_path):
+    paths = write_outputs(tmp_path / "runs", [10, 20])
+    (tmp_path / "runs" / "notes.txt").write_text("not an output")
+    assert find_outputs(tmp_path / "runs") == paths
+    assert find_outputs(str(tmp_path / "runs")) == paths
+    assert find_outputs([pathlib.Path(paths[1]), str(tmp_path / "runs" / "*.out")]) == paths
+
+
+def test_batch_equals_one_by_one(tmp_path):
+    paths = write_outputs(tmp_path / "runs", [30, 50, 40])
+    with open(tmp_path / "runs" / "empty.out", "w") as f:
+        f.write("no NBO analysis in this one\n")
+    result = analyse_outputs(tmp_path / "runs", max_workers=2, quiet=True)
+    assert not result.failures and len(result.sop[str(tmp_path / "runs" / "empty.out")]) == 0
+    for path in paths:
+        assert same_table(result.sop[path], NBO_SOP(path, quiet=True).nbo_data)
+        assert result.npa[path] == NPA(path, quiet=True).npa_data
+
+
+def test_sop_table_rows_point_at_their_file(tmp_path):
+    paths = write_outputs(tmp_path / "runs", [30, 50, 40])
+    result = analyse_outputs(paths, max_workers=2, quiet=True)
+    table, file_of_row = result.sop_table()
+    assert np.bincount(file_of_row).tolist() == [30, 50, 40]
+    assert same_table(table, SOPTable.concat(result.sop[path] for path in paths))
+    assert [result.files[i] for i in file_of_row[[0, 30, 80]].tolist()] == paths
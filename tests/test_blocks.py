@@ -0,0 +1,62 @@
+import gzip
+import shutil
+
+import pytest
+
+from blocks import OutputBlocks
+from conftest import same_table
+from nbo import NBO_SOP
+from npa import parse_npa_lines
+from synthetic import geometry_lines, npa_lines, sop_lines, write_open_shell_output
+
+
+@pytest.fixture
+def multi_job(tmp_path):
+    """Job 1 with two optimisation cycles' SOP tables, job 2 with geometry, NPA and alpha/beta SOP tables"""
+    path = str(tmp_path / "multi.out")
+    with open(path, "w") as f:
+        f.writelines(sop_lines(30, 10, seed=1))
+        f.writelines(sop_lines(40, 10, seed=2))
+        f.write("\n                 $$$$$$$$$$$$$$$$  JOB NUMBER  2 $$$$$$$$$$$$$$\n\n")
+        f.writelines(geometry_lines(10, seed=3))
+        f.writelines(npa_lines(10, seed=3))
+        f.write("\n ***** Alpha spin orbitals *****\n\n")
+        f.writelines(sop_lines(50, 10, seed=4))
+        f.write("\n ***** Beta spin orbitals *****\n\n")
+        f.writelines(sop_lines(60, 10, seed=5))
+    return path
+
+
+def test_multi_job_tags(multi_job):
+    blocks = OutputBlocks(multi_job, quiet=True)
+    assert blocks.tags("sop") == [(1, None), (2, "alpha"), (2, "beta")]
+    assert blocks.tags("npa") == [(2, None)]
+    assert [len(block.data) for block in blocks.select("sop")] == [30, 40, 50, 60]
+    assert len(blocks.sop(step=1, occurrence=-1)) == 40
+    assert len(blocks.sop(step=2, occurrence=None)) == 110
+    with pytest.raises(ValueError):
+        blocks.sop(step=3)
+
+
+def test_first_block_matches_nbo_sop(multi_job):
+    blocks = OutputBlocks(multi_job, quiet=True)
+    assert same_table(blocks.sop(), NBO_SOP(multi_job, quiet=True).nbo_data)
+    npa_data = parse_npa_lines(npa_lines(10, seed=3), quiet=True)[0]
+    assert blocks.npa(step=2).npa_data == npa_data
+
+
+@pytest.mark.parametrize("banner", [True, False])
+def test_open_shell_analyses_reset_spin(tmp_path, banner):
+    path = write_open_shell_output(str(tmp_path / "open.out"), n_analyses=3, n_interactions=20, n_atoms=10, banner=banner)
+    blocks = OutputBlocks(path, quiet=True)
+    assert [block.spin for block in blocks.select("npa")] == [None, "alpha", "beta"] * 3
+    assert [block.spin for block in blocks.select("sop")] == ["alpha", "beta"] * 3
+    assert [block.occurrence for block in blocks.select("npa") if block.spin is None] == [0, 1, 2]
+
+
+def test_compressed_blocks_match_plain(multi_job):
+    with open(multi_job, "rb") as f, gzip.open(multi_job + ".gz", "wb") as g:
+        shutil.copyfileobj(f, g)
+    plain, packed = OutputBlocks(multi_job, quiet=True), OutputBlocks(multi_job + ".gz", quiet=True)
+    assert [(b.kind, b.step, b.spin) for b in plain.blocks] == [(b.kind, b.step, b.spin) for b in packed.blocks]
+    assert all(same_table(a.data, b.data) for a, b in zip(plain.select("sop"), packed.select("sop")))
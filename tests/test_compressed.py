@@ -0,0 +1,54 @@
+import gzip
+import io
+import lzma
+
+import numpy as np
+import pytest
+
+from conftest import same_table
+from geometry import load_geometry
+from nbo import NBO_SOP
+from npa import NPA
+
+
+def compress(path, method):
+    with open(path, "rb") as f:
+        data = f.read()
+    if method == "gzip":
+        packed, suffix = gzip.compress(data), ".gz"
+    elif method == "xz":
+        packed, suffix = lzma.compress(data), ".xz"
+    else:
+        zstandard = pytest.importorskip("zstandard")
+        packed, suffix = zstandard.ZstdCompressor().compress(data), ".zst"
+    with open(path + suffix, "wb") as f:
+        f.write(packed)
+    return path + suffix
+
+
+@pytest.mark.parametrize("method", ["gzip", "xz", "zstd"])
+def test_compressed_output_parses_like_plain(sop_output, method):
+    packed = compress(sop_output, method)
+    assert same_table(NBO_SOP(sop_output, quiet=True).nbo_data, NBO_SOP(packed, quiet=True).nbo_data)
+    assert NPA(packed, quiet=True).npa_data == NPA(sop_output, quiet=True).npa_data
+    plain, unpacked = load_geometry(sop_output), load_geometry(packed)
+    assert len(plain) == 20 and np.array_equal(plain.coordinates, unpacked.coordinates)
+
+
+def test_file_objects_parse_like_plain(sop_output):
+    plain = NBO_SOP(sop_output, quiet=True).nbo_data
+    with open(sop_output, "rb") as f:
+        assert same_table(plain, NBO_SOP(f, quiet=True).nbo_data)
+    with open(sop_output) as f:
+        assert same_table(plain, NBO_SOP(io.StringIO(f.read()), quiet=True).nbo_data)
+    with open(compress(sop_output, "gzip"), "rb") as f:
+        assert same_table(plain, NBO_SOP(io.BytesIO(f.read()), quiet=True).nbo_data)
+
+
+def test_npa_then_sop_from_one_stream(sop_output):
+    # the NPA summary comes first, the SOP table after it is still read from the same object
+    with open(sop_output, "rb") as f:
+        data = f.read()
+    stream = io.BytesIO(data)
+    assert NPA(stream, quiet=True).npa_data == NPA(sop_output, quiet=True).npa_data
+    assert same_table(NBO_SOP(stream, quiet=True).nbo_data, NBO_SOP(sop_output, quiet=True).nbo_data)
@@ -0,0 +1,29 @@
+from conftest import N_INTERACTIONS
+from diagnostics import Metrics
+from nbo import NBO_SOP
+from npa import NPA
+
+
+def test_metrics_given_to_nbo_sop_time_the_visualiser(sop_output, xyz_file):
+    # the usage the module docstring shows: metrics go to the constructor only
+    events = []
+    metrics = Metrics(callback=events.append)
+    nbo = NBO_SOP(sop_output, metrics=metrics, quiet=True)
+    nbo.visualise_nbo_data(xyz_file, display=False)
+    assert {"read", "parse", "filter", "geometry", "render"} <= set(metrics.spans)
+    assert metrics.counters["sop"]["parsed"] == N_INTERACTIONS and metrics.counters["sop"]["errors"] == 0
+    assert {event["type"] for event in events} == {"span", "counts"}
+
+
+def test_quiet_counts_bad_lines_without_printing(sop_output, capsys):
+    with open(sop_output) as f:
+        text = f.read()
+    marker = " within unit  1\n"
+    with open(sop_output, "w") as f:
+        f.write(text.replace(marker, marker + "  17. LP (   1) garbled line 1.0\n", 1))
+    metrics = Metrics()
+    NBO_SOP(sop_output, metrics=metrics, quiet=True)
+    NPA(sop_output, metrics=metrics, quiet=True)
+    assert capsys.readouterr().out == ""
+    assert metrics.counters["sop"]["errors"] == 1
+    assert metrics.error_samples["sop"] == ["17. LP (   1) garbled line 1.0"]
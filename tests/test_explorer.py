@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from explorer import NBOExplorer
+from nbo import NBO_SOP
+from sop_query import SOPQuery
+
+UPDATES = [
+    dict(E2_above=5.0),
+    dict(donor_type=None, acceptor_type=None),
+    dict(donor="C", E2_above=None, E2_below=20.0),
+    dict(donor=None, E2_below=None, acceptor_type="RY"),
+    dict(donor_type="LP", acceptor_type="BD*"),
+]
+
+
+@pytest.fixture
+def explorer(sop_output, xyz_file):
+    return NBOExplorer(NBO_SOP(sop_output, quiet=True), xyz_file)
+
+
+def test_selection_matches_query(explorer):
+    filters = dict(explorer.filters)
+    for update in UPDATES:
+        filters.update(update)
+        assert explorer.selection(**update).tolist() == SOPQuery(**filters).rows(explorer.table).tolist()
+        explorer.update(**update)
+
+
+def test_updates_draw_the_difference(explorer):
+    explorer.build_view()
+    shown = explorer.shown
+    for update in UPDATES:
+        added, removed = explorer.update(**update)
+        assert np.array_equal(np.sort(np.concatenate([np.setdiff1d(shown, removed), added])), explorer.shown)
+        shown = explorer.shown
+
+
+def test_replay_script_does_not_grow(explorer):
+    explorer.shown = explorer.selection()  # as show() starts
+    view = explorer.build_view()
+    first = view.startjs
+    for _ in range(10):
+        for update in UPDATES:
+            explorer.update(**update)
+    # back to the starting filters: a new render replays the same script as the first one
+    assert view.startjs == first
+    assert view.updatejs
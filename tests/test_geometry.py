@@ -0,0 +1,44 @@
+import gzip
+import pathlib
+import shutil
+
+import numpy as np
+import pytest
+
+from geometry import load_geometry
+from nbo import NBO_SOP
+from synthetic import coordinates
+
+
+def test_xyz_is_told_by_content_not_name(xyz_file, tmp_path):
+    renamed = tmp_path / "structure.coords"
+    shutil.copy(xyz_file, renamed)
+    expected = np.array([xyz for _, *xyz in coordinates(20, seed=3)])
+    for source in (xyz_file, pathlib.Path(xyz_file), renamed, str(renamed)):
+        geometry = load_geometry(source)
+        assert len(geometry) == 20
+        assert np.allclose(geometry.coordinates, expected, atol=1e-6)
+
+
+def test_compressed_xyz(xyz_file):
+    with open(xyz_file, "rb") as f, gzip.open(xyz_file + ".gz", "wb") as g:
+        shutil.copyfileobj(f, g)
+    assert np.array_equal(load_geometry(xyz_file + ".gz").coordinates, load_geometry(xyz_file).coordinates)
+
+
+def test_orca_output_gives_final_geometry(sop_output, xyz_file):
+    geometry = load_geometry(pathlib.Path(sop_output))
+    assert list(geometry.elements) == list(load_geometry(xyz_file).elements)
+    assert np.allclose(geometry.coordinates, load_geometry(xyz_file).coordinates, atol=1e-6)
+
+
+def test_output_without_coordinates(tmp_path):
+    path = tmp_path / "empty.out"
+    path.write_text("no coordinates here\n")
+    with pytest.raises(ValueError):
+        load_geometry(path)
+
+
+def test_visualisers_take_path_objects(sop_output, xyz_file):
+    connections = NBO_SOP(sop_output, quiet=True).visualise_nbo_data(pathlib.Path(xyz_file), display=False, quiet=True)
+    assert connections
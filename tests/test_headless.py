@@ -0,0 +1,34 @@
+import json
+
+import matplotlib.pyplot as plt
+import py3Dmol
+
+from conftest import N_INTERACTIONS
+from nbo import NBO_SOP
+from npa import NPA
+from scene import colorbar
+
+
+def test_no_pyplot_figure_when_nothing_is_displayed(sop_output, xyz_file):
+    plt.close("all")
+    NBO_SOP(sop_output, quiet=True).visualise_nbo_data(xyz_file, display=False, quiet=True)
+    NPA(sop_output, quiet=True).visualise_property(xyz_file, display=False, quiet=True)
+    assert plt.get_fignums() == []
+
+
+def test_export_writes_scene_colour_bar_and_data(sop_output, xyz_file, tmp_path):
+    prefix = str(tmp_path / "scene")
+    view = py3Dmol.view(width=10, height=10)
+    NBO_SOP(sop_output, quiet=True).visualise_nbo_data(xyz_file, view=view, export_to=prefix, quiet=True,
+                                                      donor_type=None, acceptor_type=None)
+    with open(prefix + ".json") as f:
+        data = json.load(f)
+    assert len(data["interactions"]) == N_INTERACTIONS
+    assert (tmp_path / "scene.html").stat().st_size > 0 and (tmp_path / "scene_colorbar.png").stat().st_size > 0
+    assert plt.get_fignums() == []
+
+
+def test_headless_colorbar_is_a_bare_figure():
+    plt.close("all")
+    fig = colorbar(0, 10, "E(2)", headless=True)
+    assert fig.axes and plt.get_fignums() == []
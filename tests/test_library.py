@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from geometry import load_geometry
+from library import NBOLibrary
+from nbo import NBO_SOP
+from npa import NPA
+from synthetic import write_orca_output
+
+FILTERS = [
+    dict(),
+    dict(donor_type=None, acceptor_type=None, E2_above=10.0),
+    dict(donor="C", acceptor_type=None),
+    dict(donor="CN", donor_type="BD", acceptor_type=None),
+    dict(donor_type=None, acceptor_type="RY", E2_below=15.0),
+]
+
+
+def entries(table):
+    # stored tables intern their atom labels in their own order, the rows read the same
+    return [dict(entry) for entry in table]
+
+
+@pytest.fixture
+def outputs(tmp_path):
+    directory = tmp_path / "outputs"
+    directory.mkdir()
+    # conf[1].out: a name that would be a glob pattern
+    return [write_orca_output(str(directory / name), 200, 20, seed=seed, npa_rows=20, geometry=True)
+            for seed, name in enumerate(["a.out", "b.out", "conf[1].out"])]
+
+
+@pytest.fixture
+def library(tmp_path, outputs):
+    with NBOLibrary(str(tmp_path / "library.db")) as library:
+        result = library.ingest(os.path.dirname(outputs[0]), max_workers=2)
+        assert sorted(result.added) == sorted(outputs) and not result.failures
+        yield library
+
+
+def test_round_trip(library, outputs):
+    for path in outputs:
+        assert entries(library.nbo(path).nbo_data) == entries(NBO_SOP(path, quiet=True).nbo_data)
+        assert library.npa(path).npa_data == NPA(path, quiet=True).npa_data
+        stored, parsed = library.geometry(path), load_geometry(path)
+        assert list(stored.elements) == list(parsed.elements)
+        assert np.array_equal(stored.coordinates, parsed.coordinates)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_query_matches_direct_parse(library, outputs, filters):
+    found = library.query_sop(**filters)
+    for path in outputs:
+        expected = entries(NBO_SOP(path, quiet=True).query(**filters))
+        assert (entries(found[path].nbo_data) if path in found else []) == expected
+
+
+def test_reingest_skips_unchanged_and_updates_changed(library, outputs):
+    result = library.ingest(os.path.dirname(outputs[0]))
+    assert result.unchanged == len(outputs) and not result.added and not result.updated
+    write_orca_output(outputs[1], 120, 20, seed=9, npa_rows=20, geometry=True)
+    result = library.ingest(os.path.dirname(outputs[0]))
+    assert result.updated == [outputs[1]]
+    assert len(library.nbo(outputs[1]).nbo_data) == len(NBO_SOP(outputs[1], quiet=True).nbo_data)
+
+
+def test_prune_forgets_deleted_outputs(library, outputs):
+    os.remove(outputs[0])
+    library.prune()
+    assert outputs[0] not in library.files() and len(library) == len(outputs) - 1
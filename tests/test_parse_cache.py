@@ -0,0 +1,57 @@
+import os
+import threading
+
+import numpy as np
+
+from conftest import same_table
+from nbo import NBO_SOP
+from npa import NPA
+from parse_cache import TMP_PREFIX, ParseCache
+
+
+def test_cached_parse_equals_plain_parse(sop_output, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    plain = NBO_SOP(sop_output, quiet=True).nbo_data
+    first = NBO_SOP(sop_output, cache=cache, quiet=True)
+    assert cache.load(sop_output, "sop") is not None
+    second = NBO_SOP(sop_output, cache=cache, quiet=True)
+    assert same_table(plain, first.nbo_data) and same_table(plain, second.nbo_data)
+    assert NPA(sop_output, cache=cache, quiet=True).npa_data == NPA(sop_output, quiet=True).npa_data
+
+
+def test_changed_file_is_parsed_again(sop_output, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    NBO_SOP(sop_output, cache=cache, quiet=True)
+    with open(sop_output, "a") as f:
+        f.write(" appended after the parse\n")
+    assert cache.load(sop_output, "sop") is None
+
+
+def test_concurrent_stores_leave_no_temporary_files(sop_output, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), max_bytes=1)
+    arrays = NBO_SOP(sop_output, quiet=True).nbo_data.to_arrays()
+    errors = []
+
+    def store():
+        try:
+            for _ in range(20):
+                cache.store(sop_output, "sop", arrays)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=store) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert not [name for name in os.listdir(cache.directory) if name.startswith(TMP_PREFIX)]
+
+
+def test_evict_ignores_temporary_files(sop_output, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), max_bytes=1)
+    other = os.path.join(cache.directory, TMP_PREFIX + "writer.npz")
+    np.savez(other, x=np.zeros(1000))
+    cache.store(sop_output, "sop", NBO_SOP(sop_output, quiet=True).nbo_data.to_arrays())
+    assert os.path.exists(other)
+    assert cache.size() == 0
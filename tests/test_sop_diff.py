@@ -0,0 +1,88 @@
+import json
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+import sop_diff
+from nbo import NBO_SOP
+from sop_diff import SOPDiff, compare_tables, with_e2
+from sop_table import SOPTable
+from synthetic import write_orca_output
+
+
+def summed_by_key(table):
+    """Interaction key -> summed E(2), the matching rule SOPComparison documents, done with a dict"""
+    def atoms(labels):
+        return tuple(sorted(label.replace(" ", "") for label in labels))
+
+    sums = defaultdict(float)
+    for entry in table:
+        key = (entry["Donor Type"], entry["Donor Orb No"], atoms(entry["Donor Atoms"]),
+               entry["Acceptor Type"], entry["Acceptor Orb No"], atoms(entry["Acceptor Atoms"]))
+        sums[key] += entry["E(2)"]
+    return sums
+
+
+@pytest.fixture
+def before_after(sop_output, tmp_path):
+    before = NBO_SOP(sop_output, quiet=True).nbo_data
+    # drop the last 50 rows, change every third E(2) and add the rows of another run
+    kept = before.take(np.arange(len(before) - 50))
+    e2 = kept.e2.copy()
+    e2[::3] *= 1.5
+    other = NBO_SOP(write_orca_output(str(tmp_path / "other.out"), 30, 20, seed=11), quiet=True).nbo_data
+    return before, SOPTable.concat([with_e2(kept, e2), other])
+
+
+def test_diff_matches_keyed_sums(before_after):
+    before, after = before_after
+    diff = SOPDiff.of(before, after)
+    old, new = summed_by_key(before), summed_by_key(after)
+    assert len(diff.appeared) == len(new.keys() - old.keys())
+    assert len(diff.vanished) == len(old.keys() - new.keys())
+    changed = {key for key in old.keys() & new.keys() if abs(new[key] - old[key]) > 0}
+    assert len(diff.changed) == len(changed)
+    assert diff.n_unchanged == len(old.keys() & new.keys()) - len(changed)
+    assert sorted(np.round(diff.delta, 6)) == sorted(round(new[key] - old[key], 6) for key in changed)
+
+
+def test_identical_tables_have_no_difference(sop_output):
+    table = NBO_SOP(sop_output, quiet=True).nbo_data
+    diff = SOPDiff.of(table, table)
+    assert len(diff.appeared) == len(diff.vanished) == len(diff.changed) == 0
+    assert len(diff.delta_table()) == 0
+
+
+def test_delta_table_signs(before_after):
+    before, after = before_after
+    diff = SOPDiff.of(before, after)
+    delta = diff.delta_table()
+    assert len(delta) == len(diff.changed) + len(diff.appeared) + len(diff.vanished)
+    assert np.all(np.diff(np.abs(delta.e2)) <= 0)
+    assert np.all(diff.vanished.e2 > 0) and (delta.e2 < 0).sum() >= len(diff.vanished)
+
+
+def test_comparison_of_no_tables_is_empty():
+    comparison = compare_tables([])
+    assert len(comparison.interactions()) == 0
+
+
+def test_visualise_scale_is_symmetric_and_radii_positive(before_after, xyz_file, tmp_path, monkeypatch):
+    before, after = before_after
+    diff = SOPDiff.of(before, after)
+    drawn = {}
+    add_cylinders = sop_diff.add_cylinders
+
+    def spy(view, starts, ends, colors, radii, **options):
+        drawn["radii"] = np.broadcast_to(radii, (len(starts),))
+        return add_cylinders(view, starts, ends, colors, radii, **options)
+
+    monkeypatch.setattr(sop_diff, "add_cylinders", spy)
+    diff.visualise(xyz_file, proportional_radius=True, export_to=str(tmp_path / "diff"))
+    with open(tmp_path / "diff.json") as f:
+        data = json.load(f)
+    assert data["vmin"] == -data["vmax"] == -np.abs(diff.delta_table().e2).max()
+    # every type is drawn by default, negative deltas included
+    assert len(data["interactions"]) == len(diff.delta_table())
+    assert drawn["radii"].min() >= 0.01
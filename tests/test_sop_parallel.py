@@ -0,0 +1,22 @@
+from conftest import same_table
+from diagnostics import Metrics
+from nbo import NBO_SOP
+from sop_parallel import parse_sop_parallel
+from synthetic import write_orca_output
+
+
+def test_parallel_parse_equals_serial(tmp_path):
+    path = write_orca_output(str(tmp_path / "big.out"), 5000, 30, preamble_lines=100, seed=7)
+    serial = NBO_SOP(path, quiet=True).nbo_data
+    # chunks small enough that every worker gets several
+    table = parse_sop_parallel(path, workers=2, min_chunk_bytes=20_000, quiet=True)
+    assert same_table(serial, table)
+    assert same_table(serial, NBO_SOP(path, workers=2, quiet=True).nbo_data)
+
+
+def test_parallel_counts_match_serial(tmp_path):
+    path = write_orca_output(str(tmp_path / "big.out"), 3000, 30, seed=8)
+    serial, parallel = Metrics(), Metrics()
+    NBO_SOP(path, metrics=serial, quiet=True)
+    parse_sop_parallel(path, workers=2, min_chunk_bytes=20_000, metrics=parallel, quiet=True)
+    assert serial.counters["sop"] == parallel.counters["sop"]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from nbo import NBO_SOP
+from sop_query import SOPIndex, SOPQuery
+
+
+def legacy_select(entries, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None):
+    """The filter loop of the original visualise_nbo_data, None types meaning any type"""
+    def atoms_match(wanted, atoms):
+        if wanted is None:
+            return True
+        wanted = list(wanted) if isinstance(wanted, str) and len(wanted) in [1, 2] else wanted
+        if len(wanted) == 1:
+            return any(wanted[0] in atom for atom in atoms)
+        return len(atoms) == 2 and all(w == ''.join(filter(str.isalpha, atom)) for w, atom in zip(wanted, atoms))
+
+    selected = []
+    for i, entry in enumerate(entries):
+        if donor_type is not None and entry["Donor Type"] != donor_type:
+            continue
+        if acceptor_type is not None and entry["Acceptor Type"] != acceptor_type:
+            continue
+        if not atoms_match(donor, entry["Donor Atoms"]) or not atoms_match(acceptor, entry["Acceptor Atoms"]):
+            continue
+        if E2_below is not None and entry["E(2)"] > E2_below:
+            continue
+        if E2_above is not None and entry["E(2)"] < E2_above:
+            continue
+        selected.append(i)
+    return selected
+
+
+FILTERS = [
+    dict(),
+    dict(donor_type="BD", acceptor_type="RY"),
+    dict(donor_type=None, acceptor_type=None),
+    dict(donor_type=None, acceptor_type="BD*", E2_above=10.0),
+    dict(donor="C", acceptor_type=None),
+    dict(donor="CN", donor_type="BD", acceptor_type=None),
+    dict(acceptor="HO", donor_type=None, acceptor_type="BD*"),
+    dict(donor_type=None, acceptor_type=None, E2_above=5.0, E2_below=20.0),
+    dict(donor_type=None, acceptor_type=None, E2_above=100.0),
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_query_matches_legacy_filters(sop_output, filters):
+    nbo = NBO_SOP(sop_output, quiet=True)
+    entries = list(nbo.nbo_data)
+    rows = SOPQuery(**filters).rows(nbo.nbo_data)
+    assert rows.tolist() == legacy_select(entries, **filters)
+    assert len(nbo.query(**filters)) == len(rows)
+
+
+def test_none_type_is_any_type(sop_output):
+    table = NBO_SOP(sop_output, quiet=True).nbo_data
+    assert len(SOPQuery(donor_type=None, acceptor_type=None).rows(table)) == len(table)
+
+
+def test_e2_window_is_inclusive_and_sorted(sop_output):
+    table = NBO_SOP(sop_output, quiet=True).nbo_data
+    index = SOPIndex.of(table)
+    low, high = np.sort(table.e2)[[10, 200]]
+    rows = index.rows_e2_between(low, high)
+    assert rows.tolist() == np.flatnonzero((table.e2 >= low) & (table.e2 <= high)).tolist()
+    assert len(index.rows_e2_between()) == len(table)
+    assert len(index.rows_e2_between(1e9)) == 0
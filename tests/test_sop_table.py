@@ -0,0 +1,33 @@
+import numpy as np
+
+from conftest import same_table
+from nbo import NBO_SOP, iter_nbo_data
+from sop_table import SOPTable
+
+
+def test_rows_read_like_the_parsed_dicts(sop_output):
+    table = NBO_SOP(sop_output, quiet=True).nbo_data
+    assert table.to_dicts() == list(iter_nbo_data(sop_output, quiet=True))
+    assert table[-1]["E(2)"] == float(table.e2[-1])
+
+
+def test_arrays_round_trip(sop_output):
+    table = NBO_SOP(sop_output, quiet=True).nbo_data
+    assert same_table(SOPTable.from_arrays(table.to_arrays()), table)
+
+
+def test_take_and_concat(sop_output):
+    table = NBO_SOP(sop_output, quiet=True).nbo_data
+    rows = np.arange(len(table))
+    head, tail = table.take(rows[:150]), table.take(rows[150:])
+    joined = SOPTable.concat([head, tail])
+    assert joined.to_dicts() == table.to_dicts()
+    assert len(SOPTable.concat([])) == 0 and table[rows[::-1]].to_dicts() == table.to_dicts()[::-1]
+
+
+def test_atom_index_is_zero_based_label_number(sop_output):
+    table = NBO_SOP(sop_output, quiet=True).nbo_data
+    index = table.atom_index("donor")
+    for i, entry in enumerate(table):
+        numbers = [int(label.split()[-1]) - 1 for label in entry["Donor Atoms"]]
+        assert index[i].tolist() == numbers + [-1] * (2 - len(numbers))
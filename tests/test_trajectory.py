@@ -0,0 +1,54 @@
+import json
+import pathlib
+
+import numpy as np
+
+from nbo import NBO_SOP
+from sop_query import SOPQuery
+from synthetic import write_orca_output, write_xyz
+from trajectory import OutputSeries, Trajectory, XYZTrajectory
+
+
+def write_series(directory, n_frames):
+    directory.mkdir()
+    return [write_orca_output(str(directory / f"frame_{i:02d}.out"), 40 + 10 * i, 20, seed=i, geometry=True)
+            for i in range(n_frames)]
+
+
+def test_output_series_from_path_glob(tmp_path):
+    paths = write_series(tmp_path / "irc", 3)
+    trajectory = Trajectory(OutputSeries(pathlib.Path(tmp_path / "irc") / "*.out"))
+    assert len(trajectory) == 3
+    assert [len(trajectory.table(i)) for i in range(3)] == [len(NBO_SOP(path, quiet=True).nbo_data) for path in paths]
+
+
+def test_path_sources_per_frame(tmp_path):
+    paths = write_series(tmp_path / "irc", 2)
+    trajectory = Trajectory([pathlib.Path(path) for path in paths], sop=[pathlib.Path(path) for path in paths])
+    query = SOPQuery(donor_type=None, acceptor_type=None)
+    for i, path in enumerate(paths):
+        geometry, starts, ends, e2 = trajectory.frame_data(i, query)
+        assert len(e2) == len(NBO_SOP(path, quiet=True).nbo_data) == len(starts)
+
+
+def test_xyz_trajectory_frames(tmp_path):
+    frames = [write_xyz(str(tmp_path / f"f{i}.xyz"), 20, seed=3, box=4.0 + i) for i in range(4)]
+    path = tmp_path / "md.xyz"
+    with open(path, "w") as out:
+        for frame in frames:
+            with open(frame) as f:
+                out.write(f.read() + "\n")
+    xyz = XYZTrajectory(str(path))
+    assert len(xyz) == 4
+    assert np.allclose(xyz.frame(-1).coordinates * 4.0 / 7.0, xyz.frame(0).coordinates, atol=1e-5)
+
+
+def test_visualise_exports_every_shown_frame(tmp_path):
+    paths = write_series(tmp_path / "irc", 4)
+    trajectory = Trajectory(OutputSeries(paths))
+    prefix = str(tmp_path / "traj")
+    trajectory.visualise(donor_type=None, acceptor_type=None, stride=2, export_to=prefix)
+    with open(prefix + ".json") as f:
+        data = json.load(f)
+    assert data["frames"] == [0, 2]
+    assert data["interactions_per_frame"] == [len(NBO_SOP(paths[i], quiet=True).nbo_data) for i in (0, 2)]
@@ -0,0 +1,207 @@
+"""NBO interactions along a trajectory (IRC path, MD snapshots) animated in one py3Dmol view.
+
+    traj = Trajectory(XYZTrajectory("irc.xyz"), sop=[f"irc_{i}.out" for i in range(40)])
+    traj = Trajectory(OutputSeries("irc/*.out"))          # geometry and SOP table from each output
+    traj = Trajectory(XYZTrajectory("md.xyz"), sop=nbo)    # one set of interactions on every frame
+    traj.visualise(donor_type=None, acceptor_type="BD*", E2_above=1.0, stride=10)
+
+Frames are read only when they are drawn: an XYZTrajectory keeps just the byte offset of every frame and
+a few parsed frames, the SOP tables are parsed one frame at a time and dropped again, so frames that are
+not shown (stride) cost nothing. All shown frames go into one view with addModelsAsFrames, which takes
+them as one XYZ text: memory grows with the number of shown frames x atoms (that text, held by the view)
+plus the cylinders they draw (endpoints and E(2)), not with the size of the SOP tables. Every cylinder
+and label carries the frame it belongs to and one colour scale spans the whole trajectory.
+"""
+import glob
+import os
+import time
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from diagnostics import Metrics
+from geometry import Geometry, load_geometry
+from interaction_geometry import InteractionGeometry
+from nbo import NBO_SOP
+from scene import add_cylinders, add_labels, colorbar, export, new_view, value_colors
+from sop_query import SOPQuery
+from sop_table import SOPTable
+
+# parsed frames an XYZTrajectory keeps around
+FRAME_MEMO = 8
+
+
+class XYZTrajectory:
+    """Multi-frame .xyz file, indexed in one pass, frames parsed on access"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array('q')
+        with open(path, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.strip():
+                    if not line:
+                        break
+                    continue  # blank lines between frames
+                n_atoms = int(line)
+                for _ in range(n_atoms + 1):
+                    f.readline()
+                self.offsets.append(offset)
+            self.offsets.append(f.tell())
+        self._memo = OrderedDict()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def block(self, i):
+        """XYZ text of frame i"""
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[i])
+            return f.read(self.offsets[i + 1] - self.offsets[i]).decode().strip("\n") + "\n"
+
+    def frame(self, i):
+        """Geometry of frame i (0-based)"""
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"frame {i} out of range, {self.path} has {len(self)} frames")
+        i %= len(self)
+        geometry = self._memo.get(i)
+        if geometry is None:
+            text = self.block(i)
+            lines = text.splitlines()
+            n_atoms = int(lines[0])
+            elements, coordinates = [], []
+            for line in lines[2:2 + n_atoms]:
+                parts = line.split()
+                elements.append(parts[0])
+                coordinates.append((float(parts[1]), float(parts[2]), float(parts[3])))
+            geometry = self._memo[i] = Geometry(elements, coordinates, lines[1] if len(lines) > 1 else "", xyz=text)
+            if len(self._memo) > FRAME_MEMO:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(i)
+        return geometry
+
+    def __repr__(self):
+        return f"XYZTrajectory({len(self)} frames, path={self.path!r})"
+
+
+class OutputSeries:
+    """ORCA outputs as frames: a list of paths or a glob, sorted; each frame is the final geometry of one output"""
+
+    def __init__(self, paths):
+        self.paths = sorted(glob.glob(os.fspath(paths))) if isinstance(paths, (str, os.PathLike)) else list(paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def frame(self, i):
+        return load_geometry(self.paths[i])
+
+    def __repr__(self):
+        return f"OutputSeries({len(self)} outputs)"
+
+
+class Trajectory:
+    """Frames (XYZTrajectory, OutputSeries or a list of Geometries/paths) and the SOP interactions of each.
+
+    sop is one NBO_SOP or SOPTable drawn on every frame, or one per frame: NBO_SOP, SOPTable or the path of
+    an output to parse. With an OutputSeries and no sop, each output's own SOP table is used.
+    """
+
+    def __init__(self, frames, sop=None, cache=None, metrics=None):
+        self.frames = frames
+        self.cache = cache
+        self.metrics = metrics if metrics is not None else Metrics()
+        if sop is None and isinstance(frames, OutputSeries):
+            sop = frames.paths
+        if sop is None:
+            raise ValueError("No SOP data: pass sop=, or frames as an OutputSeries")
+        self.sop = sop
+        if not isinstance(sop, (NBO_SOP, SOPTable)) and len(sop) != len(frames):
+            raise ValueError(f"{len(sop)} SOP sources for {len(frames)} frames")
+
+    def __len__(self):
+        return len(self.frames)
+
+    def geometry(self, i):
+        frames = self.frames
+        return frames.frame(i) if hasattr(frames, "frame") else load_geometry(frames[i])
+
+    def table(self, i):
+        """SOPTable of frame i, parsed now if it comes from a file"""
+        source = self.sop if isinstance(self.sop, (NBO_SOP, SOPTable)) else self.sop[i]
+        if isinstance(source, (str, os.PathLike)):
+            source = NBO_SOP(source, cache=self.cache, metrics=self.metrics, quiet=True)
+        return source.nbo_data if isinstance(source, NBO_SOP) else source
+
+    def frame_data(self, i, query, max_cylinders=None):
+        """(geometry, cylinder starts, ends, E(2)) of frame i, the max_cylinders largest E(2) when given"""
+        geometry = self.geometry(i)
+        selected = query.select(self.table(i))
+        if max_cylinders is not None and len(selected) > max_cylinders:
+            selected = selected.take(np.sort(np.argsort(-selected.e2, kind="stable")[:max_cylinders]))
+        interactions = InteractionGeometry(selected, geometry)
+        return geometry, interactions.start.astype(np.float32), interactions.end.astype(np.float32), selected.e2.copy()
+
+    def visualise(self, view=None, display=True, donor=None, acceptor=None, donor_type="LP", acceptor_type="BD*", E2_below=None, E2_above=None,
+                  stride=1, interval=200, label=True, label_min_e2=None, max_cylinders=None, proportional_radius=False, color_bins=64,
+                  width=1500, height=1000, export_to=None):
+        """Animate every stride-th frame with its interactions, filters as in visualise_nbo_data"""
+        query = SOPQuery(donor, acceptor, donor_type, acceptor_type, E2_below, E2_above)
+        shown = range(0, len(self), stride)
+        blocks, starts, ends, e2, frame_of = [], [], [], [], []
+        start = time.perf_counter()
+        for frame, i in enumerate(shown):
+            geometry, frame_starts, frame_ends, frame_e2 = self.frame_data(i, query, max_cylinders)
+            blocks.append(geometry.xyz_block())
+            starts.append(frame_starts)
+            ends.append(frame_ends)
+            e2.append(frame_e2)
+            frame_of.append(np.full(len(frame_e2), frame, dtype=np.int32))
+        self.metrics.add_span("parse", time.perf_counter() - start, "trajectory frames")
+
+        start = time.perf_counter()
+        starts = np.concatenate(starts) if starts else np.empty((0, 3))
+        ends = np.concatenate(ends) if ends else np.empty((0, 3))
+        e2 = np.concatenate(e2) if e2 else np.empty(0)
+        frame_of = np.concatenate(frame_of) if frame_of else np.empty(0, dtype=np.int32)
+        # one colour scale for the whole trajectory, same defaults as visualise_nbo_data
+        vmin = E2_above if E2_above is not None else 0
+        vmax = E2_below if E2_below is not None else 1 if vmin == 0 else vmin + 0.1
+        if len(e2):
+            vmin, vmax = min(vmin, float(e2.min())), max(vmax, float(e2.max()))
+        if view is None:
+            view = new_view(width, height)
+        view.addModelsAsFrames("".join(blocks), 'xyz')
+        view.setStyle({'stick': {'radius': 0.03}})
+        view.setBackgroundColor('white')
+        colors, codes = value_colors(e2, vmin, vmax, bins=color_bins)
+        shown_e2 = e2 if codes is None else vmin + (codes + 0.5) / color_bins * (vmax - vmin)
+        radii = 0.01 + (shown_e2 / vmax) * 0.04 if proportional_radius else 0.05
+        add_cylinders(view, starts, ends, colors, radii, opacity=0.8, frames=frame_of)
+        if label:
+            labelled = np.arange(len(e2)) if label_min_e2 is None else np.flatnonzero(e2 >= label_min_e2)
+            add_labels(view, [f"E(2): {value:.2f}" for value in e2[labelled].tolist()], (starts[labelled] + ends[labelled]) / 2,
+                       [colors[i] for i in labelled.tolist()],
+                       {'backgroundOpacity': 0.3, 'fontSize': 10, 'fontColor': 'black', 'fontWeight': 'bold'},
+                       frames=frame_of[labelled])
+        view.animate({'loop': 'forward', 'interval': interval})
+        self.metrics.add_span("render", time.perf_counter() - start, "trajectory")
+
+        fig = colorbar(vmin, vmax, f'E(2) kcal/mol range\n[min: {vmin:.2f}, max: {vmax:.2f}]', ticks=True, headless=export_to is not None or not display)
+        if export_to is not None:
+            data = {"vmin": vmin, "vmax": vmax, "frames": list(shown),
+                    "interactions_per_frame": np.bincount(frame_of, minlength=len(shown)).tolist()}
+            with self.metrics.span("export"):
+                return export(export_to, view=view, fig=fig, data=data)
+        if display:
+            import matplotlib.pyplot as plt
+            view.zoomTo()
+            view.show()
+            plt.show()
+            return None
+        return view
+